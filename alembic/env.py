@@ -19,9 +19,28 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from ticket.models.models import Base
+from ticket.models.partition import is_partition
 
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names):
+    # Per-ticket partitions are created at runtime, not by migrations
+    if type_ == "table":
+        return not is_partition(name)
+    return True
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Postgres clones foreign keys to partitioned tables once per partition
+    if type_ == "foreign_key_constraint" and reflected:
+        return not is_partition(obj.referred_table.name)
+    # Trigram indexes only exist where pg_trgm is available
+    if type_ == "index" and reflected:
+        return not name.endswith("_trgm")
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +65,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -66,7 +87,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
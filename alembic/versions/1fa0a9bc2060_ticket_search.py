@@ -0,0 +1,74 @@
+"""full-text and trigram search on tickets
+
+Revision ID: 1fa0a9bc2060
+Revises: 6b6fc8b88ce0
+Create Date: 2026-10-20 10:41:07.512904
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1fa0a9bc2060"
+down_revision: Union[str, None] = "6b6fc8b88ce0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_COLUMNS = ["name", "description"]
+
+
+def has_trigram() -> bool:
+    # pg_trgm ships with contrib which some installations leave out, the
+    # full-text index still covers searches without it
+    res = op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    )
+    return res.scalar() is not None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ticket",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('simple', "
+                "coalesce(name, '') || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_ticket_search_vector",
+        "ticket",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    if has_trigram():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(
+                f"ix_ticket_{column}_trgm",
+                "ticket",
+                [column],
+                unique=False,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            )
+
+
+def downgrade() -> None:
+    for column in TRIGRAM_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS ix_ticket_{column}_trgm")
+    op.drop_index(
+        "ix_ticket_search_vector", table_name="ticket", postgresql_using="gin"
+    )
+    op.drop_column("ticket", "search_vector")
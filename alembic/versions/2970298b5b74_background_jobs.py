@@ -0,0 +1,63 @@
+"""background jobs run by the app workers
+
+Revision ID: 2970298b5b74
+Revises: fcb9bab81424
+Create Date: 2026-10-19 18:04:17.102860
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2970298b5b74"
+down_revision: Union[str, None] = "fcb9bab81424"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column(
+            "state",
+            sa.Enum("PENDING", "RUNNING", "DONE", "FAILED", name="jobstate"),
+            nullable=False,
+        ),
+        sa.Column("arguments", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("progress", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("result", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("create_date", sa.DateTime(), nullable=False),
+        sa.Column("write_date", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_job_create_date"), "job", ["create_date"], unique=False)
+    op.create_index(
+        "ix_job_queue",
+        "job",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("state IN ('PENDING', 'RUNNING')"),
+    )
+    op.create_index(op.f("ix_job_write_date"), "job", ["write_date"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_job_write_date"), table_name="job")
+    op.drop_index(
+        "ix_job_queue",
+        table_name="job",
+        postgresql_where=sa.text("state IN ('PENDING', 'RUNNING')"),
+    )
+    op.drop_index(op.f("ix_job_create_date"), table_name="job")
+    op.drop_table("job")
+    sa.Enum("PENDING", "RUNNING", "DONE", "FAILED", name="jobstate").drop(op.get_bind())
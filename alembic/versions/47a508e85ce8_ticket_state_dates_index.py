@@ -0,0 +1,35 @@
+"""index ticket state and sale dates
+
+Revision ID: 47a508e85ce8
+Revises: 1fa0a9bc2060
+Create Date: 2026-10-20 12:06:19.830145
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "47a508e85ce8"
+down_revision: Union[str, None] = "1fa0a9bc2060"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_ticket_state_dates",
+            "ticket",
+            ["state", "start_date", "end_date"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ticket_state_dates", table_name="ticket")
@@ -0,0 +1,33 @@
+"""watermarks of incremental jobs
+
+Revision ID: 6b6fc8b88ce0
+Revises: 8f0ab55ecb37
+Create Date: 2026-10-20 09:12:40.218553
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6b6fc8b88ce0"
+down_revision: Union[str, None] = "8f0ab55ecb37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_watermark",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("watermark", sa.DateTime(), nullable=False),
+        sa.Column("write_date", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("job_watermark")
@@ -0,0 +1,41 @@
+"""tombstones of deleted rows for the change feed
+
+Revision ID: 84a9a4444cf9
+Revises: 2970298b5b74
+Create Date: 2026-10-19 18:11:41.845893
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "84a9a4444cf9"
+down_revision: Union[str, None] = "2970298b5b74"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change_tombstone",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("entity", sa.String(length=32), nullable=False),
+        sa.Column("record_id", sa.Integer(), nullable=False),
+        sa.Column("write_date", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_change_tombstone_write_date"),
+        "change_tombstone",
+        ["write_date"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_change_tombstone_write_date"), table_name="change_tombstone")
+    op.drop_table("change_tombstone")
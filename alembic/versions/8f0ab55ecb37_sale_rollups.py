@@ -0,0 +1,89 @@
+"""sale rollups per ticket, day and price
+
+Revision ID: 8f0ab55ecb37
+Revises: f22a7e0bbb7f
+Create Date: 2026-10-19 23:02:51.177342
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f0ab55ecb37"
+down_revision: Union[str, None] = "f22a7e0bbb7f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every ordered number with the state and dates of its order, archived orders
+# only kept their numbers so they are counted at the ticket price
+ORDERED_LINES = """
+WITH lines AS (
+    SELECT ol.ticket_id, o.state, o.create_date, o.write_date,
+        CASE WHEN tl.is_special_price THEN tl.special_price ELSE t.price END AS price
+    FROM ticket_order_line ol
+    JOIN ticket_order o ON o.id = ol.order_id
+    JOIN ticket_line tl ON tl.id = ol.ticket_line_id AND tl.ticket_id = ol.ticket_id
+    JOIN ticket t ON t.id = ol.ticket_id
+    UNION ALL
+    SELECT a.ticket_id, a.state, a.create_date, a.write_date, t.price
+    FROM ticket_order_archive a
+    JOIN ticket t ON t.id = a.ticket_id
+    CROSS JOIN unnest(a.numbers)
+)
+"""
+
+# Refunds cannot be told apart from plain cancellations in the history
+BACKFILL = [
+    ORDERED_LINES
+    + """
+    INSERT INTO ticket_sale_rollup (ticket_id, day, price, reserved)
+    SELECT ticket_id, create_date::date, price, count(*)
+    FROM lines GROUP BY 1, 2, 3
+    """,
+    ORDERED_LINES
+    + """
+    INSERT INTO ticket_sale_rollup AS r (ticket_id, day, price, sold, revenue)
+    SELECT ticket_id, write_date::date, price, count(*), sum(price)
+    FROM lines WHERE state IN ('SUCCESSFUL', 'VARIFIED') GROUP BY 1, 2, 3
+    ON CONFLICT (ticket_id, day, price) DO UPDATE
+    SET sold = r.sold + excluded.sold, revenue = r.revenue + excluded.revenue
+    """,
+    ORDERED_LINES
+    + """
+    INSERT INTO ticket_sale_rollup AS r (ticket_id, day, price, cancelled)
+    SELECT ticket_id, write_date::date, price, count(*)
+    FROM lines WHERE state = 'CANCEL' GROUP BY 1, 2, 3
+    ON CONFLICT (ticket_id, day, price) DO UPDATE
+    SET cancelled = r.cancelled + excluded.cancelled
+    """,
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ticket_sale_rollup",
+        sa.Column("ticket_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("reserved", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("sold", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("cancelled", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("refunded", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("revenue", sa.Float(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["ticket_id"], ["ticket.id"]),
+        sa.PrimaryKeyConstraint("ticket_id", "day", "price"),
+    )
+    op.create_index(
+        op.f("ix_ticket_sale_rollup_day"), "ticket_sale_rollup", ["day"], unique=False
+    )
+    for statement in BACKFILL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_ticket_sale_rollup_day"), table_name="ticket_sale_rollup")
+    op.drop_table("ticket_sale_rollup")
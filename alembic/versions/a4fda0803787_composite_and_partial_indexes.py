@@ -0,0 +1,150 @@
+"""composite and partial indexes for hot queries
+
+Revision ID: a4fda0803787
+Revises: ba26afdd4b04
+Create Date: 2026-10-19 17:10:42.512308
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4fda0803787"
+down_revision: Union[str, None] = "ba26afdd4b04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_ticket_line_ticket_id_number",
+            "ticket_line",
+            ["ticket_id", "number"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.execute(
+            "ALTER TABLE ticket_line ADD CONSTRAINT uq_ticket_line_ticket_id_number "
+            "UNIQUE USING INDEX uq_ticket_line_ticket_id_number"
+        )
+        op.create_index(
+            "ix_ticket_line_ticket_id_state",
+            "ticket_line",
+            ["ticket_id", "state"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_line_available",
+            "ticket_line",
+            ["ticket_id", "number"],
+            postgresql_where=sa.text("state = 'AVAILABLE'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_line_user_code",
+            "ticket_line",
+            ["user_code", "ticket_id", "number"],
+            postgresql_where=sa.text("user_code IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_order_user_code_state_create_date",
+            "ticket_order",
+            ["user_code", "state", "create_date"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_order_line_order_id_ticket_line_id",
+            "ticket_order_line",
+            ["order_id", "ticket_line_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Leading columns of the composite indexes above
+        op.drop_index(
+            "ix_ticket_line_ticket_id",
+            table_name="ticket_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_order_user_code",
+            table_name="ticket_order",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_order_line_order_id",
+            table_name="ticket_order_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_ticket_order_line_order_id",
+            "ticket_order_line",
+            ["order_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_order_user_code",
+            "ticket_order",
+            ["user_code"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_ticket_line_ticket_id",
+            "ticket_line",
+            ["ticket_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_order_line_order_id_ticket_line_id",
+            table_name="ticket_order_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_order_user_code_state_create_date",
+            table_name="ticket_order",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_line_user_code",
+            table_name="ticket_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_line_available",
+            table_name="ticket_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_ticket_line_ticket_id_state",
+            table_name="ticket_line",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_constraint(
+            "uq_ticket_line_ticket_id_number", "ticket_line", type_="unique"
+        )
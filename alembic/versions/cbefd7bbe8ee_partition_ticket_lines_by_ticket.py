@@ -0,0 +1,247 @@
+"""partition ticket_line and ticket_order_line by ticket
+
+Revision ID: cbefd7bbe8ee
+Revises: a4fda0803787
+Create Date: 2026-10-19 17:42:05.118734
+
+The data is copied online: triggers mirror every write on the old tables
+into the new partitioned tables while existing rows are copied in small
+batches, then the tables are swapped under a short exclusive lock.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "cbefd7bbe8ee"
+down_revision: Union[str, None] = "a4fda0803787"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+CREATE_TABLES = """
+CREATE TABLE ticket_line_new (LIKE ticket_line INCLUDING DEFAULTS)
+    PARTITION BY LIST (ticket_id);
+ALTER TABLE ticket_line_new
+    ADD CONSTRAINT ticket_line_new_pkey PRIMARY KEY (id, ticket_id),
+    ADD CONSTRAINT uq_ticket_line_new_ticket_id_number UNIQUE (ticket_id, number),
+    ADD CONSTRAINT ticket_line_new_ticket_id_fkey
+        FOREIGN KEY (ticket_id) REFERENCES ticket (id);
+CREATE INDEX ix_ticket_line_new_ticket_id_state ON ticket_line_new (ticket_id, state);
+CREATE INDEX ix_ticket_line_new_available ON ticket_line_new (ticket_id, number)
+    WHERE state = 'AVAILABLE';
+CREATE INDEX ix_ticket_line_new_user_code ON ticket_line_new (user_code, ticket_id, number)
+    WHERE user_code IS NOT NULL;
+CREATE INDEX ix_ticket_line_new_state ON ticket_line_new (state);
+CREATE INDEX ix_ticket_line_new_create_date ON ticket_line_new (create_date);
+CREATE INDEX ix_ticket_line_new_write_date ON ticket_line_new (write_date);
+
+CREATE TABLE ticket_order_line_new (
+    LIKE ticket_order_line INCLUDING DEFAULTS,
+    ticket_id INTEGER NOT NULL
+) PARTITION BY LIST (ticket_id);
+ALTER TABLE ticket_order_line_new
+    ADD CONSTRAINT ticket_order_line_new_pkey PRIMARY KEY (id, ticket_id),
+    ADD CONSTRAINT ticket_order_line_new_order_id_fkey
+        FOREIGN KEY (order_id) REFERENCES ticket_order (id),
+    ADD CONSTRAINT ticket_order_line_new_ticket_line_id_fkey
+        FOREIGN KEY (ticket_line_id, ticket_id) REFERENCES ticket_line_new (id, ticket_id);
+CREATE INDEX ix_ticket_order_line_new_order_id_ticket_line_id
+    ON ticket_order_line_new (order_id, ticket_line_id);
+CREATE INDEX ix_ticket_order_line_new_ticket_line_id
+    ON ticket_order_line_new (ticket_line_id);
+CREATE INDEX ix_ticket_order_line_new_create_date ON ticket_order_line_new (create_date);
+CREATE INDEX ix_ticket_order_line_new_write_date ON ticket_order_line_new (write_date);
+
+CREATE FUNCTION ticket_partition_create(parent TEXT, prefix TEXT, tid INTEGER)
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES IN (%s)',
+        prefix || '_p' || tid, parent, tid
+    );
+END $$;
+
+SELECT ticket_partition_create('ticket_line_new', 'ticket_line', id),
+    ticket_partition_create('ticket_order_line_new', 'ticket_order_line', id)
+FROM ticket;
+"""
+
+CREATE_TRIGGERS = """
+CREATE TABLE ticket_line_deleted (id INTEGER PRIMARY KEY);
+CREATE TABLE ticket_order_line_deleted (id INTEGER PRIMARY KEY);
+
+CREATE FUNCTION ticket_line_mirror() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM ticket_line_new WHERE id = OLD.id AND ticket_id = OLD.ticket_id;
+        INSERT INTO ticket_line_deleted VALUES (OLD.id) ON CONFLICT DO NOTHING;
+        RETURN OLD;
+    END IF;
+    PERFORM ticket_partition_create('ticket_line_new', 'ticket_line', NEW.ticket_id);
+    INSERT INTO ticket_line_new SELECT NEW.*
+    ON CONFLICT (id, ticket_id) DO UPDATE SET
+        number = EXCLUDED.number,
+        user_code = EXCLUDED.user_code,
+        is_special_price = EXCLUDED.is_special_price,
+        special_price = EXCLUDED.special_price,
+        state = EXCLUDED.state,
+        create_date = EXCLUDED.create_date,
+        write_date = EXCLUDED.write_date;
+    RETURN NEW;
+END $$;
+
+CREATE FUNCTION ticket_order_line_mirror() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM ticket_order_line_new WHERE id = OLD.id;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO ticket_order_line_deleted VALUES (OLD.id) ON CONFLICT DO NOTHING;
+        RETURN OLD;
+    END IF;
+    -- The referenced line may not have been copied yet
+    INSERT INTO ticket_line_new SELECT * FROM ticket_line WHERE id = NEW.ticket_line_id
+    ON CONFLICT DO NOTHING;
+    PERFORM ticket_partition_create('ticket_order_line_new', 'ticket_order_line', tl.ticket_id)
+    FROM ticket_line tl WHERE tl.id = NEW.ticket_line_id;
+    INSERT INTO ticket_order_line_new
+        (id, order_id, ticket_line_id, create_date, write_date, ticket_id)
+    SELECT NEW.id, NEW.order_id, NEW.ticket_line_id, NEW.create_date, NEW.write_date,
+        tl.ticket_id
+    FROM ticket_line tl WHERE tl.id = NEW.ticket_line_id;
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER ticket_line_mirror AFTER INSERT OR UPDATE OR DELETE ON ticket_line
+    FOR EACH ROW EXECUTE FUNCTION ticket_line_mirror();
+CREATE TRIGGER ticket_order_line_mirror AFTER INSERT OR UPDATE OR DELETE
+    ON ticket_order_line FOR EACH ROW EXECUTE FUNCTION ticket_order_line_mirror();
+"""
+
+COPY_LINES = """
+INSERT INTO ticket_line_new SELECT * FROM ticket_line
+WHERE id > :start AND id <= :end
+ON CONFLICT DO NOTHING
+"""
+
+COPY_ORDER_LINES = """
+INSERT INTO ticket_order_line_new
+    (id, order_id, ticket_line_id, create_date, write_date, ticket_id)
+SELECT ol.id, ol.order_id, ol.ticket_line_id, ol.create_date, ol.write_date,
+    tl.ticket_id
+FROM ticket_order_line ol JOIN ticket_line tl ON tl.id = ol.ticket_line_id
+WHERE ol.id > :start AND ol.id <= :end
+ON CONFLICT DO NOTHING
+"""
+
+SWAP_TABLES = """
+LOCK TABLE ticket_line, ticket_order_line IN ACCESS EXCLUSIVE MODE;
+DROP TRIGGER ticket_order_line_mirror ON ticket_order_line;
+DROP TRIGGER ticket_line_mirror ON ticket_line;
+-- Rows deleted while their batch was being copied
+DELETE FROM ticket_order_line_new WHERE id IN (SELECT id FROM ticket_order_line_deleted);
+DELETE FROM ticket_line_new WHERE id IN (SELECT id FROM ticket_line_deleted);
+
+ALTER SEQUENCE ticket_line_id_seq OWNED BY ticket_line_new.id;
+ALTER SEQUENCE ticket_order_line_id_seq OWNED BY ticket_order_line_new.id;
+DROP TABLE ticket_order_line;
+DROP TABLE ticket_line;
+ALTER TABLE ticket_line_new RENAME TO ticket_line;
+ALTER TABLE ticket_order_line_new RENAME TO ticket_order_line;
+
+ALTER INDEX ticket_line_new_pkey RENAME TO ticket_line_pkey;
+ALTER INDEX uq_ticket_line_new_ticket_id_number RENAME TO uq_ticket_line_ticket_id_number;
+ALTER TABLE ticket_line
+    RENAME CONSTRAINT ticket_line_new_ticket_id_fkey TO ticket_line_ticket_id_fkey;
+ALTER INDEX ix_ticket_line_new_ticket_id_state RENAME TO ix_ticket_line_ticket_id_state;
+ALTER INDEX ix_ticket_line_new_available RENAME TO ix_ticket_line_available;
+ALTER INDEX ix_ticket_line_new_user_code RENAME TO ix_ticket_line_user_code;
+ALTER INDEX ix_ticket_line_new_state RENAME TO ix_ticket_line_state;
+ALTER INDEX ix_ticket_line_new_create_date RENAME TO ix_ticket_line_create_date;
+ALTER INDEX ix_ticket_line_new_write_date RENAME TO ix_ticket_line_write_date;
+
+ALTER INDEX ticket_order_line_new_pkey RENAME TO ticket_order_line_pkey;
+ALTER TABLE ticket_order_line RENAME CONSTRAINT ticket_order_line_new_order_id_fkey
+    TO ticket_order_line_order_id_fkey;
+ALTER TABLE ticket_order_line RENAME CONSTRAINT ticket_order_line_new_ticket_line_id_fkey
+    TO ticket_order_line_ticket_line_id_fkey;
+ALTER INDEX ix_ticket_order_line_new_order_id_ticket_line_id
+    RENAME TO ix_ticket_order_line_order_id_ticket_line_id;
+ALTER INDEX ix_ticket_order_line_new_ticket_line_id
+    RENAME TO ix_ticket_order_line_ticket_line_id;
+ALTER INDEX ix_ticket_order_line_new_create_date RENAME TO ix_ticket_order_line_create_date;
+ALTER INDEX ix_ticket_order_line_new_write_date RENAME TO ix_ticket_order_line_write_date;
+
+DROP TABLE ticket_order_line_deleted;
+DROP TABLE ticket_line_deleted;
+DROP FUNCTION ticket_order_line_mirror();
+DROP FUNCTION ticket_line_mirror();
+DROP FUNCTION ticket_partition_create(TEXT, TEXT, INTEGER);
+"""
+
+UNPARTITION = """
+CREATE TABLE ticket_line_old (LIKE ticket_line INCLUDING DEFAULTS);
+INSERT INTO ticket_line_old SELECT * FROM ticket_line;
+CREATE TABLE ticket_order_line_old (LIKE ticket_order_line INCLUDING DEFAULTS);
+INSERT INTO ticket_order_line_old SELECT * FROM ticket_order_line;
+ALTER TABLE ticket_order_line_old DROP COLUMN ticket_id;
+
+ALTER SEQUENCE ticket_line_id_seq OWNED BY ticket_line_old.id;
+ALTER SEQUENCE ticket_order_line_id_seq OWNED BY ticket_order_line_old.id;
+DROP TABLE ticket_order_line;
+DROP TABLE ticket_line;
+ALTER TABLE ticket_line_old RENAME TO ticket_line;
+ALTER TABLE ticket_order_line_old RENAME TO ticket_order_line;
+
+ALTER TABLE ticket_line
+    ADD CONSTRAINT ticket_line_pkey PRIMARY KEY (id),
+    ADD CONSTRAINT uq_ticket_line_ticket_id_number UNIQUE (ticket_id, number),
+    ADD CONSTRAINT ticket_line_ticket_id_fkey FOREIGN KEY (ticket_id) REFERENCES ticket (id);
+CREATE INDEX ix_ticket_line_ticket_id_state ON ticket_line (ticket_id, state);
+CREATE INDEX ix_ticket_line_available ON ticket_line (ticket_id, number)
+    WHERE state = 'AVAILABLE';
+CREATE INDEX ix_ticket_line_user_code ON ticket_line (user_code, ticket_id, number)
+    WHERE user_code IS NOT NULL;
+CREATE INDEX ix_ticket_line_state ON ticket_line (state);
+CREATE INDEX ix_ticket_line_create_date ON ticket_line (create_date);
+CREATE INDEX ix_ticket_line_write_date ON ticket_line (write_date);
+
+ALTER TABLE ticket_order_line
+    ADD CONSTRAINT ticket_order_line_pkey PRIMARY KEY (id),
+    ADD CONSTRAINT ticket_order_line_order_id_fkey
+        FOREIGN KEY (order_id) REFERENCES ticket_order (id),
+    ADD CONSTRAINT ticket_order_line_ticket_line_id_fkey
+        FOREIGN KEY (ticket_line_id) REFERENCES ticket_line (id);
+CREATE INDEX ix_ticket_order_line_order_id_ticket_line_id
+    ON ticket_order_line (order_id, ticket_line_id);
+CREATE INDEX ix_ticket_order_line_ticket_line_id ON ticket_order_line (ticket_line_id);
+CREATE INDEX ix_ticket_order_line_create_date ON ticket_order_line (create_date);
+CREATE INDEX ix_ticket_order_line_write_date ON ticket_order_line (write_date);
+"""
+
+
+def copy_in_batches(table: str, statement: str) -> None:
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+    for start in range(0, max_id, BATCH_SIZE):
+        bind.execute(sa.text(statement), {"start": start, "end": start + BATCH_SIZE})
+
+
+def upgrade() -> None:
+    op.execute(CREATE_TABLES)
+    op.execute(CREATE_TRIGGERS)
+    # Every batch commits on its own so no long transaction holds locks
+    with op.get_context().autocommit_block():
+        copy_in_batches("ticket_line", COPY_LINES)
+        copy_in_batches("ticket_order_line", COPY_ORDER_LINES)
+    op.execute(SWAP_TABLES)
+
+
+def downgrade() -> None:
+    op.execute(UNPARTITION)
@@ -0,0 +1,73 @@
+"""archive tables for done tickets
+
+Revision ID: e5517759a13f
+Revises: cbefd7bbe8ee
+Create Date: 2026-10-19 21:04:12.381190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5517759a13f"
+down_revision: Union[str, None] = "cbefd7bbe8ee"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ticket",
+        sa.Column("archived", sa.Boolean(), server_default=sa.false(), nullable=False),
+    )
+    op.create_table(
+        "ticket_number_archive",
+        sa.Column("ticket_id", sa.Integer(), nullable=False),
+        sa.Column("user_code", sa.String(length=30), nullable=False),
+        sa.Column("line_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("numbers", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column(
+            "create_date", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.ForeignKeyConstraint(["ticket_id"], ["ticket.id"]),
+        sa.PrimaryKeyConstraint("ticket_id", "user_code"),
+    )
+    op.create_table(
+        "ticket_order_archive",
+        sa.Column("order_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("ticket_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=15), nullable=False),
+        sa.Column(
+            "state",
+            postgresql.ENUM(name="orderstate", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("user_code", sa.String(length=32), nullable=False),
+        sa.Column("line_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("ticket_line_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("numbers", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("create_date", sa.DateTime(), nullable=False),
+        sa.Column("write_date", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["ticket_id"], ["ticket.id"]),
+        sa.PrimaryKeyConstraint("order_id", "ticket_id"),
+    )
+    op.create_index(
+        "ix_ticket_order_archive_user_code_create_date",
+        "ticket_order_archive",
+        ["user_code", "create_date"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_ticket_order_archive_user_code_create_date",
+        table_name="ticket_order_archive",
+    )
+    op.drop_table("ticket_order_archive")
+    op.drop_table("ticket_number_archive")
+    op.drop_column("ticket", "archived")
@@ -0,0 +1,35 @@
+"""ticket storage mode
+
+Revision ID: f22a7e0bbb7f
+Revises: e5517759a13f
+Create Date: 2026-10-19 22:11:37.905614
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f22a7e0bbb7f"
+down_revision: Union[str, None] = "e5517759a13f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ticket_storage = postgresql.ENUM("LINES", "RANGES", name="ticketstorage")
+
+
+def upgrade() -> None:
+    ticket_storage.create(op.get_bind())
+    op.add_column(
+        "ticket",
+        sa.Column("storage", ticket_storage, server_default="LINES", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ticket", "storage")
+    ticket_storage.drop(op.get_bind())
@@ -0,0 +1,51 @@
+"""idempotency keys of order mutations
+
+Revision ID: fcb9bab81424
+Revises: 47a508e85ce8
+Create Date: 2026-10-20 15:27:51.604418
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "fcb9bab81424"
+down_revision: Union[str, None] = "47a508e85ce8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_idempotency",
+        sa.Column("user_code", sa.String(length=32), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("operation", sa.String(length=32), nullable=False),
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("response", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column(
+            "create_date",
+            sa.DateTime(),
+            server_default=sa.text("timezone('utc', now())"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("user_code", "key"),
+    )
+    op.create_index(
+        op.f("ix_order_idempotency_create_date"),
+        "order_idempotency",
+        ["create_date"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_order_idempotency_create_date"), table_name="order_idempotency"
+    )
+    op.drop_table("order_idempotency")
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import Select, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ticket.env.settings import get_settings
+from ticket.services.engine import get_pg_engine_from_setting
+from ticket.models.ticket import TicketLine, TicketLineState
+from ticket.models.order import Order, OrderLine, OrderState
+from ticket.models.partition import PARTITIONED_TABLES, partition_name
+
+# Index expected to serve each hot query, None when a scan of the single
+# pruned partition is fine
+EXPECTED_INDEXES: Dict[str, Optional[str]] = {
+    "lines by ticket and state": None,
+    "lines by ticket and number": "uq_ticket_line_ticket_id_number",
+    "user numbers in ticket": "ix_ticket_line_user_code",
+    "user orders by state": "ix_ticket_order_user_code_state_create_date",
+    # Order ids do not prune, every partition is visited
+    "order lines of orders": None,
+    "lines of order lines": "ticket_line_pkey",
+}
+# A sequential scan reading more rows than this is reported as slow, small
+# partitions are cheaper to scan than to probe
+SEQ_SCAN_ROWS = 1000
+
+SEED_TICKETS = """
+    INSERT INTO ticket (name, state, price, start_num, end_num, available_count,
+        reserved_count, sold_count, sync_user, start_date, end_date,
+        create_date, write_date)
+    SELECT 'bench ' || t, 'POSTED', 1000, 0, :numbers - 1, :numbers, 0, 0,
+        'bench', now(), now() + interval '7 days', now(), now()
+    FROM generate_series(1, :tickets) t
+    RETURNING id
+"""
+
+SEED = [
+    """
+    INSERT INTO ticket_line (number, ticket_id, is_special_price, special_price,
+        state, create_date, write_date)
+    SELECT n, t.id, false, 0, 'AVAILABLE', now(), now()
+    FROM ticket t CROSS JOIN generate_series(0, :numbers - 1) n
+    WHERE t.sync_user = 'bench'
+    """,
+    """
+    UPDATE ticket_line SET state = 'SOLD', user_code = 'user' || (id % :users)
+    WHERE id % 20 = 0
+    """,
+    """
+    INSERT INTO ticket_order (name, state, user_code, create_date, write_date)
+    SELECT 'bench order', (ARRAY['DRAFT', 'SUCCESSFUL', 'CANCEL'])[1 + g % 3]::orderstate,
+        'user' || (g % :users), now() - g * interval '1 minute', now()
+    FROM generate_series(1, :orders) g
+    """,
+    """
+    INSERT INTO ticket_order_line (order_id, ticket_line_id, ticket_id, create_date,
+        write_date)
+    SELECT (SELECT min(id) FROM ticket_order WHERE name = 'bench order')
+        + l.id % :orders, l.id, l.ticket_id, now(), now()
+    FROM ticket_line l JOIN ticket t ON t.id = l.ticket_id
+    WHERE l.state = 'SOLD' AND t.sync_user = 'bench'
+    """,
+    "ANALYZE ticket, ticket_line, ticket_order, ticket_order_line",
+]
+
+
+def hot_queries(
+    ticket_id: int, user_code: str, order_ids: List[int], line_ids: List[int]
+) -> Dict[str, Select]:
+    return {
+        "lines by ticket and state": select(TicketLine)
+        .where(TicketLine.ticket_id == ticket_id)
+        .where(TicketLine.state == TicketLineState.AVAILABLE)
+        .limit(50),
+        "lines by ticket and number": select(TicketLine)
+        .where(TicketLine.ticket_id == ticket_id)
+        .where(TicketLine.number.in_([7, 77, 777])),
+        "user numbers in ticket": select(TicketLine.number)
+        .where(TicketLine.user_code == user_code)
+        .where(TicketLine.ticket_id == ticket_id),
+        "user orders by state": select(Order)
+        .where(Order.user_code == user_code)
+        .where(Order.state == OrderState.DRAFT)
+        .order_by(Order.create_date.desc())
+        .limit(20),
+        "order lines of orders": select(OrderLine).where(
+            OrderLine.order_id.in_(order_ids)
+        ),
+        "lines of order lines": select(TicketLine)
+        .where(TicketLine.ticket_id == ticket_id)
+        .where(TicketLine.id.in_(line_ids)),
+    }
+
+
+# Scans on partitions report the partition index, map it back to the parent
+PARENT_INDEXES = """
+    SELECT child.relname, parent.relname
+    FROM pg_inherits i
+    JOIN pg_class child ON child.oid = i.inhrelid
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    WHERE child.relkind = 'i'
+"""
+
+
+def walk(plan: dict) -> Tuple[Set[str], Set[str], int]:
+    nodes = {plan["Node Type"]}
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    scanned = 0
+    if plan["Node Type"] == "Seq Scan":
+        scanned = plan["Actual Rows"] + plan.get("Rows Removed by Filter", 0)
+    for child in plan.get("Plans", []):
+        child_nodes, child_indexes, child_scanned = walk(child)
+        nodes |= child_nodes
+        indexes |= child_indexes
+        scanned = max(scanned, child_scanned)
+    return nodes, indexes, scanned
+
+
+async def explain(connection: AsyncConnection, stmt: Select) -> Tuple[dict, float]:
+    sql = stmt.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    res = await connection.exec_driver_sql(
+        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"
+    )
+    output = res.scalar_one()[0]
+    return output["Plan"], output["Execution Time"]
+
+
+async def main(args: argparse.Namespace) -> int:  # pylint: disable=too-many-locals
+    settings = get_settings()
+    engine = get_pg_engine_from_setting(settings.services.postgres.db)
+    failed: List[str] = []
+    async with engine.connect() as connection:
+        # Everything happens in one transaction which is rolled back at the end
+        params = {
+            "tickets": args.tickets,
+            "numbers": args.numbers,
+            "users": args.users,
+            "orders": args.orders,
+        }
+        ticket_ids = (await connection.execute(text(SEED_TICKETS), params)).scalars()
+        for tid in ticket_ids.all():
+            # Created in the seeding transaction so they are rolled back with it
+            for table in PARTITIONED_TABLES:
+                await connection.execute(
+                    text(
+                        f"CREATE TABLE {partition_name(table, tid)} "
+                        f"PARTITION OF {table} FOR VALUES IN ({int(tid)})"
+                    )
+                )
+        for stmt in SEED:
+            await connection.execute(text(stmt), params)
+        parents = dict((await connection.execute(text(PARENT_INDEXES))).all())
+        ticket_id = (
+            await connection.execute(
+                text("SELECT max(id) FROM ticket WHERE sync_user = 'bench'")
+            )
+        ).scalar_one()
+        order_ids = (
+            await connection.execute(
+                select(Order.id).where(Order.user_code == "user7").limit(20)
+            )
+        ).scalars()
+        line_ids = (
+            await connection.execute(
+                select(TicketLine.id)
+                .where(TicketLine.ticket_id == ticket_id)
+                .where(TicketLine.state == TicketLineState.SOLD)
+                .limit(20)
+            )
+        ).scalars()
+        queries = hot_queries(ticket_id, "user7", list(order_ids), list(line_ids))
+        for name, stmt in queries.items():
+            plan, elapsed = await explain(connection, stmt)
+            nodes, indexes, scanned = walk(plan)
+            indexes = {parents.get(index, index) for index in indexes}
+            expected = EXPECTED_INDEXES[name]
+            slow = scanned > SEQ_SCAN_ROWS or (expected and expected not in indexes)
+            if slow:
+                failed.append(name)
+            print(
+                f"{'SLOW' if slow else 'OK':4} {elapsed:9.3f} ms  {name:28} "
+                f"seq_rows={scanned} nodes={sorted(nodes)} indexes={sorted(indexes)}"
+            )
+        await connection.rollback()
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Seed sample data, explain the hot queries and roll back"
+    )
+    parser.add_argument("--tickets", type=int, default=100)
+    parser.add_argument("--numbers", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=200000)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,2 +1,2 @@
 #!/bin/bash
-uvicorn ticket.main:app --host 0.0.0.0
+python -m ticket
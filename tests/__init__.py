@@ -1,2 +1,7 @@
 from . import env
+from . import extensions
+from . import middlewares
 from . import models
+from . import schemas
+from . import services
+from . import test_main
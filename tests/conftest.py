@@ -0,0 +1,119 @@
+from typing import Any, Dict, List, Optional, Tuple
+import pytest
+from sqlalchemy import Update
+
+
+class FakeResult:
+    def __init__(self, rows: List[Tuple[Any, ...]]) -> None:
+        self.rows = rows
+
+    def scalar(self) -> Any:
+        return self.rows[0][0] if self.rows else None
+
+    def scalars(self) -> "FakeResult":
+        return FakeResult([(row[0],) for row in self.rows])
+
+    def all(self) -> List[Any]:
+        return [row[0] if len(row) == 1 else row for row in self.rows]
+
+    def one(self) -> Tuple[Any, ...]:
+        (row,) = self.rows
+        return row
+
+
+class FakeSavepoint:
+    def __init__(self) -> None:
+        self.outcome: Optional[str] = None
+
+    async def commit(self):
+        self.outcome = "commit"
+
+    async def rollback(self):
+        self.outcome = "rollback"
+
+
+class FakeSession:
+    # Stand-in of an AsyncSession, keeps what the code under test did with it.
+    # execute answers with the results queued by returns, in turn.
+    def __init__(self) -> None:
+        self.results: List[FakeResult] = []
+        self.records: Dict[Any, Any] = {}
+        self.statements: List[Any] = []
+        self.added: List[Any] = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.savepoint = FakeSavepoint()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def returns(self, *rows: Tuple[Any, ...]):
+        self.results.append(FakeResult(list(rows)))
+
+    async def execute(self, stmt, params=None) -> FakeResult:
+        self.statements.append(stmt)
+        return self.results.pop(0) if self.results else FakeResult([])
+
+    async def scalar(self, stmt) -> Any:
+        return (await self.execute(stmt)).scalar()
+
+    async def get(self, model, record_id, **kwargs) -> Any:
+        return self.records.get(record_id)
+
+    def add(self, record):
+        self.added.append(record)
+
+    def add_all(self, records):
+        self.added.extend(records)
+
+    async def flush(self):
+        pass
+
+    async def begin_nested(self) -> FakeSavepoint:
+        return self.savepoint
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    def written(self, table: str) -> List[Dict[str, Any]]:
+        # Parameters of the UPDATE statements run on table
+        return [
+            stmt.compile().params
+            for stmt in self.statements
+            if isinstance(stmt, Update) and stmt.table.name == table
+        ]
+
+
+class FakeSessionmaker:
+    # Stand-in of an async_sessionmaker, keeps the sessions it opened
+    def __init__(self) -> None:
+        self.sessions: List[FakeSession] = []
+
+    def __call__(self) -> FakeSession:
+        session = FakeSession()
+        self.sessions.append(session)
+        return session
+
+    @property
+    def commits(self) -> int:
+        return sum(session.commits for session in self.sessions)
+
+    @property
+    def rollbacks(self) -> int:
+        return sum(session.rollbacks for session in self.sessions)
+
+
+@pytest.fixture(name="sessionmaker")
+def fixture_sessionmaker() -> FakeSessionmaker:
+    return FakeSessionmaker()
+
+
+@pytest.fixture(name="session")
+def fixture_session(sessionmaker: FakeSessionmaker) -> FakeSession:
+    return sessionmaker()
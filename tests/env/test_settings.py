@@ -13,3 +13,12 @@ def test_load_setting_from_env():
     settings = load_setting_from_env()
     assert settings.services.postgres.ro_db.user == "admin"
     assert settings.services.postgres.ro_db.password == "admin"
+
+
+def test_pool_per_worker():
+    settings = load_setting("settings.yaml.example")
+    pool = settings.services.postgres.db.pool
+    pool_size, max_overflow = pool.per_worker(settings.server.processes)
+    assert pool_size + max_overflow <= pool.max_connections // settings.server.processes
+    pool_size, max_overflow = pool.per_worker(1000)
+    assert (pool_size, max_overflow) == (1, 0)
@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import pytest
+import strawberry
+from strawberry.extensions import SchemaExtension
+from sqlalchemy.exc import DBAPIError
+
+from ticket.env.settings import Retry
+from ticket.extensions.db_session import (
+    RetryBudget,
+    RetryingSchema,
+    get_retryable_error,
+)
+
+# SQLSTATEs raised by the next attempts, in the resolver or on commit
+FAILURES: List[str] = []
+COMMIT_FAILURES: List[str] = []
+ATTEMPTS: List[int] = []
+
+
+def db_error(sqlstate: str) -> DBAPIError:
+    return DBAPIError("UPDATE ticket", {}, SimpleNamespace(sqlstate=sqlstate))
+
+
+class FailingCommit(SchemaExtension):
+    async def on_operation(self):  # pylint: disable=W0236
+        yield
+        if COMMIT_FAILURES:
+            raise db_error(COMMIT_FAILURES.pop(0))
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    async def value(self) -> int:
+        ATTEMPTS.append(1)
+        if FAILURES:
+            raise db_error(FAILURES.pop(0))
+        return 1
+
+
+def schema(max_attempts: int = 3, budget_max: float = 10.0) -> RetryingSchema:
+    res = RetryingSchema(Query, extensions=[FailingCommit])
+    res.retry = Retry(
+        max_attempts=max_attempts,
+        base_delay=0,
+        max_delay=0,
+        budget_ratio=0.5,
+        budget_max=budget_max,
+    )
+    return res
+
+
+@pytest.fixture(autouse=True)
+def fixture_reset():
+    FAILURES.clear()
+    COMMIT_FAILURES.clear()
+    ATTEMPTS.clear()
+
+
+def run(retrying: RetryingSchema):
+    return asyncio.run(retrying.execute("{ value }"))
+
+
+def test_retryable_error():
+    assert get_retryable_error(None, db_error("40P01"))
+    assert get_retryable_error(None, db_error("40001"))
+    assert not get_retryable_error(None, db_error("23505"))
+    assert not get_retryable_error(None, ValueError("40P01"))
+    assert not get_retryable_error(None)
+
+
+@pytest.mark.parametrize("sqlstate", ["40P01", "40001"])
+def test_retry_on_result_error(sqlstate):
+    FAILURES.extend([sqlstate, sqlstate])
+    result = run(schema())
+    assert not result.errors
+    assert result.data == {"value": 1}
+    assert len(ATTEMPTS) == 3
+
+
+def test_retry_on_commit():
+    COMMIT_FAILURES.append("40P01")
+    result = run(schema())
+    assert result.data == {"value": 1}
+    assert len(ATTEMPTS) == 2
+
+
+def test_no_retry():
+    FAILURES.append("23505")
+    result = run(schema())
+    assert result.errors
+    assert len(ATTEMPTS) == 1
+    COMMIT_FAILURES.append("23505")
+    with pytest.raises(DBAPIError):
+        run(schema())
+
+
+def test_max_attempts():
+    FAILURES.extend(["40P01"] * 5)
+    result = run(schema(max_attempts=3))
+    assert result.errors
+    assert len(ATTEMPTS) == 3
+    COMMIT_FAILURES.extend(["40001"] * 5)
+    ATTEMPTS.clear()
+    with pytest.raises(DBAPIError):
+        run(schema(max_attempts=2))
+    assert len(ATTEMPTS) == 2
+
+
+def test_budget():
+    retrying = schema(budget_max=1)
+    FAILURES.extend(["40P01"] * 2)
+    # One token for the first retry, none left for the second
+    assert run(retrying).errors
+    assert len(ATTEMPTS) == 2
+    ATTEMPTS.clear()
+    FAILURES.append("40P01")
+    assert run(retrying).errors
+    assert len(ATTEMPTS) == 1
+    # Two successes at ratio 0.5 earn a retry again
+    run(retrying)
+    run(retrying)
+    ATTEMPTS.clear()
+    FAILURES.append("40P01")
+    assert not run(retrying).errors
+    assert len(ATTEMPTS) == 2
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.spend()
+    assert budget.spend()
+    assert not budget.spend()
+    budget.succeed()
+    assert not budget.spend()
+    budget.succeed()
+    assert budget.spend()
+    for _ in range(10):
+        budget.succeed()
+    assert budget.tokens == 2
@@ -0,0 +1,52 @@
+import asyncio
+import gzip
+
+from starlette.responses import Response
+
+from ticket.env.settings import Compression
+from ticket.middlewares.compression import CompressionMiddleware, negotiate
+
+
+def test_negotiate():
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br", encodings) == "br"
+    assert negotiate("br;q=0, gzip;q=0.5", encodings) == "gzip"
+    assert negotiate("*", encodings) == "zstd"
+    assert negotiate("identity", encodings) is None
+    assert negotiate("", encodings) is None
+
+
+def request(body: bytes, accept_encoding: str):
+    app = CompressionMiddleware(
+        Response(body, media_type="application/json"),
+        Compression(minimum_size=100, encodings=["gzip"]),
+    )
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return dict(messages[0]["headers"]), messages[1]["body"]
+
+
+def test_compression():
+    body = b'{"data": "' + b"1" * 1000 + b'"}'
+    headers, content = request(body, "gzip")
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(content)
+    assert gzip.decompress(content) == body
+    headers, content = request(body, "identity")
+    assert b"content-encoding" not in headers
+    assert content == body
+    headers, content = request(b'{"data": 1}', "gzip")
+    assert b"content-encoding" not in headers
@@ -0,0 +1,10 @@
+from . import test_filter
+from . import test_archive
+from . import test_ranges
+from . import test_search
+from . import test_changes
+from . import test_order
+from . import test_settlement
+from . import test_idempotency
+from . import test_partition
+from . import test_rollup
@@ -0,0 +1,38 @@
+from datetime import datetime
+from ticket.models.archive import TicketNumberArchive, OrderArchive
+from ticket.models.order import OrderState
+from ticket.models.ticket import TicketLineState
+
+
+def test_number_archive_lines():
+    record = TicketNumberArchive(
+        ticket_id=1,
+        user_code="user",
+        line_ids=[10, 12],
+        numbers=[5, 7],
+        create_date=datetime(2024, 1, 1),
+    )
+    lines = record.to_lines()
+    assert [(line.id, line.number) for line in lines] == [(10, 5), (12, 7)]
+    assert all(line.state == TicketLineState.SOLD for line in lines)
+
+
+def test_order_archive_ticket_line():
+    record = OrderArchive(
+        order_id=3,
+        ticket_id=1,
+        name="order",
+        state=OrderState.CANCEL,
+        user_code="user",
+        line_ids=[20, 21],
+        ticket_line_ids=[10, 12],
+        numbers=[5, 7],
+        create_date=datetime(2024, 1, 1),
+        write_date=datetime(2024, 1, 2),
+    )
+    assert [line.ticket_line_id for line in record.to_order_lines()] == [10, 12]
+    line = record.to_ticket_line(12)
+    assert line.number == 7
+    assert line.state == TicketLineState.AVAILABLE
+    assert line.user_code is None
+    assert record.to_ticket_line(11) is None
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql
+
+from ticket.models.changes import after_cursor, get_cursor, get_horizon
+from ticket.models.models import Tombstone
+from ticket.models.order import Order
+from ticket.models.ticket import Ticket, TicketLine
+
+
+def compiled(model, cursor) -> str:
+    return str(after_cursor(model, cursor).compile())
+
+
+def test_after_cursor():
+    cursor = (datetime(2024, 1, 1), TicketLine.__tablename__, 5)
+    # Tables before the cursor's in feed order already served its write_date
+    assert compiled(Tombstone, cursor).endswith("write_date > :write_date_1")
+    assert compiled(Ticket, cursor).endswith("write_date > :write_date_1")
+    # The cursor's table continues after its id
+    assert compiled(TicketLine, cursor) == (
+        "(ticket_line.write_date, ticket_line.id) > (:param_1, :param_2)"
+    )
+    # Tables after it still have rows of the same write_date to serve
+    assert compiled(Order, cursor).endswith("write_date >= :write_date_1")
+
+
+def test_feed_order():
+    write_date = datetime(2024, 1, 1)
+    rows = [
+        Order(id=1, write_date=write_date),
+        TicketLine(id=9, write_date=write_date),
+        TicketLine(id=3, write_date=write_date),
+        Tombstone(id=7, write_date=write_date),
+        Ticket(id=2, write_date=datetime(2023, 12, 31)),
+    ]
+    cursors = sorted(get_cursor(row) for row in rows)
+    assert [cursor[1:] for cursor in cursors] == [
+        ("ticket", 2),
+        ("change_tombstone", 7),
+        ("ticket_line", 3),
+        ("ticket_line", 9),
+        ("ticket_order", 1),
+    ]
+
+
+def test_tombstones_bound_as_one_array(session):
+    asyncio.run(Tombstone.record(session, "ticket_order", list(range(40000))))
+    compiled = session.statements[0].compile(dialect=postgresql.dialect())
+    arrays = [value for value in compiled.params.values() if isinstance(value, list)]
+    assert arrays == [list(range(40000))]
+    assert "unnest" in str(compiled)
+
+
+def test_horizon(session, caplog):
+    now = datetime(2024, 1, 1, 12)
+    lag = timedelta(seconds=2)
+    # Nothing open
+    session.returns((now, None, None))
+    assert asyncio.run(get_horizon(session, 2, 60)) == now - lag
+    oldest = now - timedelta(seconds=30)
+    session.returns((now, oldest, 42))
+    assert asyncio.run(get_horizon(session, 2, 60)) == oldest - lag
+    assert not caplog.records
+    # Held back longer than the warning
+    session.returns((now, oldest, 42))
+    assert asyncio.run(get_horizon(session, 2, 10)) == oldest - lag
+    assert "backend 42" in caplog.text
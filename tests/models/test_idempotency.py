@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+from ticket.models.idempotency import (
+    IdempotencyKeyReused,
+    InvalidIdempotencyKey,
+    OrderIdempotency,
+)
+
+
+def claim(sessionmaker, record=None, key: str = "key", fingerprint: str = "abc"):
+    session = sessionmaker()
+    if record:
+        # The key was inserted by an earlier call, which left its record
+        session.returns()
+        session.returns((record,))
+    else:
+        session.returns((key,))
+    return asyncio.run(
+        OrderIdempotency.claim(session, "user", key, "order_now", fingerprint)
+    )
+
+
+def test_claim(sessionmaker):
+    assert claim(sessionmaker) is None
+    record = SimpleNamespace(
+        operation="order_now", fingerprint="abc", response={"order_id": 1}
+    )
+    assert claim(sessionmaker, record) is record
+    with pytest.raises(IdempotencyKeyReused):
+        claim(sessionmaker, record, fingerprint="other")
+    record.operation = "cancel_order"
+    with pytest.raises(IdempotencyKeyReused):
+        claim(sessionmaker, record)
+    with pytest.raises(InvalidIdempotencyKey):
+        claim(sessionmaker, key="k" * 65)
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+from ticket.models.order import NOT_FOUND, Order, OrderLine
+from ticket.models.rollup import SaleRollup
+from ticket.models.ticket import (
+    Ticket,
+    TicketLine,
+    TicketLineState,
+    TicketNotOnSale,
+    TicketState,
+    int_array,
+)
+
+
+def test_reserve_lines_once(session, monkeypatch):
+    tracked = []
+
+    async def track(session, tkt_lines, prices, **counts):
+        tracked.extend(tkt_lines)
+
+    monkeypatch.setattr(SaleRollup, "track", track)
+    ticket = Ticket(id=1, price=10.0, available_count=5, reserved_count=0)
+    line = TicketLine(id=7, ticket_id=1, number=3, state=TicketLineState.AVAILABLE)
+    # Wanted both by ticket line id and by number
+    asyncio.run(Order.reserve_lines([ticket], [line, line], "user", session))
+    assert line.state == TicketLineState.RESERVED
+    assert (ticket.available_count, ticket.reserved_count) == (4, 1)
+    assert [record.ticket_line_id for record in session.added[1:]] == [7]
+    assert isinstance(session.added[1], OrderLine)
+    assert tracked == [line]
+
+
+def test_numbers_bound_as_one_array():
+    # A coalesced batch can want more numbers than a statement takes parameters
+    stmt = TicketLine.insert_available(1, func.unnest(int_array(range(40000))))
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    arrays = [value for value in compiled.params.values() if isinstance(value, list)]
+    assert arrays == [list(range(40000))]
+    assert len(compiled.params) < 10
+    assert "unnest" in str(compiled)
+
+
+@pytest.fixture(name="numbers")
+def fixture_numbers(monkeypatch):
+    ticket = Ticket(
+        id=1, start_num=0, end_num=99, state=TicketState.POSTED, archived=False
+    )
+    states = {5: TicketLineState.SOLD, 6: TicketLineState.RESERVED}
+
+    async def lock_tickets(ticket_ids, session):
+        return [ticket]
+
+    async def materialize(ticket_id, numbers, session):
+        return [
+            TicketLine(
+                id=number,
+                ticket_id=ticket_id,
+                number=number,
+                state=states.get(number, TicketLineState.AVAILABLE),
+            )
+            for number in numbers
+        ]
+
+    async def reserve_lines(tickets, tkt_lines, user_code, session):
+        return Order(id=1, line_ids=[])
+
+    monkeypatch.setattr(Order, "lock_tickets", lock_tickets)
+    monkeypatch.setattr(TicketLine, "materialize", materialize)
+    monkeypatch.setattr(Order, "reserve_lines", reserve_lines)
+    return ticket
+
+
+def order_numbers(session, numbers, partial):
+    return asyncio.run(
+        Order.order_numbers(1, numbers, "user", session, partial=partial)
+    )
+
+
+@pytest.mark.usefixtures("numbers")
+def test_order_numbers(sessionmaker):
+    session = sessionmaker()
+    order, conflicts = order_numbers(session, [1, 2], partial=False)
+    assert order and not conflicts
+    assert session.savepoint.outcome == "commit"
+    # One conflict refuses the whole order and rolls back its new rows
+    session = sessionmaker()
+    order, conflicts = order_numbers(session, [1, 5, 6, 200], partial=False)
+    assert order is None
+    assert conflicts == {5: "SOLD", 6: "RESERVED", 200: NOT_FOUND}
+    assert session.savepoint.outcome == "rollback"
+    # allow_partial orders the others
+    session = sessionmaker()
+    order, conflicts = order_numbers(session, [1, 5, 200], partial=True)
+    assert order and list(conflicts) == [5, 200]
+    assert session.savepoint.outcome == "commit"
+    # Nothing left to order
+    session = sessionmaker()
+    order, conflicts = order_numbers(session, [5, 6], partial=True)
+    assert order is None and list(conflicts) == [5, 6]
+    assert session.savepoint.outcome == "rollback"
+
+
+@pytest.mark.parametrize(
+    "state, archived",
+    [(TicketState.DRAFT, False), (TicketState.DONE, False), (TicketState.DONE, True)],
+)
+def test_order_numbers_not_on_sale(numbers, session, state, archived):
+    numbers.state, numbers.archived = state, archived
+    with pytest.raises(TicketNotOnSale):
+        order_numbers(session, [1, 2], partial=True)
+    # Refused before any number is materialized
+    assert session.savepoint.outcome is None and not session.added
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+
+from ticket.models.partition import (
+    LOCK_NOT_AVAILABLE,
+    has_partitions,
+    is_partition,
+    partition_name,
+    retry_locked,
+)
+from ticket.models.ticket import Ticket
+
+
+def db_error(sqlstate: str) -> DBAPIError:
+    return DBAPIError("ALTER TABLE", {}, SimpleNamespace(sqlstate=sqlstate))
+
+
+def failing_step(failures: List[str]):
+    calls: List[int] = []
+
+    async def step():
+        calls.append(1)
+        if failures:
+            raise db_error(failures.pop(0))
+
+    return step, calls
+
+
+def test_partition_names():
+    assert partition_name("ticket_line", 12) == "ticket_line_p12"
+    assert is_partition("ticket_order_line_p12")
+    assert not is_partition("ticket_line")
+
+
+def test_has_partitions_checks_the_line_partition():
+    sql = str(
+        select(Ticket.id)
+        .where(has_partitions(Ticket.id))
+        .compile(dialect=postgresql.dialect())
+    )
+    assert "to_regclass(concat(" in sql
+    assert "IS NOT NULL" in sql
+
+
+def test_retry_locked_retries_lock_timeouts():
+    step, calls = failing_step([LOCK_NOT_AVAILABLE, LOCK_NOT_AVAILABLE])
+    asyncio.run(retry_locked(step, lock_timeout=0, attempts=3))
+    assert len(calls) == 3
+
+
+def test_retry_locked_gives_up_after_its_attempts():
+    step, calls = failing_step([LOCK_NOT_AVAILABLE] * 3)
+    with pytest.raises(DBAPIError):
+        asyncio.run(retry_locked(step, lock_timeout=0, attempts=2))
+    assert len(calls) == 2
+
+
+def test_retry_locked_raises_other_errors_at_once():
+    step, calls = failing_step(["55000"])
+    with pytest.raises(DBAPIError):
+        asyncio.run(retry_locked(step, lock_timeout=0, attempts=3))
+    assert len(calls) == 1
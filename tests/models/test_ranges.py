@@ -0,0 +1,13 @@
+from ticket.models.ranges import to_ranges, complement
+
+
+def test_to_ranges():
+    assert not to_ranges([])
+    assert to_ranges([5, 1, 2, 3, 9, 2]) == [(1, 3), (5, 5), (9, 9)]
+
+
+def test_complement():
+    assert complement(0, 9, []) == [(0, 9)]
+    assert complement(0, 9, [0, 1, 5, 9]) == [(2, 4), (6, 8)]
+    assert complement(0, 3, [0, 1, 2, 3]) == []
+    assert complement(5, 7, [1, 6, 20]) == [(5, 5), (7, 7)]
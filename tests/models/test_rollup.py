@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Tuple
+from sqlalchemy.dialects import postgresql
+
+from ticket.models.rollup import SaleRollup
+from ticket.models.ticket import TicketLine
+
+PRICES = {1: 5.0, 2: 8.0}
+
+
+def line(ticket_id: int = 1, special_price: float = 0.0) -> TicketLine:
+    return TicketLine(
+        ticket_id=ticket_id,
+        is_special_price=bool(special_price),
+        special_price=special_price,
+    )
+
+
+def track(session, lines, **deltas) -> Dict[Tuple[int, float], Dict[str, float]]:
+    asyncio.run(SaleRollup.track(session, lines, PRICES, **deltas))
+    (stmt,) = session.statements
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    rows: Dict[int, Dict[str, float]] = {}
+    for name, value in params.items():
+        column, _, index = name.rpartition("_m")
+        rows.setdefault(int(index), {})[column] = value
+    assert {row.pop("day") for row in rows.values()} == {datetime.utcnow().date()}
+    # Upserted in (ticket_id, price) order
+    keys = [(row.pop("ticket_id"), row.pop("price")) for row in rows.values()]
+    assert keys == sorted(keys)
+    return dict(zip(keys, rows.values()))
+
+
+def counters(**values: float) -> Dict[str, float]:
+    return {
+        "reserved": 0,
+        "sold": 0,
+        "cancelled": 0,
+        "refunded": 0,
+        "revenue": 0,
+        **values,
+    }
+
+
+def test_track_reserve(session):
+    assert track(session, [line(2), line(), line()], reserved=1) == {
+        (1, 5.0): counters(reserved=2),
+        (2, 8.0): counters(reserved=1),
+    }
+
+
+def test_track_confirm(session):
+    # Special prices are rolled up on their own price and revenue
+    assert track(
+        session, [line(), line(), line(special_price=2.5)], sold=1, revenue=1
+    ) == {
+        (1, 2.5): counters(sold=1, revenue=2.5),
+        (1, 5.0): counters(sold=2, revenue=10.0),
+    }
+
+
+def test_track_cancel(session):
+    assert track(session, [line(), line(special_price=2.5)], cancelled=1) == {
+        (1, 2.5): counters(cancelled=1),
+        (1, 5.0): counters(cancelled=1),
+    }
+
+
+def test_track_refund(session):
+    lines = [line(), line(2), line(2, special_price=3.0)]
+    assert track(session, lines, cancelled=1, refunded=1, revenue=-1) == {
+        (1, 5.0): counters(cancelled=1, refunded=1, revenue=-5.0),
+        (2, 3.0): counters(cancelled=1, refunded=1, revenue=-3.0),
+        (2, 8.0): counters(cancelled=1, refunded=1, revenue=-8.0),
+    }
+
+
+def test_track_adds_to_the_day(session):
+    track(session, [line()], reserved=1)
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (ticket_id, day, price) DO UPDATE" in sql
+    assert "reserved = (ticket_sale_rollup.reserved + excluded.reserved)" in sql
+    assert "revenue = (ticket_sale_rollup.revenue + excluded.revenue)" in sql
+
+
+def test_track_nothing(session):
+    asyncio.run(SaleRollup.track(session, [], PRICES, reserved=1))
+    assert not session.statements
@@ -0,0 +1,8 @@
+from ticket.models.search import to_prefix_query
+
+
+def test_to_prefix_query():
+    assert to_prefix_query("") is None
+    assert to_prefix_query(" & !") is None
+    assert to_prefix_query("Rock") == "rock:*"
+    assert to_prefix_query("rock 'n' roll:*") == "rock:* & n:* & roll:*"
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+from ticket.models import settlement
+from ticket.models.order import OrderState
+from ticket.models.rollup import SaleRollup
+from ticket.models.settlement import SettleAction, move_lines, settle_orders
+from ticket.models.ticket import Ticket, TicketLineState
+
+
+def line(order_id: int, line_id: int, state: TicketLineState, ticket_id: int = 1):
+    return SimpleNamespace(
+        order_id=order_id,
+        id=line_id,
+        ticket_id=ticket_id,
+        state=state,
+        is_special_price=False,
+        special_price=0.0,
+    )
+
+
+def ticket(ticket_id: int = 1) -> Ticket:
+    return Ticket(
+        id=ticket_id, price=5.0, available_count=10, reserved_count=3, sold_count=2
+    )
+
+
+@pytest.fixture(name="tracked")
+def fixture_tracked(monkeypatch):
+    tracked = []
+
+    async def track(session, tkt_lines, prices, **counts):
+        if tkt_lines:
+            tracked.append(([tkt_line.id for tkt_line in tkt_lines], counts))
+
+    monkeypatch.setattr(SaleRollup, "track", track)
+    return tracked
+
+
+def test_move_lines(tracked, sessionmaker):
+    reserved = [line(1, 10, TicketLineState.RESERVED)]
+    sold = [line(2, 20, TicketLineState.SOLD), line(2, 21, TicketLineState.SOLD)]
+    tkt = ticket()
+    session = sessionmaker()
+    state = asyncio.run(move_lines(session, [tkt], reserved, [], SettleAction.CONFIRM))
+    assert state == OrderState.SUCCESSFUL
+    (lines,) = session.written("ticket_line")
+    assert lines["id_1"] == [10]
+    assert lines["state"] == TicketLineState.SOLD
+    assert (tkt.available_count, tkt.reserved_count, tkt.sold_count) == (10, 2, 3)
+    assert tracked == [([10], {"sold": 1, "revenue": 1})]
+    tracked.clear()
+    tkt = ticket()
+    session = sessionmaker()
+    state = asyncio.run(move_lines(session, [tkt], reserved, sold, SettleAction.CANCEL))
+    assert state == OrderState.CANCEL
+    (lines,) = session.written("ticket_line")
+    assert lines["id_1"] == [10, 20, 21]
+    assert (lines["state"], lines["user_code"]) == (TicketLineState.AVAILABLE, None)
+    assert (tkt.available_count, tkt.reserved_count, tkt.sold_count) == (13, 2, 0)
+    assert tracked == [
+        ([10], {"cancelled": 1}),
+        ([20, 21], {"cancelled": 1, "refunded": 1, "revenue": -1}),
+    ]
+
+
+def test_settle_orders(tracked, session, monkeypatch):
+    def order(order_id: int, state: OrderState):
+        return SimpleNamespace(id=order_id, state=state, user_code=f"user{order_id}")
+
+    async def lock_settle_lines(session, order_ids, action):
+        # Order 4 is already cancelled, a line of order 2 was sold behind it
+        orders = [
+            order(1, OrderState.DRAFT),
+            order(2, OrderState.DRAFT),
+            order(3, OrderState.SUCCESSFUL),
+        ]
+        lines = [
+            line(1, 10, TicketLineState.RESERVED),
+            line(2, 11, TicketLineState.RESERVED),
+            line(2, 12, TicketLineState.SOLD),
+            line(3, 13, TicketLineState.SOLD),
+        ]
+        return [tkt], {order.id: order for order in orders}, lines
+
+    monkeypatch.setattr(settlement, "lock_settle_lines", lock_settle_lines)
+    tkt = ticket()
+    result = asyncio.run(settle_orders(session, [1, 2, 3, 4], SettleAction.CANCEL))
+    assert result.settled == [1, 3]
+    assert result.skipped == [2, 4]
+    assert result.user_codes == ["user1", "user3"]
+    assert (tkt.available_count, tkt.reserved_count, tkt.sold_count) == (12, 2, 1)
+    assert tracked == [
+        ([10], {"cancelled": 1}),
+        ([13], {"cancelled": 1, "refunded": 1, "revenue": -1}),
+    ]
+    # Only the lines and orders settled are written
+    (lines,) = session.written("ticket_line")
+    assert lines["id_1"] == [10, 13]
+    assert lines["state"] == TicketLineState.AVAILABLE
+    (orders,) = session.written("ticket_order")
+    assert orders["id_1"] == [1, 3]
+    assert orders["state"] == OrderState.CANCEL
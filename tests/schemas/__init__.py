@@ -0,0 +1,4 @@
+from . import test_changes
+from . import test_order_func
+from . import test_ticket
+from . import test_order
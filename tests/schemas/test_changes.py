@@ -0,0 +1,32 @@
+from base64 import urlsafe_b64encode
+from datetime import datetime
+import pytest
+
+from ticket.schemas.changes import decode_change_cursor, encode_change_cursor
+from ticket.schemas.schemas import InvalidCursor
+
+
+def encode(value: str) -> str:
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def test_change_cursor():
+    cursor = (datetime(2024, 1, 2, 3, 4, 5, 678), "ticket_line", 42)
+    assert decode_change_cursor(encode_change_cursor(cursor)) == cursor
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "not base64!",
+        encode("2024-01-01|ticket"),
+        encode("2024-01-01|ticket|1|2"),
+        encode("not a date|ticket|1"),
+        encode("2024-01-01|ticket|one"),
+        urlsafe_b64encode(b"\xff\xfe|ticket|1").decode(),
+    ],
+)
+def test_invalid_change_cursor(value):
+    with pytest.raises(InvalidCursor):
+        decode_change_cursor(value)
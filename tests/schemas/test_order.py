@@ -0,0 +1,128 @@
+import asyncio
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+
+from ticket.models.order import Order, OrderState
+from ticket.schemas import order as order_schema
+from ticket.schemas.order import OrderGql, decode_cursor, encode_cursor
+from ticket.schemas.schemas import MAX_PAGE_SIZE, InvalidCursor
+
+START = datetime(2024, 1, 1)
+
+
+class FakeLoaders:
+    def __init__(self) -> None:
+        self.primed = []
+
+    async def prime_orders(self, orders):
+        self.primed.append([order.id for order in orders])
+
+
+@pytest.fixture(name="pages")
+def fixture_pages(monkeypatch):
+    # Orders an hour apart, two of them created at the same time
+    orders = [
+        Order(
+            id=order_id,
+            name="order",
+            state=OrderState.CANCEL if order_id % 3 == 0 else OrderState.SUCCESSFUL,
+            user_code="user",
+            create_date=START + timedelta(hours=min(order_id, 200)),
+            write_date=START,
+        )
+        for order_id in range(1, 202)
+    ]
+    calls = []
+
+    async def get_user(info):
+        return "user"
+
+    async def get_user_orders_page(session, user_code, limit, **filters):
+        calls.append({"limit": limit, **filters})
+        # Same filters and order as the query
+        rows = sorted(orders, key=lambda odr: (odr.create_date, odr.id), reverse=True)
+        if filters["states"]:
+            rows = [odr for odr in rows if odr.state in filters["states"]]
+        if filters["date_from"]:
+            rows = [odr for odr in rows if odr.create_date >= filters["date_from"]]
+        if filters["date_to"]:
+            rows = [odr for odr in rows if odr.create_date < filters["date_to"]]
+        if filters["after"]:
+            rows = [odr for odr in rows if (odr.create_date, odr.id) < filters["after"]]
+        return rows[:limit]
+
+    monkeypatch.setattr(OrderGql, "get_user", get_user)
+    monkeypatch.setattr(order_schema, "get_user_orders_page", get_user_orders_page)
+    return calls
+
+
+def page(loaders=None, **kwargs):
+    info = SimpleNamespace(
+        context={"ro_db_session": None, "loaders": loaders or FakeLoaders()}
+    )
+    return asyncio.run(OrderGql.my_orders_connection(info, **kwargs))
+
+
+def ids(connection):
+    return [int(order.id) for order in connection.items]
+
+
+def test_order_cursor():
+    order = Order(id=7, create_date=datetime(2024, 1, 2, 3, 4, 5, 678))
+    assert decode_cursor(encode_cursor(order)) == (order.create_date, 7)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "not base64!",
+        urlsafe_b64encode(b"2024-01-01").decode(),
+        urlsafe_b64encode(b"not a date|1").decode(),
+        urlsafe_b64encode(b"2024-01-01|one").decode(),
+        urlsafe_b64encode(b"\xff\xfe|1").decode(),
+    ],
+)
+def test_invalid_order_cursor(value):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(value)
+
+
+@pytest.mark.usefixtures("pages")
+def test_pages():
+    loaders = FakeLoaders()
+    first = page(loaders, first=2)
+    # 201 and 200 share their create_date, the id breaks the tie
+    assert ids(first) == [201, 200]
+    assert first.has_next_page
+    second = page(loaders, first=2, after=first.end_cursor)
+    assert ids(second) == [199, 198]
+    # Lines of each page are loaded together
+    assert loaders.primed == [[201, 200], [199, 198]]
+    cursor = encode_cursor(Order(id=3, create_date=START + timedelta(hours=3)))
+    last = page(first=5, after=cursor)
+    assert ids(last) == [2, 1]
+    assert not last.has_next_page
+    empty = page(after=last.end_cursor)
+    assert not ids(empty) and empty.end_cursor is None and not empty.has_next_page
+
+
+def test_page_bounds(pages):
+    assert len(ids(page(first=10**6))) == MAX_PAGE_SIZE
+    assert len(ids(page(first=0))) == 1
+    assert len(ids(page(first=-5))) == 1
+    # One more row tells whether there is a next page
+    assert [call["limit"] for call in pages] == [MAX_PAGE_SIZE + 1, 2, 2]
+
+
+def test_filters(pages):
+    # Aware dates are compared with the naive UTC create_date
+    date_from = (START + timedelta(hours=10)).replace(tzinfo=timezone.utc)
+    date_to = datetime(2024, 1, 1, 16, tzinfo=timezone(timedelta(hours=2)))
+    connection = page(states=[OrderState.CANCEL], date_from=date_from, date_to=date_to)
+    assert ids(connection) == [12]
+    assert pages[0]["date_from"] == START + timedelta(hours=10)
+    assert pages[0]["date_to"] == START + timedelta(hours=14)
+    assert ids(page(date_to=START + timedelta(hours=3))) == [2, 1]
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+from itertools import count
+import pytest
+
+from ticket.models.archive import OrderArchive
+from ticket.models.order import (
+    MAX_ORDER_NUMBERS,
+    InvalidNumberRange,
+    Order,
+    OrderState,
+    TooManyNumbers,
+)
+from ticket.schemas.order_func import (
+    NumberRangeInput,
+    OrderFuncGql,
+    check_order_size,
+    expand_numbers,
+)
+
+
+def test_replayed_order(session, monkeypatch):
+    archived = {
+        5: Order(
+            id=5,
+            name="order",
+            state=OrderState.SUCCESSFUL,
+            user_code="user",
+            create_date=datetime(2024, 1, 1),
+            write_date=datetime(2024, 1, 1),
+        )
+    }
+
+    async def get_orders(order_ids, session):
+        return [archived[order_id] for order_id in order_ids if order_id in archived]
+
+    monkeypatch.setattr(OrderArchive, "get_orders", get_orders)
+    live = session.records[4] = Order(id=4)
+    assert asyncio.run(OrderFuncGql.get_replayed_order(4, session)) is live
+    # Archived since its response was stored
+    order = asyncio.run(OrderFuncGql.get_replayed_order(5, session))
+    assert order is archived[5]
+    # Deleted with its ticket
+    assert asyncio.run(OrderFuncGql.get_replayed_order(6, session)) is None
+
+
+def test_expand_numbers():
+    assert not expand_numbers(None, None)
+    assert expand_numbers([9, 1], [NumberRangeInput(start=3, end=5)]) == [1, 3, 4, 5, 9]
+    # Overlaps count once
+    ranges = [NumberRangeInput(start=1, end=600), NumberRangeInput(start=400, end=1000)]
+    assert len(expand_numbers([1000], ranges)) == MAX_ORDER_NUMBERS
+    assert expand_numbers(None, [NumberRangeInput(start=7, end=7)]) == [7]
+
+
+def test_expand_numbers_rejected():
+    with pytest.raises(InvalidNumberRange):
+        expand_numbers(None, [NumberRangeInput(start=5, end=4)])
+    with pytest.raises(TooManyNumbers):
+        expand_numbers(None, [NumberRangeInput(start=0, end=10**9)])
+    with pytest.raises(TooManyNumbers):
+        expand_numbers(list(range(MAX_ORDER_NUMBERS + 1)), None)
+    # Endless ranges under the cap each are stopped once their total passes it
+    ranges = (
+        NumberRangeInput(start=start, end=start + 999) for start in count(0, 1000)
+    )
+    with pytest.raises(TooManyNumbers):
+        expand_numbers(None, ranges)
+
+
+def test_check_order_size():
+    check_order_size(None, None)
+    # A line wanted twice counts once
+    check_order_size([1] * 2000, list(range(MAX_ORDER_NUMBERS - 1)))
+    with pytest.raises(TooManyNumbers):
+        check_order_size(None, list(range(MAX_ORDER_NUMBERS + 1)))
+    with pytest.raises(TooManyNumbers):
+        check_order_size([1, 2], list(range(MAX_ORDER_NUMBERS - 1)))
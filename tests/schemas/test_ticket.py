@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+
+from ticket.models.ticket import Ticket, TicketLine, TicketLineState
+from ticket.schemas.ticket import TicketLineGql
+from ticket.services.cache import UserTtlCache
+
+
+@pytest.fixture(name="numbers")
+def fixture_numbers(monkeypatch):
+    state = SimpleNamespace(
+        versions={"primary": datetime(2024, 1, 1), "replica": datetime(2024, 1, 1)},
+        lines=[(1, TicketLineState.RESERVED), (2, TicketLineState.SOLD)],
+        reads=0,
+    )
+
+    async def get_user(info):
+        return "user"
+
+    async def get_write_date(ticket_id, session):
+        return state.versions[session]
+
+    async def get_user_numbers(ticket_id, user_code, engine):
+        assert engine == "replica"
+        state.reads += 1
+        return state.lines
+
+    monkeypatch.setattr(TicketLineGql, "get_user", get_user)
+    monkeypatch.setattr(Ticket, "get_write_date", get_write_date)
+    monkeypatch.setattr(TicketLine, "get_user_numbers", get_user_numbers)
+    return state
+
+
+def my_numbers(cache):
+    info = SimpleNamespace(
+        context={
+            "my_numbers_cache": cache,
+            "db_session": "primary",
+            "ro_db_session": "replica",
+        }
+    )
+    return asyncio.run(TicketLineGql.my_numbers(info, 1))
+
+
+def test_my_numbers_cached_until_the_ticket_is_written(numbers):
+    cache = UserTtlCache(ttl=60, max_users=10)
+    assert [(r.start, r.end) for r in my_numbers(cache).reserved] == [(1, 1)]
+    assert [(r.start, r.end) for r in my_numbers(cache).sold] == [(2, 2)]
+    assert numbers.reads == 1
+    # Written through another worker, whose cache this one never hears of
+    numbers.versions = dict.fromkeys(numbers.versions, datetime(2024, 1, 2))
+    numbers.lines = [(1, TicketLineState.SOLD), (2, TicketLineState.SOLD)]
+    assert [(r.start, r.end) for r in my_numbers(cache).sold] == [(1, 2)]
+    assert numbers.reads == 2
+
+
+def test_my_numbers_not_cached_behind_the_primary(numbers):
+    cache = UserTtlCache(ttl=60, max_users=10)
+    # The replica has not replayed the last write yet
+    numbers.versions["primary"] = datetime(2024, 1, 2)
+    my_numbers(cache)
+    my_numbers(cache)
+    assert numbers.reads == 2
+    numbers.versions["replica"] = datetime(2024, 1, 2)
+    my_numbers(cache)
+    my_numbers(cache)
+    assert numbers.reads == 3
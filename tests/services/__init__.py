@@ -0,0 +1,9 @@
+from . import test_cache
+from . import test_admission
+from . import test_periodic
+from . import test_auth
+from . import test_coalescer
+from . import test_reconcile
+from . import test_jobs
+from . import test_idempotency
+from . import test_lifecycle
@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+
+from ticket.env.settings import Admission
+from ticket.services.admission import AdmissionController, Overloaded
+
+
+def test_admission():
+    async def run():
+        setting = Admission(ticket_limit=1, ticket_max_queue=1, per_user=1)
+        admission = AdmissionController(setting, global_limit=2)
+        release = await admission.admit("a", ticket_id=1)
+        with pytest.raises(Overloaded):
+            await admission.admit("a", ticket_id=2)
+        queued = asyncio.create_task(admission.admit("b", ticket_id=1))
+        await asyncio.sleep(0)
+        assert admission.ticket_limits[1].queued == 1
+        with pytest.raises(Overloaded):
+            await admission.admit("c", ticket_id=1)
+        release()
+        (await queued)()
+        assert not admission.ticket_limits
+        assert admission.rejected["user"] == 1
+        assert admission.rejected["queue"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,30 @@
+import asyncio
+
+from ticket.services.auth import LazyAuth
+
+
+class Odoo:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def get_odoo_user(self, token: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return "admin" if token == "good" else ""
+
+
+def test_lazy_auth():
+    async def run():
+        odoo = Odoo()
+        auth = LazyAuth("Odoo", "good", None, odoo)
+        assert not odoo.calls
+        context = {}
+        await asyncio.gather(auth.resolve(context), auth.resolve(context))
+        await auth.resolve(context)
+        assert context == {"odoo_user": "admin"}
+        assert odoo.calls == 1
+        anonymous = {}
+        await LazyAuth("", "", None, odoo).resolve(anonymous)
+        assert not anonymous
+
+    asyncio.run(run())
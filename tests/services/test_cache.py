@@ -0,0 +1,21 @@
+from ticket.services.cache import UserTtlCache
+
+
+def test_user_ttl_cache():
+    cache = UserTtlCache(ttl=60, max_users=2)
+    cache.set("a", 1, "a1")
+    cache.set("a", 2, "a2")
+    cache.set("b", 1, "b1")
+    assert cache.get("a", 1) == "a1"
+    cache.invalidate("a")
+    assert cache.get("a", 2) is None
+    assert cache.get("b", 1) == "b1"
+    cache.set("c", 1, "c1")
+    cache.set("d", 1, "d1")
+    assert cache.get("b", 1) is None
+
+
+def test_user_ttl_cache_expire():
+    cache = UserTtlCache(ttl=-1, max_users=2)
+    cache.set("a", 1, "a1")
+    assert cache.get("a", 1) is None
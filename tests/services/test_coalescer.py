@@ -0,0 +1,171 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from graphql import parse
+
+from ticket.env.settings import Coalesce
+from ticket.models.order import Order, Reservation
+from ticket.models.ticket import TicketLineNotAvailable
+from ticket.schemas.order_func import OrderFuncGql
+from ticket.services.coalescer import ReservationCoalescer
+
+
+@pytest.fixture(name="calls")
+def fixture_calls(monkeypatch):
+    calls = []
+
+    async def order_many(ticket_id, reservations, session):
+        calls.append([reservation.user_code for reservation in reservations])
+        await asyncio.sleep(0)
+        return [
+            (
+                TicketLineNotAvailable(reservation.user_code)
+                if reservation.user_code.startswith("taken")
+                else Order(id=len(calls), user_code=reservation.user_code)
+            )
+            for reservation in reservations
+        ]
+
+    async def cancel_order(record_id, user_code, session):
+        calls.append(["cancel", user_code])
+
+    monkeypatch.setattr(Order, "order_many", order_many)
+    monkeypatch.setattr(Order, "cancel_order", cancel_order)
+    return calls
+
+
+@pytest.fixture(name="coalescer")
+def fixture_coalescer(sessionmaker):
+    def coalescer(window: float = 0.01, max_batch: int = 64) -> ReservationCoalescer:
+        res = ReservationCoalescer(None, Coalesce(window=window, max_batch=max_batch))
+        res.sessionmaker = sessionmaker
+        return res
+
+    return coalescer
+
+
+def test_window(calls, coalescer, sessionmaker):
+    async def run():
+        batcher = coalescer()
+        orders = await asyncio.gather(
+            batcher.reserve(1, Reservation(user_code="a")),
+            batcher.reserve(1, Reservation(user_code="b")),
+            batcher.reserve(2, Reservation(user_code="c")),
+        )
+        assert [order.user_code for order in orders] == ["a", "b", "c"]
+        assert sorted(calls) == [["a", "b"], ["c"]]
+        # One transaction per ticket
+        assert [session.commits for session in sessionmaker.sessions] == [1, 1]
+
+    asyncio.run(run())
+
+
+def test_max_batch(calls, coalescer):
+    async def run():
+        batcher = coalescer(window=10, max_batch=2)
+        await asyncio.wait_for(
+            asyncio.gather(
+                batcher.reserve(1, Reservation(user_code="a")),
+                batcher.reserve(1, Reservation(user_code="b")),
+            ),
+            timeout=1,
+        )
+        assert calls == [["a", "b"]]
+        assert not batcher.batches
+
+    asyncio.run(run())
+
+
+def test_errors(calls, coalescer, sessionmaker, monkeypatch):
+    async def run():
+        batcher = coalescer()
+        results = await asyncio.gather(
+            batcher.reserve(1, Reservation(user_code="a")),
+            batcher.reserve(1, Reservation(user_code="taken")),
+            return_exceptions=True,
+        )
+        assert results[0].user_code == "a"
+        assert isinstance(results[1], TicketLineNotAvailable)
+
+        async def broken(ticket_id, reservations, session):
+            raise RuntimeError("down")
+
+        monkeypatch.setattr(Order, "order_many", broken)
+        sessionmaker.sessions.clear()
+        results = await asyncio.gather(
+            batcher.reserve(1, Reservation(user_code="a")),
+            batcher.reserve(1, Reservation(user_code="b")),
+            return_exceptions=True,
+        )
+        assert [str(result) for result in results] == ["down", "down"]
+        # Nothing reserved is committed
+        assert not sessionmaker.commits
+
+    asyncio.run(run())
+
+
+def test_abandoned(calls, coalescer, sessionmaker, monkeypatch):
+    order_many = Order.order_many
+
+    async def slow_order_many(ticket_id, reservations, session):
+        results = await order_many(ticket_id, reservations, session)
+        await asyncio.sleep(0.01)
+        return results
+
+    async def run():
+        batcher = coalescer()
+        gone = asyncio.create_task(batcher.reserve(1, Reservation(user_code="gone")))
+        kept = asyncio.create_task(batcher.reserve(1, Reservation(user_code="kept")))
+        await asyncio.sleep(0)
+        gone.cancel()
+        assert (await kept).user_code == "kept"
+        assert calls == [["kept"]]
+        calls.clear()
+        # Gives up while its batch is being reserved
+        monkeypatch.setattr(Order, "order_many", slow_order_many)
+        gone = asyncio.create_task(batcher.reserve(1, Reservation(user_code="gone")))
+        kept = asyncio.create_task(batcher.reserve(1, Reservation(user_code="kept")))
+        while not calls:
+            await asyncio.sleep(0.001)
+        gone.cancel()
+        assert (await kept).user_code == "kept"
+        assert calls == [["gone", "kept"], ["kept"]]
+        # Rolled back and reserved again without it, in the same session
+        session = sessionmaker.sessions[-1]
+        assert (session.rollbacks, session.commits) == (1, 1)
+        await batcher.stop()
+        assert ["cancel", "gone"] not in calls
+        calls.clear()
+        # Gives up while its batch is committing, its order is cancelled
+        monkeypatch.setattr(Order, "order_many", order_many)
+        committing = asyncio.Event()
+
+        def slow_sessionmaker():
+            session = sessionmaker()
+
+            async def commit():
+                committing.set()
+                await asyncio.sleep(0.01)
+
+            session.commit = commit
+            return session
+
+        batcher.sessionmaker = slow_sessionmaker
+        gone = asyncio.create_task(batcher.reserve(1, Reservation(user_code="gone")))
+        await committing.wait()
+        gone.cancel()
+        await batcher.stop()
+        assert calls == [["gone"], ["cancel", "gone"]]
+
+    asyncio.run(run())
+
+
+def test_single_root_field():
+    def info(query: str):
+        return SimpleNamespace(operation=parse(query).definitions[0])
+
+    assert OrderFuncGql.single_root_field(info("mutation { orderNow { id } }"))
+    assert not OrderFuncGql.single_root_field(
+        info("mutation { a: orderNow { id } b: orderNow { id } }")
+    )
+    assert not OrderFuncGql.single_root_field(info("mutation { ...F }"))
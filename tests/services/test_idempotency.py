@@ -0,0 +1,28 @@
+import asyncio
+
+from ticket.services.idempotency import InFlight
+
+
+def test_in_flight():
+    async def run():
+        in_flight = InFlight()
+        order = []
+
+        async def request(name: str, key: str):
+            await in_flight.start(key)
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+            in_flight.finish(key)
+
+        await asyncio.gather(
+            request("a", "key"), request("b", "key"), request("c", "other")
+        )
+        # Duplicates of a key run one after the other, other keys do not wait
+        assert order.index("a end") < order.index("b start")
+        assert order.index("c start") < order.index("a end")
+        assert not in_flight.requests
+        # Finishing a key which is not held is a no-op
+        in_flight.finish("key")
+
+    asyncio.run(run())
@@ -0,0 +1,201 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import pytest
+
+from ticket.env.settings import Jobs, Partitions
+from ticket.models.job import Job, JobState
+from ticket.services import jobs
+from ticket.services.jobs import JobContext, JobRunner
+
+
+class Queue:
+    # In memory stand-in of the job table, with the same claim and fencing
+    def __init__(self) -> None:
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        self.now = 0.0
+
+    def add(self, kind: str, arguments: Dict[str, Any]) -> int:
+        job_id = len(self.jobs) + 1
+        self.jobs[job_id] = {
+            "id": job_id,
+            "kind": kind,
+            "state": JobState.PENDING,
+            "arguments": arguments,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "locked_until": None,
+        }
+        return job_id
+
+    async def claim(self, session, lease):
+        for job in self.jobs.values():
+            if job["state"] == JobState.PENDING or (
+                job["state"] == JobState.RUNNING and job["locked_until"] < self.now
+            ):
+                job["state"] = JobState.RUNNING
+                job["attempts"] += 1
+                job["locked_until"] = self.now + lease
+                return SimpleNamespace(**job)
+        return None
+
+    def owned(self, job_id: int, attempts: int) -> bool:
+        job = self.jobs[job_id]
+        return job["attempts"] == attempts and job["state"] == JobState.RUNNING
+
+    async def report(self, session, job_id, attempts, progress, lease):
+        if not self.owned(job_id, attempts):
+            return False
+        self.jobs[job_id].update(progress=progress, locked_until=self.now + lease)
+        return True
+
+    async def finish(self, session, job_id, attempts, result=None, error=None):
+        if not self.owned(job_id, attempts):
+            return False
+        self.jobs[job_id].update(
+            state=JobState.FAILED if error else JobState.DONE,
+            result=result,
+            error=error,
+            locked_until=None,
+        )
+        return True
+
+
+HOOKS = {}
+
+
+@JobRunner.handler("test_count")
+async def count(runner: JobRunner, ctx: JobContext) -> Dict[str, Any]:
+    done = ctx.progress.get("done", 0)
+    while done < ctx.arguments["total"]:
+        done += 1
+        await HOOKS.get(done, asyncio.sleep)(0)
+        await ctx.report(done=done, runs=ctx.progress.get("runs", []) + [done])
+    return {"runs": ctx.progress["runs"]}
+
+
+@pytest.fixture(name="queue")
+def fixture_queue(monkeypatch):
+    queue = Queue()
+    HOOKS.clear()
+    monkeypatch.setattr(Job, "claim", queue.claim)
+    monkeypatch.setattr(Job, "report", queue.report)
+    monkeypatch.setattr(Job, "finish", queue.finish)
+    return queue
+
+
+@pytest.fixture(name="runner")
+def fixture_runner(sessionmaker):
+    def runner(max_attempts: int = 3) -> JobRunner:
+        res = JobRunner(
+            None,
+            SimpleNamespace(
+                jobs=Jobs(lease=10, max_attempts=max_attempts), partitions=Partitions()
+            ),
+        )
+        res.sessionmaker = sessionmaker
+        return res
+
+    return runner
+
+
+async def die(_):
+    # The worker stops without finishing, its lease keeps the job
+    raise asyncio.CancelledError()
+
+
+def test_claim(queue, runner):
+    job_id = queue.add("test_count", {"total": 2})
+    assert asyncio.run(runner().run()) == 1
+    job = queue.jobs[job_id]
+    assert job["state"] == JobState.DONE
+    assert job["result"] == {"runs": [1, 2]}
+    assert asyncio.run(runner().run_next()) is None
+
+
+def test_resume(queue, runner):
+    job_id = queue.add("test_count", {"total": 4})
+    HOOKS[3] = die
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(runner().run_next())
+    # Held until its lease runs out
+    assert asyncio.run(runner().run_next()) is None
+    queue.now = 11
+    del HOOKS[3]
+    assert asyncio.run(runner().run_next()) == job_id
+    job = queue.jobs[job_id]
+    assert job["attempts"] == 2
+    assert job["result"] == {"runs": [1, 2, 3, 4]}
+
+
+def test_lease_expiry(queue, runner):
+    job_id = queue.add("test_count", {"total": 3})
+
+    async def taken_over(_):
+        # The lease ran out and another worker finished the job meanwhile
+        del HOOKS[2]
+        queue.now = 11
+        assert await runner().run_next() == job_id
+
+    HOOKS[2] = taken_over
+    assert asyncio.run(runner().run_next()) == job_id
+    job = queue.jobs[job_id]
+    assert job["state"] == JobState.DONE
+    assert job["attempts"] == 2
+    # The first worker stopped at its next report and did not finish the job
+    assert job["result"] == {"runs": [1, 2, 3]}
+    assert job["progress"]["done"] == 3
+
+
+def test_max_attempts(queue, runner):
+    job_id = queue.add("test_count", {"total": 2})
+    HOOKS[1] = die
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(runner(max_attempts=1).run_next())
+    queue.now = 11
+    assert asyncio.run(runner(max_attempts=1).run_next()) == job_id
+    job = queue.jobs[job_id]
+    assert job["state"] == JobState.FAILED
+    assert job["error"].startswith("Claimed too many times")
+    assert job["progress"] == {}
+
+
+def test_delete_tickets_resume(queue, runner, monkeypatch):
+    # Order lines of each ticket, gone once its partitions are dropped
+    partitions = {1: [7, 8], 2: [9]}
+    deleted = {}
+
+    async def detach(engine, ticket_id, lock_timeout, attempts):
+        pass
+
+    async def get_order_ids(session, ticket_id):
+        return partitions.get(ticket_id, [])
+
+    async def drop(engine, ticket_id, lock_timeout, attempts):
+        partitions.pop(ticket_id, None)
+        await HOOKS.get(ticket_id, asyncio.sleep)(0)
+
+    async def delete_ticket(session, ticket_id, order_ids):
+        deleted[ticket_id] = order_ids
+        return len(order_ids)
+
+    monkeypatch.setattr(jobs, "detach_ticket_partitions", detach)
+    monkeypatch.setattr(jobs, "get_detached_order_ids", get_order_ids)
+    monkeypatch.setattr(jobs, "drop_ticket_partitions", drop)
+    monkeypatch.setattr(jobs, "delete_ticket", delete_ticket)
+    job_id = queue.add("delete_tickets", {"ticket_ids": [1, 2]})
+    # Dies once the partitions of the first ticket are dropped
+    HOOKS[1] = die
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(runner().run_next())
+    assert queue.jobs[job_id]["progress"]["order_ids"] == [7, 8]
+    del HOOKS[1]
+    queue.now = 11
+    assert asyncio.run(runner().run_next()) == job_id
+    # The orders of the first ticket are kept from the first attempt
+    assert deleted == {1: [7, 8], 2: [9]}
+    job = queue.jobs[job_id]
+    assert job["result"] == {"tickets": 2, "orders": 3}
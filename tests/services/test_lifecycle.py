@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from ticket.env.settings import Lifecycle
+from ticket.models.lifecycle import TRANSITIONS
+from ticket.models.ticket import Ticket, TicketState
+from ticket.services import lifecycle
+from ticket.services.lifecycle import OnSaleTickets, TicketScheduler
+
+NOW = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def ticket(ticket_id: int, start: int, end: int, state=TicketState.POSTED) -> Ticket:
+    return Ticket(
+        id=ticket_id,
+        state=state,
+        start_date=NOW + timedelta(hours=start),
+        end_date=NOW + timedelta(hours=end),
+    )
+
+
+def ids(tickets):
+    return [tkt.id for tkt in tickets]
+
+
+def test_on_sale_tickets():
+    on_sale = OnSaleTickets()
+    # Not loaded yet, readers fall back to the database
+    assert on_sale.get(NOW) is None
+    on_sale.set([ticket(1, -2, 1), ticket(2, -1, 3), ticket(3, 2, 4)])
+    current = on_sale.get(NOW)
+    assert ids(current) == [1, 2]
+    # Kept until the next ticket ends or starts
+    assert on_sale.get(NOW + timedelta(minutes=59)) is current
+    assert ids(on_sale.get(NOW + timedelta(hours=1))) == [2]
+    assert ids(on_sale.get(NOW + timedelta(hours=2))) == [2, 3]
+    assert ids(on_sale.get(NOW + timedelta(hours=5))) == []
+    # A new snapshot is filtered again right away
+    on_sale.set([ticket(4, 4, 6)])
+    assert ids(on_sale.get(NOW + timedelta(hours=5))) == [4]
+
+
+def test_transitions():
+    # Each transition picks up the tickets moved by the one before it
+    assert [(source, target) for source, target, _ in TRANSITIONS] == [
+        (TicketState.DRAFT, TicketState.POSTED),
+        (TicketState.POSTED, TicketState.DONE),
+    ]
+    assert [due.key for _, _, due in TRANSITIONS] == ["start_date", "end_date"]
+
+
+def test_apply_transitions(sessionmaker, monkeypatch):
+    tickets = {
+        1: ticket(1, -3, -1, TicketState.DRAFT),
+        2: ticket(2, -3, 1, TicketState.DRAFT),
+        3: ticket(3, 1, 2, TicketState.DRAFT),
+        4: ticket(4, -3, -2, TicketState.POSTED),
+        5: ticket(5, -3, -2, TicketState.POSTED),
+    }
+    batches = []
+
+    async def apply_transition(session, source, target, due, batch_size):
+        due_ids = [
+            tkt.id
+            for tkt in tickets.values()
+            if tkt.state == source and getattr(tkt, due.key) <= NOW
+        ][:batch_size]
+        for ticket_id in due_ids:
+            tickets[ticket_id].state = target
+        batches.append(due_ids)
+        return due_ids
+
+    monkeypatch.setattr(lifecycle, "apply_transition", apply_transition)
+    scheduler = TicketScheduler(None, Lifecycle(batch_size=2), OnSaleTickets())
+    scheduler.sessionmaker = sessionmaker
+    assert asyncio.run(scheduler.apply_transitions()) == 5
+    # Ticket 1 ended before it was ever posted and is done after one run
+    assert {ticket_id: tkt.state for ticket_id, tkt in tickets.items()} == {
+        1: TicketState.DONE,
+        2: TicketState.POSTED,
+        3: TicketState.DRAFT,
+        4: TicketState.DONE,
+        5: TicketState.DONE,
+    }
+    # Full batches are followed by another one
+    assert batches == [[1, 2], [], [1, 4], [5]]
@@ -0,0 +1,25 @@
+import asyncio
+
+from ticket.services.leader import lock_key
+from ticket.services.periodic import PeriodicTask
+
+
+class Follower:
+    async def lead(self, name: str) -> bool:
+        return name == "led"
+
+
+def test_periodic_leader():
+    async def run():
+        runs = []
+
+        async def func():
+            runs.append(1)
+
+        await PeriodicTask("other", 1, func, Follower()).run_once()
+        assert not runs
+        await PeriodicTask("led", 1, func, Follower()).run_once()
+        assert runs == [1]
+
+    asyncio.run(run())
+    assert lock_key("archive") == lock_key("archive") != lock_key("reconcile")
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from ticket.env.settings import Reconcile
+from ticket.models.counters import CounterDrift
+from ticket.services import reconcile
+from ticket.services.reconcile import CounterReconciler
+
+
+def test_reconcile(sessionmaker, monkeypatch, caplog):
+    watermarks = {}
+    sinces = []
+    batches = []
+
+    async def get_watermark(name, session):
+        return watermarks.get(name)
+
+    async def set_watermark(name, value, session):
+        watermarks[name] = value
+
+    async def get_touched_ticket_ids(session, since):
+        sinces.append(since)
+        return [1, 2, 3]
+
+    async def reconcile_ticket_counters(session, ids):
+        batches.append(ids)
+        return [
+            CounterDrift(
+                id=ticket_id,
+                old_available=10,
+                old_reserved=0,
+                old_sold=0,
+                available=9,
+                reserved=1,
+                sold=0,
+            )
+            for ticket_id in ids
+            if ticket_id == 2
+        ]
+
+    monkeypatch.setattr(reconcile.Watermark, "get_watermark", get_watermark)
+    monkeypatch.setattr(reconcile.Watermark, "set_watermark", set_watermark)
+    monkeypatch.setattr(reconcile, "get_touched_ticket_ids", get_touched_ticket_ids)
+    monkeypatch.setattr(
+        reconcile, "reconcile_ticket_counters", reconcile_ticket_counters
+    )
+    reconciler = CounterReconciler(None, Reconcile(batch_size=2, overlap=60))
+    reconciler.sessionmaker = sessionmaker
+
+    started = datetime.utcnow()
+    with caplog.at_level(logging.WARNING):
+        drifts = asyncio.run(reconciler.run())
+    # Without a watermark every ticket is checked
+    assert sinces == [datetime.min]
+    assert batches == [[1, 2], [3]]
+    assert [drift.id for drift in drifts] == [2]
+    assert "Ticket 2 counters drifted, available 10 -> 9" in caplog.text
+    watermark = watermarks[reconcile.WATERMARK]
+    assert watermark >= started
+
+    asyncio.run(reconciler.run())
+    # Changes committed while the previous run read are covered by the overlap
+    assert sinces[1] == watermark - timedelta(seconds=60)
+    assert watermarks[reconcile.WATERMARK] > watermark
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+from typing import List, Optional
+import pytest
+import strawberry
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import Info
+from starlette.requests import Request
+from sqlalchemy.exc import DBAPIError
+
+from ticket import main
+from ticket.env.settings import Batch
+from ticket.extensions.db_session import DbSessionExtension
+
+IMPORT_BUDGET = 5.0
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import ticket.main
+elapsed = time.perf_counter() - start
+from ticket.env.settings import get_settings
+print(json.dumps({
+    "elapsed": elapsed,
+    "modules": [name for name in ("grpc", "user_go", "asyncpg") if name in sys.modules],
+    "loads": get_settings.cache_info().misses,
+}))
+"""
+
+
+def test_import_time():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    assert result["modules"] == []
+    assert result["loads"] <= 1
+    assert result["elapsed"] < IMPORT_BUDGET
+
+
+LOADERS = []
+
+
+@strawberry.type
+class BatchQuery:
+    @strawberry.field
+    def echo(self, value: int) -> int:
+        return value
+
+    @strawberry.field
+    def shared(self, info: Info) -> bool:
+        return info.context["ro_db_session"] is info.context["shared_ro_db_session"]
+
+    @strawberry.field
+    def loaders(self, info: Info) -> int:
+        LOADERS.append(info.context["loaders"])
+        return len(LOADERS)
+
+    @strawberry.field
+    def fail(self) -> int:
+        raise DBAPIError("SELECT 1", {}, SimpleNamespace(sqlstate="57014"))
+
+
+class BatchContext(main.GraphQlContext):
+    async def get_context(self, request, response):
+        return {"request": request, "response": response, "db": None, "ro_db": None}
+
+
+@pytest.fixture(name="app")
+def fixture_app(sessionmaker, monkeypatch):
+    LOADERS.clear()
+    monkeypatch.setattr(
+        main, "get_settings", lambda: SimpleNamespace(batch=Batch(max_operations=4))
+    )
+    monkeypatch.setattr(main, "async_sessionmaker", lambda engine: sessionmaker)
+    return BatchContext(
+        schema=strawberry.Schema(BatchQuery, extensions=[DbSessionExtension])
+    )
+
+
+def post(app: BatchContext, body, key: Optional[str] = None):
+    headers = [(b"content-type", b"application/json")]
+    if key:
+        headers.append((b"idempotency-key", key.encode()))
+    messages = [{"type": "http.request", "body": json.dumps(body).encode()}]
+
+    async def receive():
+        return messages.pop(0)
+
+    request = Request(
+        {"type": "http", "method": "POST", "headers": headers, "query_string": b""},
+        receive,
+    )
+    response = asyncio.run(app.run(request))
+    return json.loads(response.body)
+
+
+def rejected(app: BatchContext, body, key: Optional[str] = None) -> str:
+    with pytest.raises(HTTPException) as err:
+        post(app, body, key)
+    assert err.value.status_code == 400
+    return err.value.reason
+
+
+def test_batch(app):
+    # A single operation is answered as before
+    assert post(app, {"query": "{ echo(value: 1) }"}) == {"data": {"echo": 1}}
+    results: List[dict] = post(
+        app,
+        [
+            {"query": "{ echo(value: 1) }"},
+            {"query": "query E($v: Int!) { echo(value: $v) }", "variables": {"v": 2}},
+            {"query": "{ nope }"},
+            {"query": "{ shared }"},
+        ],
+    )
+    assert results[0] == {"data": {"echo": 1}}
+    assert results[1] == {"data": {"echo": 2}}
+    assert results[2]["errors"]
+    assert results[3] == {"data": {"shared": True}}
+
+
+def test_batch_rejected(app):
+    assert "1 to 4" in rejected(app, [])
+    assert "1 to 4" in rejected(app, [{"query": "{ echo(value: 1) }"}] * 5)
+    assert "JSON objects" in rejected(app, [{"query": "{ echo(value: 1) }"}, 1])
+    assert "Idempotency-Key" in rejected(
+        app, [{"query": "{ echo(value: 1) }"}], key="key"
+    )
+    assert "No GraphQL query" in rejected(app, [{"variables": {}}])
+
+
+def test_batch_rollback(app, sessionmaker):
+    results = post(
+        app,
+        [
+            {"query": "{ loaders }"},
+            {"query": "{ loaders }"},
+            {"query": "{ fail }"},
+            {"query": "{ loaders }"},
+        ],
+    )
+    assert results[2]["errors"]
+    # Loaders are shared until the read transaction fails
+    first, second, after = LOADERS
+    assert first is second
+    assert after is not first
+    # Only the shared read session is rolled back, with the failed operation
+    assert [session.rollbacks for session in sessionmaker.sessions] == [1]
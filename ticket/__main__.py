@@ -0,0 +1,23 @@
+import uvicorn
+
+from ticket.env.settings import get_settings
+
+
+def main():
+    server = get_settings().server
+    options = {}
+    if server.log_config:
+        options["log_config"] = server.log_config
+    uvicorn.run(
+        "ticket.main:app",
+        host=server.host,
+        port=server.port,
+        workers=server.workers,
+        loop=server.loop,
+        http=server.http,
+        **options,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 import os
-from yaml import load, Loader
+from functools import cache
+from typing import List, Literal, Optional, Tuple
+from yaml import load
 from pydantic import BaseModel
 
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
 DEFAULT_SETTING_PATH = "settings.yaml"
 
 
@@ -15,8 +22,30 @@ class Credential(BaseModel):
     password: str
 
 
+class Pool(BaseModel):
+    # Connection budget of the whole cluster for one database
+    max_connections: int = 10
+    pool_size: int = 5
+    max_overflow: int = 5
+    pool_timeout: float = 30.0
+    pool_pre_ping: bool = True
+    # Connections opened and primed per worker before serving
+    min_connections: int = 1
+
+    def per_worker(self, processes: int) -> Tuple[int, int]:
+        budget = max(self.max_connections // max(processes, 1), 1)
+        pool_size = max(min(self.pool_size, budget), 1)
+        max_overflow = max(min(self.max_overflow, budget - pool_size), 0)
+        return pool_size, max_overflow
+
+    def warm_per_worker(self, processes: int) -> int:
+        return min(self.min_connections, self.per_worker(processes)[0])
+
+
 class Postgres(Server, Credential):
     database: str
+    echo: bool = False
+    pool: Pool = Pool()
 
 
 class Odoo(Credential):
@@ -53,8 +82,178 @@ class Services(BaseModel):
     postgres: PgDbs
 
 
+class Launcher(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    # Number of pods sharing the same databases
+    replicas: int = 1
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    log_config: Optional[str] = None
+    warm_up: bool = True
+
+    @property
+    def processes(self) -> int:
+        return self.workers * self.replicas
+
+
+class Leader(BaseModel):
+    # Periodic maintenance runs on one process of the whole deployment
+    enabled: bool = True
+    # Seconds a leader which stopped answering keeps its tasks
+    lease: float = 30.0
+
+
+class Archive(BaseModel):
+    enabled: bool = False
+    # Seconds between two runs
+    interval: float = 3600.0
+    tickets_per_run: int = 1
+    # Orders deleted per transaction
+    batch_size: int = 1000
+
+
+class Partitions(BaseModel):
+    # Creating, attaching, detaching and dropping the partitions of a ticket
+    # wait at most this many milliseconds for their locks, a step which timed
+    # out is tried up to attempts times
+    lock_timeout: int = 2000
+    attempts: int = 5
+    # Tickets with more numbers get their lines from a create_lines job
+    inline_lines: int = 10000
+
+
+class Admission(BaseModel):
+    enabled: bool = True
+    # Checkouts in progress per worker, defaults to its database connections
+    global_limit: Optional[int] = None
+    max_queue: int = 256
+    ticket_limit: int = 4
+    ticket_max_queue: int = 64
+    # Seconds a checkout may wait for its turn, longer expected waits are
+    # rejected right away
+    max_wait: float = 2.0
+    # Checkouts in progress or queued per user
+    per_user: int = 2
+
+
+class Retry(BaseModel):
+    # Attempts of an operation failing on a deadlock or serialization failure
+    max_attempts: int = 3
+    # Seconds, the backoff doubles per attempt and is drawn in [0, backoff]
+    base_delay: float = 0.01
+    max_delay: float = 0.2
+    # Retries allowed per successful operation, at most budget_max in a burst
+    budget_ratio: float = 0.1
+    budget_max: float = 10.0
+
+
+class Compression(BaseModel):
+    enabled: bool = True
+    # Smaller bodies are sent as they are
+    minimum_size: int = 1024
+    # Preferred first, br and zstd are skipped when their module is missing
+    encodings: List[str] = ["zstd", "br", "gzip"]
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    zstd_level: int = 3
+
+
+class Batch(BaseModel):
+    # Operations of one batched request, run in order on one read session
+    max_operations: int = 10
+
+
+class Idempotency(BaseModel):
+    # Seconds an Idempotency-Key is remembered
+    ttl: float = 86400.0
+    # Seconds between two purges of expired keys
+    interval: float = 3600.0
+
+
+class Coalesce(BaseModel):
+    enabled: bool = True
+    # Seconds reservations of a ticket wait for others to share their transaction
+    window: float = 0.002
+    max_batch: int = 64
+
+
+class Lifecycle(BaseModel):
+    enabled: bool = True
+    # Seconds between two runs, also how late a transition can be applied
+    interval: float = 30.0
+    # Tickets moved per transaction
+    batch_size: int = 500
+
+
+class Reconcile(BaseModel):
+    enabled: bool = False
+    # Seconds between two runs
+    interval: float = 300.0
+    # Tickets reconciled per transaction
+    batch_size: int = 100
+    # Seconds re-read before the watermark, write_date is set before commit
+    # so slow transactions can commit rows older than the last run
+    overlap: float = 60.0
+
+
+class Settlement(BaseModel):
+    # Orders settled per transaction
+    chunk_size: int = 500
+
+
+class Jobs(BaseModel):
+    enabled: bool = True
+    # Worker tasks per process
+    workers: int = 1
+    # Seconds between two polls of an idle worker
+    interval: float = 1.0
+    # Seconds a running job stays claimed without reporting progress
+    lease: float = 60.0
+    # Claims of a job before it is failed, a worker dying mid job counts
+    max_attempts: int = 3
+    # Ticket lines generated per transaction
+    chunk_size: int = 10000
+
+
+class Changes(BaseModel):
+    # Seconds kept off the end of the feed for clock skew between the app
+    # hosts and the database
+    lag: float = 2.0
+    # Seconds the oldest open transaction may hold the end of the feed back
+    # before it is logged
+    horizon_warning: float = 300.0
+    # Seconds tombstones of deleted rows are kept, readers further behind
+    # need a full sync
+    tombstone_ttl: float = 604800.0
+    # Seconds between two purges of expired tombstones
+    interval: float = 3600.0
+
+
+class Cache(BaseModel):
+    my_numbers_ttl: float = 30.0
+    my_numbers_users: int = 10000
+
+
 class Settings(BaseModel):
     version: str
+    server: Launcher = Launcher()
+    admission: Admission = Admission()
+    retry: Retry = Retry()
+    batch: Batch = Batch()
+    compression: Compression = Compression()
+    idempotency: Idempotency = Idempotency()
+    coalesce: Coalesce = Coalesce()
+    leader: Leader = Leader()
+    lifecycle: Lifecycle = Lifecycle()
+    archive: Archive = Archive()
+    partitions: Partitions = Partitions()
+    reconcile: Reconcile = Reconcile()
+    settlement: Settlement = Settlement()
+    jobs: Jobs = Jobs()
+    changes: Changes = Changes()
+    cache: Cache = Cache()
     services: Services
 
 
@@ -67,3 +266,8 @@ def load_setting(path: str) -> Settings:
 def load_setting_from_env():
     path = os.getenv("TICKET_SETTING_PATH", DEFAULT_SETTING_PATH)
     return load_setting(path=path)
+
+
+@cache
+def get_settings() -> Settings:
+    return load_setting_from_env()
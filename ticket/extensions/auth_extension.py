@@ -1,38 +1,46 @@
-from typing import Callable, Any, List
+from functools import cached_property
+from typing import Callable, Any, List, Optional
 from strawberry.types import Info
 from strawberry.extensions import FieldExtension
 
-from ticket.env.settings import load_setting_from_env
-
-settings = load_setting_from_env()
+from ticket.env.settings import get_settings
+from ticket.services.auth import LazyAuth
 
 
 class UnauthorizeError(Exception):
     pass
 
 
+async def resolve_auth(info: Info):
+    # Fills user_code, cid and scopes, or odoo_user, of the context on first use
+    auth: Optional[LazyAuth] = info.context.get("auth")
+    if auth:
+        await auth.resolve(info.context)
+
+
 class AuthExtension(FieldExtension):
     def __init__(self, scopes: List[str]) -> None:
+        # Field names of Scopes, resolved from the settings on first use
         self.scopes = scopes
         super().__init__()
 
+    @cached_property
+    def scope_values(self) -> List[str]:
+        scopes = get_settings().services.user.scopes
+        return [getattr(scopes, scope) for scope in self.scopes]
+
     async def resolve_async(
         self, next_: Callable[..., Any], source: Any, info: Info, **kwargs
     ):
+        await resolve_auth(info)
         user_scopes: List[str] = info.context.get("scopes")
         if user_scopes:
-            for scope in self.scopes:
+            for scope in self.scope_values:
                 if scope in user_scopes:
                     return await next_(source, info, **kwargs)
         raise UnauthorizeError("Unauthorized")
 
 
-OrderReadExt = AuthExtension(
-    scopes=[
-        settings.services.user.scopes.user_read,
-        settings.services.user.scopes.order_read,
-        settings.services.user.scopes.order_all,
-    ]
-)
+OrderReadExt = AuthExtension(scopes=["user_read", "order_read", "order_all"])
 
-OrderAllExt = AuthExtension(scopes=[settings.services.user.scopes.order_all])
+OrderAllExt = AuthExtension(scopes=["order_all"])
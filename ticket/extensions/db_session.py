@@ -1,17 +1,129 @@
+import asyncio
+import contextlib
+import logging
+import random
+from functools import cached_property
+from typing import Any, Callable, List, Optional
+import strawberry
 from strawberry.extensions import SchemaExtension
-from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from strawberry.types import ExecutionResult
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from ticket.env.settings import Retry, get_settings
+from ticket.schemas.loaders import Loaders
+
+_logger = logging.getLogger(__name__)
+
+# serialization_failure and deadlock_detected, the transaction was rolled back
+# and can be replayed as is
+RETRYABLE_SQLSTATES = ("40001", "40P01")
 
 
 class DbSessionExtension(SchemaExtension):
     async def on_operation(self):  # pylint: disable=W0236
         db: AsyncEngine = self.execution_context.context["db"]
         ro_db: AsyncEngine = self.execution_context.context["ro_db"]
-        async with async_sessionmaker(ro_db)() as ro_session:
+        # Operations of a batch share the read session and loaders of their request
+        ro_session: Optional[AsyncSession] = self.execution_context.context.get(
+            "shared_ro_db_session"
+        )
+        async with contextlib.AsyncExitStack() as stack:
+            if ro_session is None:
+                ro_session = await stack.enter_async_context(
+                    async_sessionmaker(ro_db)()
+                )
+                self.execution_context.context["loaders"] = Loaders(ro_session)
             self.execution_context.context["ro_db_session"] = ro_session
             async with async_sessionmaker(db)() as session:
                 self.execution_context.context["db_session"] = session
-                yield
-                if self.execution_context.errors:
-                    await session.rollback()
-                else:
-                    await session.commit()
+                # Callbacks run only once the changes are committed
+                on_commit: List[Callable[[], Any]] = []
+                self.execution_context.context["on_commit"] = on_commit
+                # Callbacks run once the transaction ended, whatever its outcome
+                on_finish: List[Callable[[], Any]] = []
+                self.execution_context.context["on_finish"] = on_finish
+                try:
+                    yield
+                    if self.execution_context.errors:
+                        await session.rollback()
+                    else:
+                        await session.commit()
+                        for callback in on_commit:
+                            callback()
+                finally:
+                    for callback in on_finish:
+                        callback()
+
+
+def get_retryable_error(
+    result: Optional[ExecutionResult], error: Optional[BaseException] = None
+) -> Optional[BaseException]:
+    errors = [error] if error else []
+    if result and result.errors:
+        errors.extend(err.original_error for err in result.errors)
+    for err in errors:
+        if (
+            isinstance(err, DBAPIError)
+            and getattr(err.orig, "sqlstate", None) in RETRYABLE_SQLSTATES
+        ):
+            return err
+    return None
+
+
+class RetryBudget:
+    # Retries are earned by successful operations so a database in trouble is
+    # not hit by a retry storm
+    def __init__(self, ratio: float, max_tokens: float) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def succeed(self):
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryingSchema(strawberry.Schema):
+    # Every execution opens new sessions through DbSessionExtension, so a
+    # retry replays the operation in a new transaction. Only side effects
+    # kept in that transaction are safe to replay, resolvers committing
+    # elsewhere must not run in an operation which can fail after them.
+    @cached_property
+    def retry(self) -> Retry:
+        return get_settings().retry
+
+    @cached_property
+    def retry_budget(self) -> RetryBudget:
+        return RetryBudget(self.retry.budget_ratio, self.retry.budget_max)
+
+    async def execute(self, *args, **kwargs) -> ExecutionResult:
+        attempt = 1
+        while True:
+            result: Optional[ExecutionResult] = None
+            try:
+                result = await super().execute(*args, **kwargs)
+                error = get_retryable_error(result)
+            except DBAPIError as err:
+                # Failed on commit
+                error = get_retryable_error(None, err)
+                if not error:
+                    raise
+            if not error:
+                self.retry_budget.succeed()
+                return result
+            if attempt >= self.retry.max_attempts or not self.retry_budget.spend():
+                if result:
+                    return result
+                raise error
+            backoff = min(
+                self.retry.base_delay * 2 ** (attempt - 1), self.retry.max_delay
+            )
+            _logger.info("Retrying operation, attempt %d failed: %s", attempt, error)
+            await asyncio.sleep(random.uniform(0, backoff))
+            attempt += 1
@@ -1,22 +1,42 @@
 import contextlib
+import json
 import logging
-from typing import Tuple
-import grpc
+from typing import Any, List, Optional, Tuple
 from starlette.applications import Starlette
 from starlette.requests import Request
 from starlette.websockets import WebSocket
-from starlette.responses import Response
+from starlette.responses import PlainTextResponse, Response
 from starlette.middleware.cors import CORSMiddleware
-import strawberry
 from strawberry.asgi import GraphQL
-from user_go import user_go_pb2, user_go_pb2_grpc
+from strawberry.exceptions import MissingQueryError
+from strawberry.http.exceptions import HTTPException
+from strawberry.unset import UNSET
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from ticket.env.settings import load_setting_from_env
+from ticket.env.settings import Settings, get_settings
 from ticket.services.odoo import Odoo
-from ticket.services.engine import get_pg_engine
+from ticket.services.user import UserGrpc
+from ticket.services.auth import LazyAuth
+from ticket.services.engine import get_pg_engine_from_setting
 from ticket.services.db_loader import DbLoader
+from ticket.services.periodic import PeriodicTask
+from ticket.services.leader import LeaderElection
+from ticket.services.cache import UserTtlCache
+from ticket.services.admission import AdmissionController
+from ticket.services.coalescer import ReservationCoalescer
+from ticket.services.idempotency import IdempotencyPurger, InFlight
+from ticket.services.jobs import JobRunner
+from ticket.services.changes import TombstonePurger
+from ticket.services.lifecycle import OnSaleTickets, TicketScheduler
+from ticket.services.archive import TicketArchiver
+from ticket.services.reconcile import CounterReconciler
+from ticket.services.warm_up import read_statements, write_statements, warm_up_schema
+from ticket.services.encoder import encode_json
 from ticket.middlewares.timing import TimingMiddleware, LogType
-from ticket.extensions.db_session import DbSessionExtension
+from ticket.middlewares.compression import CompressionMiddleware
+from ticket.extensions.db_session import DbSessionExtension, RetryingSchema
+from ticket.schemas.loaders import Loaders
 from ticket.schemas.query import Query
 from ticket.schemas.mutation import Mutation
 
@@ -25,14 +45,6 @@ logger.propagate = False
 
 DB_KEY = "db"
 
-settings = load_setting_from_env()
-
-odoo = Odoo(
-    settings.services.odoo.url,
-    settings.services.odoo.user,
-    settings.services.odoo.password,
-)
-
 
 class GraphQlContext(GraphQL):
     @classmethod
@@ -45,33 +57,94 @@ class GraphQlContext(GraphQL):
             return "", ""
         return values[0], values[1]
 
-    @classmethod
-    def get_token(cls, token: str):
-        with grpc.insecure_channel(
-            f"{settings.services.user.grpc.host}:{settings.services.user.grpc.port}"
-        ) as channel:
-            stub = user_go_pb2_grpc.UserServiceStub(channel=channel)
-            # pylint: disable = no-member
-            response = stub.CheckThirdpartyToken(user_go_pb2.Token(token=token))
-        return response
-
     async def get_context(self, request: Request | WebSocket, response: Response):
         res = await super().get_context(request=request, response=response)
         res["db"] = request.app.state.db
         res["ro_db"] = request.app.state.ro_db
+        res["my_numbers_cache"] = request.app.state.my_numbers_cache
+        res["on_sale"] = request.app.state.on_sale
+        res["admission"] = request.app.state.admission
+        res["coalescer"] = request.app.state.coalescer
+        res["idempotency_key"] = request.headers.get("Idempotency-Key")
+        res["idempotency_in_flight"] = request.app.state.idempotency_in_flight
         token_type, access_token = self.custom_get_auth(request=request)
-        match token_type.lower():
-            case "bearer":
-                tkn = self.get_token(access_token)
-                res["user_code"] = tkn.uid
-                res["cid"] = tkn.cid
-                res["scopes"] = tkn.scp
-            case "odoo":
-                res["odoo_user"] = await odoo.get_odoo_user(access_token)
+        res["auth"] = LazyAuth(
+            token_type,
+            access_token,
+            request.app.state.user_grpc,
+            request.app.state.odoo,
+        )
         return res
 
+    async def run(
+        self,
+        request: Request | WebSocket,
+        context: Optional[Any] = UNSET,
+        root_value: Optional[Any] = UNSET,
+    ) -> Response:
+        if (
+            request.method == "POST"
+            and "application/json" in request.headers.get("content-type", "")
+            and (await request.body()).lstrip().startswith(b"[")
+        ):
+            return await self.run_batch(request)
+        return await super().run(request, context=context, root_value=root_value)
+
+    async def run_batch(self, request: Request) -> Response:
+        # A JSON array of operations, run in order with one context, caller
+        # and read session, the answer is the array of their results
+        try:
+            operations = self.parse_json(await request.body())
+        except json.JSONDecodeError as err:
+            raise HTTPException(400, "Unable to parse request body as JSON") from err
+        max_operations = get_settings().batch.max_operations
+        if not 0 < len(operations) <= max_operations:
+            raise HTTPException(
+                400, f"A batch holds from 1 to {max_operations} operations"
+            )
+        if not all(isinstance(operation, dict) for operation in operations):
+            raise HTTPException(400, "Batched operations must be JSON objects")
+        if request.headers.get("Idempotency-Key"):
+            # One key can not tell apart the mutations of a batch
+            raise HTTPException(400, "Idempotency-Key is not allowed in a batch")
+        sub_response = await self.get_sub_response(request)
+        context = await self.get_context(request, response=sub_response)
+        root_value = await self.get_root_value(request)
+        results = []
+        async with async_sessionmaker(context["ro_db"])() as ro_session:
+            # An AsyncSession serves one statement at a time, the operations
+            # run one after the other and their loaders share their cache
+            context["shared_ro_db_session"] = ro_session
+            context["loaders"] = Loaders(ro_session)
+            for operation in operations:
+                try:
+                    result = await self.schema.execute(
+                        operation.get("query"),
+                        root_value=root_value,
+                        variable_values=operation.get("variables"),
+                        context_value=dict(context),
+                        operation_name=operation.get("operationName"),
+                    )
+                except MissingQueryError as err:
+                    raise HTTPException(
+                        400, "No GraphQL query found in the request"
+                    ) from err
+                if any(
+                    isinstance(error.original_error, DBAPIError)
+                    for error in result.errors or ()
+                ):
+                    # The read transaction failed, the next operations start
+                    # a new one and load again what they need
+                    await ro_session.rollback()
+                    context["loaders"] = Loaders(ro_session)
+                results.append(await self.process_result(request, result))
+        return self.create_response(results, sub_response)  # type: ignore
+
+    def encode_json(self, response_data: Any) -> bytes:  # type: ignore
+        return encode_json(response_data)
 
-schema = strawberry.Schema(
+
+schema = RetryingSchema(
     Query,
     mutation=Mutation,
     extensions=[
@@ -79,37 +152,153 @@ schema = strawberry.Schema(
     ],
 )
 graphql_app = GraphQlContext(schema=schema)
-engine = get_pg_engine(
-    host=settings.services.postgres.db.host,
-    port=settings.services.postgres.db.port,
-    user=settings.services.postgres.db.user,
-    password=settings.services.postgres.db.password,
-    database=settings.services.postgres.db.database,
-)
-ro_engine = get_pg_engine(
-    host=settings.services.postgres.ro_db.host,
-    port=settings.services.postgres.ro_db.port,
-    user=settings.services.postgres.ro_db.user,
-    password=settings.services.postgres.ro_db.password,
-    database=settings.services.postgres.ro_db.database,
-)
+
+
+def periodic_tasks(
+    router: Starlette, settings: Settings, leader: Optional[LeaderElection]
+) -> List[PeriodicTask]:
+    # Maintenance on rows shared by every process runs where leader leads
+    tasks = []
+    if settings.lifecycle.enabled:
+        tasks.append(
+            PeriodicTask(
+                "lifecycle",
+                settings.lifecycle.interval,
+                TicketScheduler(
+                    router.state.db, settings.lifecycle, router.state.on_sale, leader
+                ).run,
+            )
+        )
+    if settings.archive.enabled:
+        tasks.append(
+            PeriodicTask(
+                "archive",
+                settings.archive.interval,
+                TicketArchiver(
+                    router.state.db, settings.archive, settings.partitions
+                ).run,
+                leader,
+            )
+        )
+    if settings.reconcile.enabled:
+        tasks.append(
+            PeriodicTask(
+                "reconcile",
+                settings.reconcile.interval,
+                CounterReconciler(router.state.db, settings.reconcile).run,
+                leader,
+            )
+        )
+    tasks.append(
+        PeriodicTask(
+            "idempotency",
+            settings.idempotency.interval,
+            IdempotencyPurger(router.state.db, settings.idempotency).run,
+            leader,
+        )
+    )
+    tasks.append(
+        PeriodicTask(
+            "tombstones",
+            settings.changes.interval,
+            TombstonePurger(router.state.db, settings.changes).run,
+            leader,
+        )
+    )
+    if settings.jobs.enabled:
+        # Jobs are claimed with SKIP LOCKED, every process takes part
+        job_runner = JobRunner(router.state.db, settings)
+        tasks.extend(
+            PeriodicTask(f"jobs-{worker}", settings.jobs.interval, job_runner.run)
+            for worker in range(settings.jobs.workers)
+        )
+    return tasks
 
 
 @contextlib.asynccontextmanager
 async def lifespan(router: Starlette):
     # On startup functions
-    # await db_load()
-    db_loader = DbLoader(app=router, key="db", engine=engine)
+    settings = get_settings()
+    processes = settings.server.processes
+    warm_up = settings.server.warm_up
+    db_setting = settings.services.postgres.db
+    db_loader = DbLoader(
+        app=router,
+        key="db",
+        engine=get_pg_engine_from_setting(db_setting, processes=processes),
+        connections=db_setting.pool.warm_per_worker(processes) if warm_up else 1,
+        statements=write_statements() if warm_up else (),
+    )
     await db_loader.startup()
-    ro_db_loader = DbLoader(app=router, key="ro_db", engine=engine)
+    ro_db_setting = settings.services.postgres.ro_db
+    ro_db_loader = DbLoader(
+        app=router,
+        key="ro_db",
+        engine=get_pg_engine_from_setting(ro_db_setting, processes=processes),
+        connections=ro_db_setting.pool.warm_per_worker(processes) if warm_up else 1,
+        statements=read_statements() if warm_up else (),
+    )
     await ro_db_loader.startup()
+    router.state.odoo = Odoo(
+        settings.services.odoo.url,
+        settings.services.odoo.user,
+        settings.services.odoo.password,
+    )
+    router.state.my_numbers_cache = UserTtlCache(
+        settings.cache.my_numbers_ttl, settings.cache.my_numbers_users
+    )
+    router.state.admission = None
+    if settings.admission.enabled:
+        router.state.admission = AdmissionController(
+            settings.admission,
+            settings.admission.global_limit
+            or sum(db_setting.pool.per_worker(processes)),
+        )
+    router.state.coalescer = None
+    if settings.coalesce.enabled:
+        router.state.coalescer = ReservationCoalescer(
+            router.state.db, settings.coalesce
+        )
+    router.state.idempotency_in_flight = InFlight()
+    router.state.user_grpc = UserGrpc(
+        settings.services.user.grpc.host, settings.services.user.grpc.port
+    )
+    if warm_up:
+        await warm_up_schema(
+            schema, {"db": router.state.db, "ro_db": router.state.ro_db}
+        )
+    leader = None
+    if settings.leader.enabled:
+        leader = LeaderElection(router.state.db, settings.leader)
+        leader.start()
+    router.state.on_sale = OnSaleTickets()
+    tasks = periodic_tasks(router, settings, leader)
+    for task in tasks:
+        task.start()
     yield
     # On Shutdown functions
+    for task in reversed(tasks):
+        await task.stop()
+    if leader:
+        await leader.stop()
+    if router.state.coalescer:
+        await router.state.coalescer.stop()
+    await router.state.user_grpc.close()
     await db_loader.shutdown()
     await ro_db_loader.shutdown()
 
 
+async def metrics(request: Request) -> Response:
+    admission: AdmissionController = request.app.state.admission
+    return PlainTextResponse(
+        admission.metrics() if admission else "",
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 app = Starlette(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(TimingMiddleware, log_type=LogType.INFO)
 app.add_middleware(CORSMiddleware, allow_origins=["*"])
 app.add_route("/graphql", graphql_app)  # type: ignore
+app.add_route("/metrics", metrics)
@@ -0,0 +1,151 @@
+import zlib
+from functools import cached_property
+from typing import Callable, Dict, List, Optional, Protocol
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ticket.env.settings import Compression, get_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/graphql-response+json", "text/")
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+COMPRESSORS: Dict[str, Callable[[Compression], Compressor]] = {
+    "gzip": lambda setting: zlib.compressobj(setting.gzip_level, zlib.DEFLATED, 31),
+}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda setting: BrotliCompressor(setting.brotli_quality)
+if zstandard is not None:
+    COMPRESSORS["zstd"] = lambda setting: zstandard.ZstdCompressor(
+        level=setting.zstd_level
+    ).compressobj()
+
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    # First of encodings, in the order of the server, the client accepts
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    # Compresses bodies of compressible types from minimum_size bytes with the
+    # encoding negotiated by Accept-Encoding, streamed bodies chunk by chunk
+    def __init__(self, app: ASGIApp, setting: Optional[Compression] = None) -> None:
+        self.app = app
+        # Defaults to the settings, read on the first request
+        self.custom_setting = setting
+
+    @cached_property
+    def setting(self) -> Compression:
+        return self.custom_setting or get_settings().compression
+
+    @cached_property
+    def encodings(self) -> List[str]:
+        return [
+            encoding for encoding in self.setting.encodings if encoding in COMPRESSORS
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.setting.enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressedResponder(send, encoding, self.setting)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressedResponder:
+    def __init__(self, send: Send, encoding: str, setting: Compression) -> None:
+        self.next_send = send
+        self.encoding = encoding
+        self.setting = setting
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    def should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.start["headers"])
+        if "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.setting.minimum_size
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held until the first body tells whether to compress
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.next_send(message)
+            return
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.compressor is None:
+            if not self.should_compress(body, more_body):
+                self.passthrough = True
+                await self.next_send(self.start)
+                await self.next_send(message)
+                return
+            self.compressor = COMPRESSORS[self.encoding](self.setting)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            body = self.compressor.compress(body)
+            if not more_body:
+                body += self.compressor.flush()
+                headers["Content-Length"] = str(len(body))
+            await self.next_send(self.start)
+        else:
+            body = self.compressor.compress(body)
+            if not more_body:
+                body += self.compressor.flush()
+        await self.next_send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
@@ -1,3 +1,9 @@
 from . import models
 from . import ticket
 from . import order
+from . import archive
+from . import rollup
+from . import watermark
+from . import idempotency
+from . import settlement
+from . import job
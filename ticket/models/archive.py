@@ -0,0 +1,269 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import (
+    String,
+    Integer,
+    ForeignKey,
+    Index,
+    DateTime,
+    select,
+    delete,
+    exists,
+    func,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .models import Base, Tombstone
+from .ticket import TicketLine, TicketLineState
+from .order import Order, OrderLine, OrderState
+
+# pylint: disable=unsubscriptable-object
+
+# Archived tickets lose their ticket_line and ticket_order_line partitions,
+# only the sold numbers per user and a compact copy of each order are kept.
+# The helpers below rebuild transient model instances so the resolvers can
+# read through the archive without knowing about it.
+
+
+class TicketNumberArchive(Base):
+    __tablename__ = "ticket_number_archive"
+
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("ticket.id"), primary_key=True)
+    user_code: Mapped[str] = mapped_column(String(length=30), primary_key=True)
+    line_ids: Mapped[List[int]] = mapped_column(ARRAY(Integer))
+    numbers: Mapped[List[int]] = mapped_column(ARRAY(Integer))
+    create_date: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()  # pylint: disable=not-callable
+    )
+
+    def to_lines(self) -> List[TicketLine]:
+        return [
+            TicketLine(
+                id=line_id,
+                number=number,
+                ticket_id=self.ticket_id,
+                user_code=self.user_code,
+                is_special_price=False,
+                special_price=0.0,
+                state=TicketLineState.SOLD,
+                create_date=self.create_date,
+                write_date=self.create_date,
+            )
+            for line_id, number in zip(self.line_ids, self.numbers)
+        ]
+
+    @classmethod
+    async def archive_ticket(cls, ticket_id: int, session: AsyncSession):
+        sold = (
+            select(
+                TicketLine.ticket_id,
+                TicketLine.user_code,
+                func.array_agg(aggregate_order_by(TicketLine.id, TicketLine.number)),
+                func.array_agg(
+                    aggregate_order_by(TicketLine.number, TicketLine.number)
+                ),
+            )
+            .where(TicketLine.ticket_id == ticket_id)
+            .where(TicketLine.state == TicketLineState.SOLD)
+            .where(TicketLine.user_code.is_not(None))
+            .group_by(TicketLine.ticket_id, TicketLine.user_code)
+        )
+        await session.execute(
+            insert(cls)
+            .from_select(["ticket_id", "user_code", "line_ids", "numbers"], sold)
+            .on_conflict_do_nothing()
+        )
+
+    @classmethod
+    async def get_ticket_lines(
+        cls, ticket_id: int, session: AsyncSession
+    ) -> List[TicketLine]:
+        res = await session.execute(select(cls).where(cls.ticket_id == ticket_id))
+        return [line for record in res.scalars() for line in record.to_lines()]
+
+
+class OrderArchive(Base):
+    __tablename__ = "ticket_order_archive"
+    __table_args__ = (
+        Index(
+            "ix_ticket_order_archive_user_code_create_date",
+            "user_code",
+            "create_date",
+        ),
+    )
+
+    order_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("ticket.id"), primary_key=True)
+    name: Mapped[str] = mapped_column(String(15))
+    state: Mapped[OrderState] = mapped_column()
+    user_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    line_ids: Mapped[List[int]] = mapped_column(ARRAY(Integer))
+    ticket_line_ids: Mapped[List[int]] = mapped_column(ARRAY(Integer))
+    numbers: Mapped[List[int]] = mapped_column(ARRAY(Integer))
+    create_date: Mapped[datetime] = mapped_column(DateTime)
+    write_date: Mapped[datetime] = mapped_column(DateTime)
+
+    def to_order(self) -> Order:
+        return Order(
+            id=self.order_id,
+            name=self.name,
+            state=self.state,
+            user_code=self.user_code,
+            create_date=self.create_date,
+            write_date=self.write_date,
+        )
+
+    def to_order_lines(self) -> List[OrderLine]:
+        return [
+            OrderLine(
+                id=line_id,
+                order_id=self.order_id,
+                ticket_line_id=ticket_line_id,
+                ticket_id=self.ticket_id,
+                create_date=self.create_date,
+                write_date=self.write_date,
+            )
+            for line_id, ticket_line_id in zip(self.line_ids, self.ticket_line_ids)
+        ]
+
+    def to_ticket_line(self, ticket_line_id: int) -> Optional[TicketLine]:
+        if ticket_line_id not in self.ticket_line_ids:
+            return None
+        sold = self.state in (OrderState.SUCCESSFUL, OrderState.VARIFIED)
+        return TicketLine(
+            id=ticket_line_id,
+            number=self.numbers[self.ticket_line_ids.index(ticket_line_id)],
+            ticket_id=self.ticket_id,
+            user_code=self.user_code if sold else None,
+            is_special_price=False,
+            special_price=0.0,
+            state=TicketLineState.SOLD if sold else TicketLineState.AVAILABLE,
+            create_date=self.create_date,
+            write_date=self.write_date,
+        )
+
+    @classmethod
+    async def archive_ticket(cls, ticket_id: int, session: AsyncSession):
+        lines = (
+            select(
+                Order.id,
+                OrderLine.ticket_id,
+                Order.name,
+                Order.state,
+                Order.user_code,
+                func.array_agg(aggregate_order_by(OrderLine.id, TicketLine.number)),
+                func.array_agg(
+                    aggregate_order_by(OrderLine.ticket_line_id, TicketLine.number)
+                ),
+                func.array_agg(
+                    aggregate_order_by(TicketLine.number, TicketLine.number)
+                ),
+                Order.create_date,
+                Order.write_date,
+            )
+            .select_from(OrderLine)
+            .join(OrderLine.order)
+            .join(OrderLine.ticket_line)
+            .where(OrderLine.ticket_id == ticket_id)
+            .group_by(Order.id, OrderLine.ticket_id)
+        )
+        await session.execute(
+            insert(cls)
+            .from_select(
+                [
+                    "order_id",
+                    "ticket_id",
+                    "name",
+                    "state",
+                    "user_code",
+                    "line_ids",
+                    "ticket_line_ids",
+                    "numbers",
+                    "create_date",
+                    "write_date",
+                ],
+                lines,
+            )
+            .on_conflict_do_nothing()
+        )
+
+    @classmethod
+    async def purge_orders(
+        cls, ticket_id: int, batch_size: int, session: AsyncSession
+    ) -> int:
+        # Orders are removed once none of their lines are left in the hot tables
+        orders = (
+            select(Order.id)
+            .join(cls, cls.order_id == Order.id)
+            .where(cls.ticket_id == ticket_id)
+            .where(~exists().where(OrderLine.order_id == Order.id))
+            .limit(batch_size)
+        )
+        res = await session.execute(
+            delete(Order)
+            .where(Order.id.in_(orders))
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = res.scalars().all()
+        await Tombstone.record(session, Order.__tablename__, deleted)
+        return len(deleted)
+
+    @classmethod
+    async def get_orders(
+        cls, order_ids: List[int], session: AsyncSession
+    ) -> List[Order]:
+        res = await session.execute(select(cls).where(cls.order_id.in_(order_ids)))
+        orders = {}
+        for record in res.scalars():
+            orders.setdefault(record.order_id, record.to_order())
+        return list(orders.values())
+
+    @classmethod
+    async def get_orders_by_user(
+        cls, user_code: str, session: AsyncSession, exclude_ids: List[int]
+    ) -> List[Order]:
+        res = await session.execute(
+            select(cls)
+            .where(cls.user_code == user_code)
+            .where(cls.order_id.not_in(exclude_ids))
+            .order_by(cls.create_date.desc())
+        )
+        orders = {}
+        for record in res.scalars():
+            orders.setdefault(record.order_id, record.to_order())
+        return list(orders.values())
+
+    @classmethod
+    async def get_order_lines(
+        cls, order_ids: List[int], session: AsyncSession
+    ) -> List[OrderLine]:
+        res = await session.execute(select(cls).where(cls.order_id.in_(order_ids)))
+        return [line for record in res.scalars() for line in record.to_order_lines()]
+
+    @classmethod
+    async def get_ticket_lines(
+        cls, keys: List[Tuple[int, int, int]], session: AsyncSession
+    ) -> Dict[Tuple[int, int, int], TicketLine]:
+        # keys are (ticket_line_id, ticket_id, order_id)
+        res = await session.execute(
+            select(cls).where(
+                tuple_(cls.order_id, cls.ticket_id).in_(
+                    {(order_id, ticket_id) for _, ticket_id, order_id in keys}
+                )
+            )
+        )
+        records = {
+            (record.order_id, record.ticket_id): record for record in res.scalars()
+        }
+        lines = {}
+        for key in keys:
+            ticket_line_id, ticket_id, order_id = key
+            record = records.get((order_id, ticket_id))
+            line = record.to_ticket_line(ticket_line_id) if record else None
+            if line:
+                lines[key] = line
+        return lines
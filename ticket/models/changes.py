@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import ColumnElement, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Tombstone
+from .order import Order
+from .ticket import Ticket, TicketLine
+
+_logger = logging.getLogger(__name__)
+
+# The feed is ordered by (write_date, table name, id)
+Cursor = Tuple[datetime, str, int]
+
+FEED_MODELS = (Ticket, TicketLine, Order, Tombstone)
+
+# Start of the oldest transaction still open on the primary. Its rows may
+# commit later with a write_date older than rows already served, so the feed
+# stops before it.
+OLDEST_TRANSACTION = text(
+    """
+    SELECT timezone('utc', clock_timestamp()) AS now,
+        timezone('utc', min(xact_start)) AS oldest,
+        (array_agg(pid ORDER BY xact_start))[1] AS pid
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+        AND backend_type = 'client backend'
+        AND xact_start IS NOT NULL
+        AND pid <> pg_backend_pid()
+    """
+)
+
+
+async def get_horizon(session: AsyncSession, lag: float, warning: float) -> datetime:
+    # lag covers the clock skew between the app hosts setting write_date and
+    # the database
+    res = await session.execute(OLDEST_TRANSACTION)
+    now, oldest, pid = res.one()
+    if oldest is None:
+        return now - timedelta(seconds=lag)
+    held = (now - oldest).total_seconds()
+    if held > warning:
+        # Any transaction of the database holds the feed back, not only the
+        # ones writing its tables
+        _logger.warning(
+            "Change feed held %.0fs behind by the transaction of backend %s",
+            held,
+            pid,
+        )
+    return min(now, oldest) - timedelta(seconds=lag)
+
+
+def after_cursor(model: Any, cursor: Cursor) -> ColumnElement:
+    write_date, entity, record_id = cursor
+    if model.__tablename__ > entity:
+        return model.write_date >= write_date
+    if model.__tablename__ == entity:
+        return tuple_(model.write_date, model.id) > tuple_(write_date, record_id)
+    return model.write_date > write_date
+
+
+async def get_changes(
+    session: AsyncSession, after: Optional[Cursor], horizon: datetime, limit: int
+) -> List[Any]:
+    # Each table is read by its write_date index, the first rows of all of
+    # them are merged in feed order
+    rows: List[Any] = []
+    for model in FEED_MODELS:
+        stmt = select(model).where(model.write_date < horizon)
+        if after:
+            stmt = stmt.where(after_cursor(model, after))
+        res = await session.execute(
+            stmt.order_by(model.write_date, model.id).limit(limit)
+        )
+        rows.extend(res.scalars().all())
+    rows.sort(key=lambda row: (row.write_date, row.__tablename__, row.id))
+    return rows[:limit]
+
+
+def get_cursor(row: Any) -> Cursor:
+    return row.write_date, row.__tablename__, row.id
@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import List
+from pydantic import BaseModel
+from sqlalchemy import select, text, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .ticket import Ticket, TicketLine
+
+# Counters expected from the lines. Numbers of RANGES tickets without a row are
+# available, LINES tickets count their AVAILABLE rows.
+RECONCILE = text(
+    """
+    WITH counts AS (
+        SELECT t.id,
+            t.available_count AS old_available,
+            t.reserved_count AS old_reserved,
+            t.sold_count AS old_sold,
+            count(l.id) FILTER (WHERE l.state = 'RESERVED') AS reserved,
+            count(l.id) FILTER (WHERE l.state = 'SOLD') AS sold,
+            CASE WHEN t.storage = 'RANGES'
+                THEN t.end_num - t.start_num + 1
+                    - count(l.id) FILTER (WHERE l.state <> 'AVAILABLE')
+                ELSE count(l.id) FILTER (WHERE l.state = 'AVAILABLE')
+            END AS available
+        FROM ticket t
+        LEFT JOIN ticket_line l ON l.ticket_id = t.id
+        WHERE t.id = ANY(:ids) AND NOT t.archived
+        GROUP BY t.id
+    )
+    UPDATE ticket t
+    SET available_count = c.available,
+        reserved_count = c.reserved,
+        sold_count = c.sold,
+        write_date = timezone('utc', now())
+    FROM counts c
+    WHERE t.id = c.id
+        AND (c.old_available, c.old_reserved, c.old_sold)
+            IS DISTINCT FROM (c.available, c.reserved, c.sold)
+    RETURNING t.id, c.old_available, c.old_reserved, c.old_sold,
+        c.available, c.reserved, c.sold
+    """
+)
+
+
+class CounterDrift(BaseModel):
+    id: int
+    old_available: int
+    old_reserved: int
+    old_sold: int
+    available: int
+    reserved: int
+    sold: int
+
+
+async def get_touched_ticket_ids(session: AsyncSession, since: datetime) -> List[int]:
+    stmt = union(
+        select(TicketLine.ticket_id).where(TicketLine.write_date > since),
+        select(Ticket.id).where(Ticket.write_date > since),
+    )
+    res = await session.execute(stmt)
+    return sorted(res.scalars().all())
+
+
+async def get_live_ticket_ids(session: AsyncSession) -> List[int]:
+    res = await session.execute(
+        select(Ticket.id).where(Ticket.archived.is_(False)).order_by(Ticket.id)
+    )
+    return res.scalars().all()
+
+
+async def reconcile_ticket_counters(
+    session: AsyncSession, ids: List[int]
+) -> List[CounterDrift]:
+    # Orders lock the ticket before committing their line changes, holding the
+    # same locks keeps them from changing the lines between count and update
+    await session.execute(
+        select(Ticket.id)
+        .where(Ticket.id.in_(ids))
+        .order_by(Ticket.id)
+        .with_for_update()
+    )
+    res = await session.execute(RECONCILE, {"ids": ids})
+    return [CounterDrift.model_validate(dict(row)) for row in res.mappings()]
@@ -0,0 +1,59 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, exists, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .order import Order, OrderState
+from .archive import OrderArchive
+
+# (create_date, id) of the last order of a page, orders are sorted by both
+# descending so the pair is a stable keyset cursor
+OrderCursor = Tuple[datetime, int]
+
+
+async def get_user_orders_page(
+    session: AsyncSession,
+    user_code: str,
+    limit: int,
+    after: Optional[OrderCursor] = None,
+    states: Optional[List[OrderState]] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> List[Order]:
+    # pylint: disable=too-many-arguments
+    live = select(
+        Order.id,
+        Order.name,
+        Order.state,
+        Order.user_code,
+        Order.create_date,
+        Order.write_date,
+    ).where(Order.user_code == user_code)
+    # Orders of archived tickets are gone from ticket_order once purged
+    archived = (
+        select(
+            OrderArchive.order_id.label("id"),
+            OrderArchive.name,
+            OrderArchive.state,
+            OrderArchive.user_code,
+            OrderArchive.create_date,
+            OrderArchive.write_date,
+        )
+        .where(OrderArchive.user_code == user_code)
+        .where(~exists().where(Order.id == OrderArchive.order_id))
+        .distinct()
+    )
+    orders = union_all(live, archived).subquery()
+    stmt = select(orders)
+    if states:
+        stmt = stmt.where(orders.c.state.in_(states))
+    if date_from:
+        stmt = stmt.where(orders.c.create_date >= date_from)
+    if date_to:
+        stmt = stmt.where(orders.c.create_date < date_to)
+    if after:
+        stmt = stmt.where(tuple_(orders.c.create_date, orders.c.id) < after)
+    stmt = stmt.order_by(orders.c.create_date.desc(), orders.c.id.desc()).limit(limit)
+    res = await session.execute(stmt)
+    # Rows of both sources become transient orders
+    return [Order(**row) for row in res.mappings()]
@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import DateTime, String, delete, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .models import Base
+
+# pylint: disable=not-callable, too-many-arguments
+
+MAX_KEY_LENGTH = 64
+
+
+class InvalidIdempotencyKey(Exception):
+    pass
+
+
+class IdempotencyKeyReused(Exception):
+    pass
+
+
+class OrderIdempotency(Base):
+    # Result of an order mutation by its client supplied Idempotency-Key
+    __tablename__ = "order_idempotency"
+
+    user_code: Mapped[str] = mapped_column(String(32), primary_key=True)
+    key: Mapped[str] = mapped_column(String(MAX_KEY_LENGTH), primary_key=True)
+    operation: Mapped[str] = mapped_column(String(32))
+    # Hash of the operation arguments, a key only stands for one request
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    response: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    create_date: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.timezone("utc", func.now()), index=True
+    )
+
+    @classmethod
+    async def claim(
+        cls,
+        session: AsyncSession,
+        user_code: str,
+        key: str,
+        operation: str,
+        fingerprint: str,
+    ) -> Optional["OrderIdempotency"]:
+        # Returns the stored record of an earlier request, None when this
+        # request owns the key. A duplicate still in flight holds the key's
+        # index entry, the insert waits for it to commit or roll back.
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise InvalidIdempotencyKey(f"Idempotency-Key - {key}")
+        res = await session.execute(
+            insert(cls)
+            .values(
+                user_code=user_code,
+                key=key,
+                operation=operation,
+                fingerprint=fingerprint,
+            )
+            .on_conflict_do_nothing(index_elements=["user_code", "key"])
+            .returning(cls.key)
+        )
+        if res.scalar() is not None:
+            return None
+        record = await session.scalar(
+            select(cls).where(cls.user_code == user_code).where(cls.key == key)
+        )
+        if record.operation != operation or record.fingerprint != fingerprint:
+            raise IdempotencyKeyReused(
+                f"Idempotency-Key - {key} was used for another request"
+            )
+        return record
+
+    @classmethod
+    async def store(
+        cls, session: AsyncSession, user_code: str, key: str, response: Dict[str, Any]
+    ):
+        await session.execute(
+            update(cls)
+            .where(cls.user_code == user_code)
+            .where(cls.key == key)
+            .values(response=response)
+        )
+
+    @classmethod
+    async def purge(cls, session: AsyncSession, before: datetime) -> int:
+        res = await session.execute(delete(cls).where(cls.create_date < before))
+        return res.rowcount
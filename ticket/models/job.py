@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from sqlalchemy import (
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Text,
+    and_,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+import strawberry
+
+from .models import Base, CommonModel
+
+# pylint: disable=unsubscriptable-object, too-many-arguments
+
+
+@strawberry.enum
+class JobState(Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class Job(Base, CommonModel):
+    # Admin work too long for a request, run by the job workers of the app
+    __tablename__ = "job"
+    __table_args__ = (
+        Index(
+            "ix_job_queue",
+            "id",
+            postgresql_where=text("state IN ('PENDING', 'RUNNING')"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32))
+    state: Mapped[JobState] = mapped_column(default=JobState.PENDING)
+    arguments: Mapped[Dict[str, Any]] = mapped_column(JSONB, default=dict)
+    progress: Mapped[Dict[str, Any]] = mapped_column(JSONB, default=dict)
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    # A running job whose worker stopped renewing this is claimed again
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    @classmethod
+    async def enqueue(
+        cls, session: AsyncSession, kind: str, arguments: Dict[str, Any]
+    ) -> "Job":
+        job = cls(kind=kind, arguments=arguments, progress={})
+        session.add(job)
+        await session.flush()
+        return job
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, lease: float) -> Optional["Job"]:
+        # Served by ix_job_queue, SKIP LOCKED lets every worker poll at once
+        now = datetime.utcnow()
+        res = await session.execute(
+            select(cls)
+            .where(
+                or_(
+                    cls.state == JobState.PENDING,
+                    and_(cls.state == JobState.RUNNING, cls.locked_until < now),
+                )
+            )
+            .order_by(cls.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = res.scalar()
+        if not job:
+            return None
+        job.state = JobState.RUNNING
+        job.attempts += 1
+        job.locked_until = now + timedelta(seconds=lease)
+        await session.flush()
+        return job
+
+    @classmethod
+    async def report(
+        cls,
+        session: AsyncSession,
+        job_id: int,
+        attempts: int,
+        progress: Dict[str, Any],
+        lease: float,
+    ) -> bool:
+        # Fenced by the attempt of the claim, False once another worker took
+        # the job over after the lease ran out
+        res = await session.execute(
+            update(cls)
+            .where(cls.id == job_id)
+            .where(cls.attempts == attempts)
+            .where(cls.state == JobState.RUNNING)
+            .values(
+                progress=progress,
+                locked_until=datetime.utcnow() + timedelta(seconds=lease),
+            )
+        )
+        return bool(res.rowcount)
+
+    @classmethod
+    async def finish(
+        cls,
+        session: AsyncSession,
+        job_id: int,
+        attempts: int,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        res = await session.execute(
+            update(cls)
+            .where(cls.id == job_id)
+            .where(cls.attempts == attempts)
+            .where(cls.state == JobState.RUNNING)
+            .values(
+                state=JobState.FAILED if error else JobState.DONE,
+                result=result,
+                error=error,
+                locked_until=None,
+            )
+        )
+        return bool(res.rowcount)
+
+    @classmethod
+    async def get_jobs(
+        cls,
+        session: AsyncSession,
+        states: Optional[List[JobState]] = None,
+        limit: int = 10,
+    ) -> List["Job"]:
+        stmt = select(cls)
+        if states:
+            stmt = stmt.where(cls.state.in_(states))
+        res = await session.execute(stmt.order_by(cls.id.desc()).limit(limit))
+        return res.scalars().all()
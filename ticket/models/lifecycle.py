@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy import ColumnElement, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .ticket import Ticket, TicketState
+
+# pylint: disable=not-callable
+
+# Applied in this order so a ticket whose whole sale period already passed
+# reaches DONE in a single run
+TRANSITIONS: List[Tuple[TicketState, TicketState, ColumnElement]] = [
+    (TicketState.DRAFT, TicketState.POSTED, Ticket.start_date),
+    (TicketState.POSTED, TicketState.DONE, Ticket.end_date),
+]
+
+
+async def apply_transition(
+    session: AsyncSession,
+    source: TicketState,
+    target: TicketState,
+    due: ColumnElement,
+    batch_size: int,
+) -> List[int]:
+    # Served by ix_ticket_state_dates, SKIP LOCKED leaves tickets being
+    # ordered or edited to the next batch
+    due_ids = (
+        select(Ticket.id)
+        .where(Ticket.state == source)
+        .where(due <= func.now())
+        .order_by(due)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    res = await session.execute(
+        update(Ticket)
+        .where(Ticket.id.in_(due_ids))
+        .values(state=target, write_date=datetime.utcnow())
+        .returning(Ticket.id)
+    )
+    return res.scalars().all()
+
+
+async def get_on_sale(session: AsyncSession, until: datetime) -> List[Ticket]:
+    # Posted tickets not ended yet which start before until
+    res = await session.execute(
+        select(Ticket)
+        .where(Ticket.state == TicketState.POSTED)
+        .where(Ticket.start_date <= until)
+        .where(Ticket.end_date > func.now())
+        .order_by(Ticket.end_date, Ticket.id)
+    )
+    return res.scalars().all()
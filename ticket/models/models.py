@@ -1,11 +1,31 @@
-from typing import Optional, Dict, Tuple, List, Any, Self
+from typing import Optional, Dict, Iterable, Tuple, List, Any, Self
 from enum import Enum
 from datetime import datetime
 from pydantic import BaseModel
-from sqlalchemy import select, Select, update, delete, DateTime
+from sqlalchemy import (
+    ColumnElement,
+    func,
+    select,
+    Select,
+    update,
+    delete,
+    insert,
+    literal,
+    DateTime,
+    Integer,
+    String,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession
 
+from .search import matches
+
+
+def int_array(values: Iterable[int]) -> ColumnElement[List[int]]:
+    # One bind parameter whatever the number of values, compared with any_()
+    return literal(list(values), ARRAY(Integer))
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
@@ -26,6 +46,8 @@ class WhereOptr(Enum):
     NOT_ILIKE = "not ilike"
     LIKE = "like"
     NOT_LIKE = "not like"
+    # Full-text prefix search on a tsvector column
+    SEARCH = "search"
 
 
 class Filter(BaseModel):
@@ -67,6 +89,8 @@ class Filter(BaseModel):
                     stmt = stmt.where(getattr(model, k).like(v))
                 case WhereOptr.NOT_LIKE.value:
                     stmt = stmt.where(getattr(model, k).not_like(v))
+                case WhereOptr.SEARCH.value:
+                    stmt = stmt.where(matches(getattr(model, k), v))
         return stmt
 
     def prepare_order(self, model: type[Base]):
@@ -83,6 +107,10 @@ class Filter(BaseModel):
 
 
 class CommonModel:
+    __tablename__: str
+    # Column completing the primary key of partitioned tables
+    _partition_key: Optional[str] = None
+
     id: Mapped[int]
     create_date: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, index=True
@@ -97,6 +125,14 @@ class CommonModel:
         res = await engine.execute(stmt)
         return res.scalar_one()
 
+    @classmethod
+    async def get_records_by_ids(
+        cls, ids: List[int], engine: AsyncSession
+    ) -> List[Self]:
+        stmt = select(cls).where(cls.id.in_(ids))
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
     @classmethod
     async def get_records(cls, engine: AsyncSession) -> List[Self]:
         stmt = select(cls).order_by(cls.id)
@@ -124,10 +160,30 @@ class CommonModel:
         await self.create_lines(engine=engine)
         await engine.flush()
 
+    @classmethod
+    async def fill_partition_key(
+        cls, engine: AsyncSession, data_list: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        key = cls._partition_key
+        ids = [data.get("id") for data in data_list if key not in data]
+        if not ids:
+            return data_list
+        res = await engine.execute(
+            select(cls.id, getattr(cls, key)).where(cls.id.in_(ids))
+        )
+        keys = dict(res.all())
+        return [
+            {key: keys.get(data.get("id")), **data}
+            for data in data_list
+            if key in data or data.get("id") in keys
+        ]
+
     @classmethod
     async def update_records(
         cls, engine: AsyncSession, data_list: List[Dict[str, str]]
     ) -> List[Self]:
+        if cls._partition_key:
+            data_list = await cls.fill_partition_key(engine, data_list)
         await engine.execute(update(cls), data_list)
         return await cls.get_records_query(
             engine=engine,
@@ -141,5 +197,43 @@ class CommonModel:
 
     @classmethod
     async def delete_records(cls, engine: AsyncSession, ids: List[int]) -> bool:
-        await engine.execute(delete(cls).where(cls.id.in_(ids)))
+        res = await engine.execute(delete(cls).where(cls.id.in_(ids)).returning(cls.id))
+        await Tombstone.record(engine, cls.__tablename__, res.scalars().all())
         return True
+
+
+class Tombstone(Base):
+    # Deleted rows, read by the change feed next to the changed ones
+    __tablename__ = "change_tombstone"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(32))
+    record_id: Mapped[int] = mapped_column(Integer)
+    write_date: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, index=True
+    )
+
+    @classmethod
+    async def record(cls, engine: AsyncSession, entity: str, record_ids: List[int]):
+        if not record_ids:
+            return
+        # One array parameter, a multi-row VALUES runs out of bind parameters
+        await cls.record_from(
+            engine, entity, select(func.unnest(int_array(record_ids)))
+        )
+
+    @classmethod
+    async def record_from(cls, engine: AsyncSession, entity: str, record_ids: Select):
+        # Ids selected by the database, for deletes too large to list here
+        ids = record_ids.subquery()
+        await engine.execute(
+            insert(cls).from_select(
+                ["entity", "record_id", "write_date"],
+                select(literal(entity), ids.c[0], literal(datetime.utcnow())),
+            )
+        )
+
+    @classmethod
+    async def purge(cls, engine: AsyncSession, before: datetime) -> int:
+        res = await engine.execute(delete(cls).where(cls.write_date < before))
+        return res.rowcount
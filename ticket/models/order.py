@@ -1,6 +1,7 @@
 from enum import Enum
-from typing import List, Dict
-from sqlalchemy import String, ForeignKey, select
+from typing import Iterable, List, Dict, Optional, Tuple, Union
+from pydantic import BaseModel
+from sqlalchemy import String, ForeignKey, ForeignKeyConstraint, Index, any_, select
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -8,15 +9,32 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import strawberry
 
 from .models import Base, CommonModel
+from .rollup import SaleRollup
 from .ticket import (
     Ticket,
     TicketLine,
     TicketLineState,
     TicketLineNotAvailable,
     TicketLineNotReserved,
+    TicketNotOnSale,
+    TicketNumberNotFound,
+    TicketState,
+    int_array,
 )
 
-# pylint: disable=unsubscriptable-object
+# pylint: disable=unsubscriptable-object, too-many-arguments
+
+MAX_ORDER_NUMBERS = 1000
+# Conflict of a number outside the ticket, the others are the line state
+NOT_FOUND = "NOT_FOUND"
+
+
+class TooManyNumbers(Exception):
+    pass
+
+
+class InvalidNumberRange(Exception):
+    pass
 
 
 class OrderAlreadyVerifyError(Exception):
@@ -31,6 +49,16 @@ class OrderUnknownStateError(Exception):
     pass
 
 
+class OrderNotFound(Exception):
+    pass
+
+
+class Reservation(BaseModel):
+    user_code: str
+    ticket_line_ids: List[int] = []
+    numbers: List[int] = []
+
+
 @strawberry.enum
 class OrderState(Enum):
     DRAFT = "DRAFT"
@@ -41,11 +69,19 @@ class OrderState(Enum):
 
 class Order(Base, CommonModel):
     __tablename__ = "ticket_order"
+    __table_args__ = (
+        Index(
+            "ix_ticket_order_user_code_state_create_date",
+            "user_code",
+            "state",
+            "create_date",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(15), index=True)
     state: Mapped[OrderState] = mapped_column(default=OrderState.DRAFT, index=True)
-    user_code: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    user_code: Mapped[str] = mapped_column(String(32), nullable=False)
     # payment_id: Mapped[int] = mapped_column(ForeignKey("payment.id"))
     line_ids: Mapped[List["OrderLine"]] = relationship(
         back_populates="order",
@@ -53,12 +89,55 @@ class Order(Base, CommonModel):
 
     @classmethod
     async def order_now(
-        cls, tkt_line_ids: List[int], user_code: str, session: AsyncSession
+        cls,
+        tkt_line_ids: List[int],
+        user_code: str,
+        session: AsyncSession,
+        ticket_id: Optional[int] = None,
+        numbers: Optional[List[int]] = None,
     ) -> "Order":
-        res = await session.execute(
-            select(TicketLine).where(TicketLine.id.in_(tkt_line_ids)).with_for_update()
+        locked = await cls.lock_tickets(
+            (
+                [ticket_id]
+                if ticket_id
+                else await TicketLine.get_ticket_ids(tkt_line_ids, session)
+            ),
+            session,
         )
-        tkt_lines = res.scalars().all()
+        tkt_lines: List[TicketLine] = []
+        if tkt_line_ids:
+            stmt = select(TicketLine).where(
+                TicketLine.id == any_(int_array(tkt_line_ids))
+            )
+            if ticket_id:
+                # Lets the planner prune the other ticket partitions
+                stmt = stmt.where(TicketLine.ticket_id == ticket_id)
+            res = await session.execute(
+                stmt.order_by(TicketLine.ticket_id, TicketLine.id).with_for_update()
+            )
+            tkt_lines.extend(res.scalars().all())
+        if numbers:
+            if not ticket_id:
+                raise TicketNumberNotFound("Ticket ID is required to order numbers")
+            # Numbers of RANGES tickets may not have a row yet
+            tkt_lines.extend(
+                await TicketLine.materialize(
+                    ticket_id=ticket_id, numbers=numbers, session=session
+                )
+            )
+        return await cls.reserve_lines(locked, tkt_lines, user_code, session)
+
+    @classmethod
+    async def reserve_lines(
+        cls,
+        tickets: List[Ticket],
+        tkt_lines: List[TicketLine],
+        user_code: str,
+        session: AsyncSession,
+    ) -> "Order":
+        # tickets and tkt_lines are locked by the caller, a line wanted both by
+        # id and by number is reserved once
+        tkt_lines = list({tkt_line.id: tkt_line for tkt_line in tkt_lines}.values())
         order = cls(name="order", state=OrderState.DRAFT, user_code=user_code)
         session.add(order)
         await session.flush()
@@ -73,18 +152,195 @@ class Order(Base, CommonModel):
                 ticket_id_map[tkt_line.ticket_id] = 1
             tkt_line.state = TicketLineState.RESERVED
             tkt_line.user_code = user_code
-            order_lines.append(OrderLine(order_id=order.id, ticket_line_id=tkt_line.id))
-        res = await session.execute(
-            select(Ticket).where(Ticket.id.in_(ticket_id_map.keys())).with_for_update()
+            order_lines.append(
+                OrderLine(
+                    order_id=order.id,
+                    ticket_line_id=tkt_line.id,
+                    ticket_id=tkt_line.ticket_id,
+                )
+            )
+        for tkt in tickets:
+            tkt.available_count -= ticket_id_map.get(tkt.id, 0)
+            tkt.reserved_count += ticket_id_map.get(tkt.id, 0)
+        await SaleRollup.track(
+            session, tkt_lines, {tkt.id: tkt.price for tkt in tickets}, reserved=1
         )
-        tkts = res.scalars().all()
-        for tkt in tkts:
-            tkt.available_count -= ticket_id_map[tkt.id]
-            tkt.reserved_count += ticket_id_map[tkt.id]
         session.add_all(order_lines)
         await session.flush()
         return order
 
+    @classmethod
+    async def order_numbers(
+        cls,
+        ticket_id: int,
+        numbers: List[int],
+        user_code: str,
+        session: AsyncSession,
+        partial: bool = False,
+    ) -> Tuple[Optional["Order"], Dict[int, str]]:
+        # Reserves numbers with one lookup and reports every number which could
+        # not be reserved, with partial the others are still reserved
+        numbers = sorted(set(numbers))
+        if len(numbers) > MAX_ORDER_NUMBERS:
+            raise TooManyNumbers(f"At most {MAX_ORDER_NUMBERS} numbers per order")
+        tickets = await cls.lock_tickets([ticket_id], session)
+        if not tickets:
+            raise TicketNumberNotFound(f"Ticket ID - {ticket_id}")
+        ticket = tickets[0]
+        # Numbers are materialized into the partition of the ticket, which an
+        # archived ticket no longer has, and only a posted ticket sells them
+        if ticket.archived or ticket.state != TicketState.POSTED:
+            raise TicketNotOnSale(f"Ticket ID - {ticket_id}")
+        conflicts: Dict[int, str] = {
+            number: NOT_FOUND
+            for number in numbers
+            if not ticket.start_num <= number <= ticket.end_num
+        }
+        wanted = [number for number in numbers if number not in conflicts]
+        # Rows materialized for a refused order are rolled back with it
+        savepoint = await session.begin_nested()
+        available: List[TicketLine] = []
+        if wanted:
+            for tkt_line in await TicketLine.materialize(
+                ticket_id=ticket_id, numbers=wanted, session=session
+            ):
+                if tkt_line.state == TicketLineState.AVAILABLE:
+                    available.append(tkt_line)
+                else:
+                    conflicts[tkt_line.number] = tkt_line.state.value
+        if not available or (conflicts and not partial):
+            await savepoint.rollback()
+            return None, dict(sorted(conflicts.items()))
+        await savepoint.commit()
+        order = await cls.reserve_lines(tickets, available, user_code, session)
+        return order, dict(sorted(conflicts.items()))
+
+    @classmethod
+    async def lock_tickets(
+        cls, ticket_ids: Iterable[int], session: AsyncSession
+    ) -> List[Ticket]:
+        # Order transitions lock in one canonical order so they cannot deadlock:
+        # tickets by id, then the order, then ticket lines by (ticket_id, id)
+        if not ticket_ids:
+            return []
+        res = await session.execute(
+            select(Ticket)
+            .where(Ticket.id.in_(ticket_ids))
+            .order_by(Ticket.id)
+            .with_for_update()
+        )
+        return res.scalars().all()
+
+    @classmethod
+    async def order_many(
+        cls, ticket_id: int, reservations: List[Reservation], session: AsyncSession
+    ) -> List[Union["Order", Exception]]:
+        # Reservations of one ticket in a single transaction, the ticket row is
+        # locked once and each reservation gets its order or its own error
+        tickets = await cls.lock_tickets([ticket_id], session)
+        ticket = tickets[0] if tickets else None
+        if not ticket:
+            raise TicketNumberNotFound(f"Ticket ID - {ticket_id}")
+        lines_by_id, lines_by_number = await cls.lock_reserved_lines(
+            ticket, reservations, session
+        )
+        results: List[Union[Order, Exception]] = []
+        reserved: List[Tuple[Order, List[TicketLine]]] = []
+        for reservation in reservations:
+            try:
+                tkt_lines = cls.pick_lines(reservation, lines_by_id, lines_by_number)
+            except (TicketNumberNotFound, TicketLineNotAvailable) as err:
+                results.append(err)
+                continue
+            order = cls(
+                name="order", state=OrderState.DRAFT, user_code=reservation.user_code
+            )
+            for tkt_line in tkt_lines:
+                tkt_line.state = TicketLineState.RESERVED
+                tkt_line.user_code = reservation.user_code
+            results.append(order)
+            reserved.append((order, tkt_lines))
+        if not reserved:
+            return results
+        # The ORM sends both lists as multi-row inserts
+        session.add_all([order for order, _ in reserved])
+        await session.flush()
+        session.add_all(
+            [
+                OrderLine(
+                    order_id=order.id, ticket_line_id=tkt_line.id, ticket_id=ticket_id
+                )
+                for order, tkt_lines in reserved
+                for tkt_line in tkt_lines
+            ]
+        )
+        tkt_lines = [tkt_line for _, lines in reserved for tkt_line in lines]
+        ticket.available_count -= len(tkt_lines)
+        ticket.reserved_count += len(tkt_lines)
+        await SaleRollup.track(
+            session, tkt_lines, {ticket.id: ticket.price}, reserved=1
+        )
+        await session.flush()
+        return results
+
+    @classmethod
+    async def lock_reserved_lines(
+        cls, ticket: Ticket, reservations: List[Reservation], session: AsyncSession
+    ) -> Tuple[Dict[int, TicketLine], Dict[int, TicketLine]]:
+        lines_by_number: Dict[int, TicketLine] = {}
+        numbers = sorted(
+            {
+                number
+                for reservation in reservations
+                for number in reservation.numbers
+                if ticket.start_num <= number <= ticket.end_num
+            }
+        )
+        if numbers:
+            for tkt_line in await TicketLine.materialize(
+                ticket_id=ticket.id, numbers=numbers, session=session
+            ):
+                lines_by_number[tkt_line.number] = tkt_line
+        lines_by_id = {tkt_line.id: tkt_line for tkt_line in lines_by_number.values()}
+        line_ids = {
+            line_id
+            for reservation in reservations
+            for line_id in reservation.ticket_line_ids
+            if line_id not in lines_by_id
+        }
+        if line_ids:
+            res = await session.execute(
+                select(TicketLine)
+                .where(TicketLine.ticket_id == ticket.id)
+                .where(TicketLine.id == any_(int_array(line_ids)))
+                .order_by(TicketLine.id)
+                .with_for_update()
+            )
+            lines_by_id.update({tkt_line.id: tkt_line for tkt_line in res.scalars()})
+        return lines_by_id, lines_by_number
+
+    @classmethod
+    def pick_lines(
+        cls,
+        reservation: Reservation,
+        lines_by_id: Dict[int, TicketLine],
+        lines_by_number: Dict[int, TicketLine],
+    ) -> List[TicketLine]:
+        tkt_lines: Dict[int, TicketLine] = {}
+        for line_id in reservation.ticket_line_ids:
+            if line_id not in lines_by_id:
+                raise TicketNumberNotFound(f"Ticket Line ID - {line_id}")
+            tkt_lines[line_id] = lines_by_id[line_id]
+        for number in reservation.numbers:
+            if number not in lines_by_number:
+                raise TicketNumberNotFound(f"Number - {number}")
+            tkt_lines[lines_by_number[number].id] = lines_by_number[number]
+        for tkt_line in tkt_lines.values():
+            # Also rejects lines reserved earlier in the same batch
+            if tkt_line.state != TicketLineState.AVAILABLE:
+                raise TicketLineNotAvailable(f"Ticket Line ID - {tkt_line.id}")
+        return list(tkt_lines.values())
+
     @classmethod
     async def get_ticket_lines_by_order_id(cls, order_id: int, session: AsyncSession):
         res = await session.execute(
@@ -92,9 +348,12 @@ class Order(Base, CommonModel):
         )
         order_lines = res.scalars().all()
         ticket_line_ids = [order_line.ticket_line_id for order_line in order_lines]
+        ticket_ids = {order_line.ticket_id for order_line in order_lines}
         res = await session.execute(
             select(TicketLine)
+            .where(TicketLine.ticket_id.in_(ticket_ids))
             .where(TicketLine.id.in_(ticket_line_ids))
+            .order_by(TicketLine.ticket_id, TicketLine.id)
             .with_for_update()
         )
         ticket_lines = res.scalars().all()
@@ -105,6 +364,9 @@ class Order(Base, CommonModel):
     async def confirm_order(
         cls, record_id: int, user_code: str, session: AsyncSession
     ) -> bool:
+        locked = await cls.lock_tickets(
+            await OrderLine.get_ticket_ids(record_id, session), session
+        )
         res = await session.execute(
             select(cls)
             .where(cls.user_code == user_code)
@@ -124,13 +386,17 @@ class Order(Base, CommonModel):
             else:
                 ticket_id_map[tkt_line.ticket_id] = 1
             tkt_line.state = TicketLineState.SOLD
-        res = await session.execute(
-            select(Ticket).where(Ticket.id.in_(ticket_id_map.keys())).with_for_update()
-        )
-        tkts = res.scalars().all()
+        tkts = [tkt for tkt in locked if tkt.id in ticket_id_map]
         for tkt in tkts:
             tkt.sold_count += ticket_id_map[tkt.id]
             tkt.reserved_count -= ticket_id_map[tkt.id]
+        await SaleRollup.track(
+            session,
+            ticket_lines,
+            {tkt.id: tkt.price for tkt in tkts},
+            sold=1,
+            revenue=1,
+        )
         await session.flush()
         return True
 
@@ -138,6 +404,9 @@ class Order(Base, CommonModel):
     async def cancel_order(
         cls, record_id: int, user_code: str, session: AsyncSession
     ) -> bool:
+        locked = await cls.lock_tickets(
+            await OrderLine.get_ticket_ids(record_id, session), session
+        )
         res = await session.execute(
             select(cls)
             .where(cls.user_code == user_code)
@@ -149,6 +418,7 @@ class Order(Base, CommonModel):
             order_id=order.id, session=session
         )
         ticket_sold_id_map: Dict[int, int] = {}
+        refund = order.state == OrderState.SUCCESSFUL
         for tkt_line in ticket_lines:
             match order.state:
                 case OrderState.DRAFT:
@@ -166,13 +436,13 @@ class Order(Base, CommonModel):
                 case OrderState.CANCEL:
                     raise OrderAlreadyCancelError(f"Order ID - {order.id}")
             tkt_line.state = TicketLineState.AVAILABLE
+            tkt_line.user_code = None
         order.state = OrderState.CANCEL
-        res = await session.execute(
-            select(Ticket)
-            .where(Ticket.id.in_([*ticket_id_map.keys(), *ticket_sold_id_map.keys()]))
-            .with_for_update()
-        )
-        tkts = res.scalars().all()
+        tkts = [
+            tkt
+            for tkt in locked
+            if tkt.id in ticket_id_map or tkt.id in ticket_sold_id_map
+        ]
         for tkt in tkts:
             if tkt.id in ticket_id_map:
                 tkt.reserved_count -= ticket_id_map[tkt.id]
@@ -180,19 +450,39 @@ class Order(Base, CommonModel):
             if tkt.id in ticket_sold_id_map:
                 tkt.sold_count -= ticket_sold_id_map[tkt.id]
                 tkt.available_count += ticket_sold_id_map[tkt.id]
+        await SaleRollup.track(
+            session,
+            ticket_lines,
+            {tkt.id: tkt.price for tkt in tkts},
+            cancelled=1,
+            refunded=int(refund),
+            revenue=-int(refund),
+        )
         await session.flush()
         return True
 
 
 class OrderLine(Base, CommonModel):
     __tablename__ = "ticket_order_line"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["ticket_line_id", "ticket_id"],
+            ["ticket_line.id", "ticket_line.ticket_id"],
+        ),
+        Index(
+            "ix_ticket_order_line_order_id_ticket_line_id",
+            "order_id",
+            "ticket_line_id",
+        ),
+        {"postgresql_partition_by": "LIST (ticket_id)"},
+    )
+    _partition_key = "ticket_id"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey("ticket_order.id"), index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    ticket_id: Mapped[int] = mapped_column(primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("ticket_order.id"))
     order: Mapped[Order] = relationship(back_populates="line_ids")
-    ticket_line_id: Mapped[int] = mapped_column(
-        ForeignKey("ticket_line.id"), index=True
-    )
+    ticket_line_id: Mapped[int] = mapped_column(index=True)
     ticket_line: Mapped[TicketLine] = relationship()
 
     @classmethod
@@ -202,3 +492,30 @@ class OrderLine(Base, CommonModel):
         stmt = select(cls).where(cls.order_id == order_id)
         res = await engine.execute(stmt)
         return res.scalars().all()
+
+    @classmethod
+    async def get_ticket_ids(cls, order_id: int, engine: AsyncSession) -> List[int]:
+        stmt = select(cls.ticket_id).where(cls.order_id == order_id).distinct()
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
+    @classmethod
+    async def get_order_lines_by_order_ids(
+        cls, order_ids: List[int], engine: AsyncSession
+    ) -> List["OrderLine"]:
+        stmt = select(cls).where(cls.order_id.in_(order_ids))
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
+    @classmethod
+    async def get_order_lines_with_ticket_lines(
+        cls, order_ids: List[int], engine: AsyncSession
+    ) -> List[Tuple["OrderLine", TicketLine]]:
+        stmt = (
+            select(cls, TicketLine)
+            .join(cls.ticket_line)
+            .where(cls.order_id.in_(order_ids))
+            .order_by(cls.order_id, cls.id)
+        )
+        res = await engine.execute(stmt)
+        return res.tuples().all()
@@ -0,0 +1,196 @@
+import asyncio
+import random
+import re
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import ColumnElement, func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+# Both tables are LIST partitioned by ticket_id, one partition per ticket and no
+# DEFAULT partition. Retiring a ticket detaches and drops its tables instead of
+# deleting its rows, and lookups with a ticket_id only visit its partition. A
+# DEFAULT partition would be scanned by every attach and rules out detaching
+# concurrently. The price is two tables per ticket: the catalog grows with the
+# tickets and lookups without a ticket_id visit every partition, so done tickets
+# are archived to drop theirs.
+# The order is the referenced table first.
+PARTITIONED_TABLES = ("ticket_line", "ticket_order_line")
+PARTITION_NAME = re.compile(rf"^({'|'.join(PARTITIONED_TABLES)})_p\d+$")
+# lock_not_available, raised once lock_timeout ran out
+LOCK_NOT_AVAILABLE = "55P03"
+
+# pylint: disable=not-callable
+
+
+def partition_name(table: str, ticket_id: int) -> str:
+    return f"{table}_p{int(ticket_id)}"
+
+
+def is_partition(name: str) -> bool:
+    return bool(PARTITION_NAME.match(name))
+
+
+def has_partitions(ticket_id: ColumnElement[int]) -> ColumnElement[bool]:
+    # ticket_line is dropped last, its partition is left until every step is done
+    return func.to_regclass(
+        func.concat(f"{PARTITIONED_TABLES[0]}_p", ticket_id)
+    ).is_not(None)
+
+
+async def execute_ddl(
+    engine: AsyncEngine, statement: str, lock_timeout: int, autocommit: bool = False
+):
+    # Each step changes the catalog in its own short transaction and waits at
+    # most lock_timeout milliseconds for its locks, instead of queueing every
+    # writer of the tables it locks behind it
+    if autocommit:
+        # DETACH CONCURRENTLY cannot run in a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"SET lock_timeout = {int(lock_timeout)}"))
+            try:
+                await conn.execute(text(statement))
+            finally:
+                await conn.execute(text("RESET lock_timeout"))
+        return
+    async with engine.begin() as conn:
+        await conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout)}"))
+        await conn.execute(text(statement))
+
+
+async def retry_locked(
+    step: Callable[[], Awaitable[None]], lock_timeout: int, attempts: int
+):
+    # A step which timed out on its locks is tried again a little later
+    for attempt in range(1, attempts + 1):
+        try:
+            await step()
+            return
+        except DBAPIError as err:
+            if (
+                attempt >= attempts
+                or getattr(err.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE
+            ):
+                raise
+        await asyncio.sleep(random.uniform(0, lock_timeout / 1000))
+
+
+async def get_detach_pending(conn: AsyncConnection, name: str) -> Optional[bool]:
+    # None when the table is not a partition
+    res = await conn.execute(
+        text(
+            "SELECT inhdetachpending FROM pg_inherits "
+            "WHERE inhrelid = to_regclass(:name)"
+        ),
+        {"name": name},
+    )
+    return res.scalar()
+
+
+async def create_ticket_partitions(
+    engine: AsyncEngine, ticket_id: int, lock_timeout: int, attempts: int
+):
+    # CREATE TABLE PARTITION OF would lock the parent until the end of its
+    # transaction. The partition is created as a plain table and then attached,
+    # which only takes SHARE UPDATE EXCLUSIVE on the parent, and its CHECK
+    # spares the attach a scan. The foreign keys it clones briefly lock the
+    # tables they reference, the ticket table among them.
+    for table in PARTITIONED_TABLES:
+        name = partition_name(table, ticket_id)
+        async with engine.begin() as conn:
+            if await get_detach_pending(conn, name) is not None:
+                continue
+            await conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} "
+                    f"(LIKE {table} INCLUDING DEFAULTS, "
+                    f"CONSTRAINT {name}_ticket_id CHECK (ticket_id = {int(ticket_id)}))"
+                )
+            )
+        attach = (
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES IN ({int(ticket_id)})"
+        )
+        await retry_locked(
+            lambda attach=attach: execute_ddl(engine, attach, lock_timeout),
+            lock_timeout,
+            attempts,
+        )
+
+
+async def detach_partition(
+    engine: AsyncEngine, table: str, name: str, lock_timeout: int
+):
+    # A detach which timed out half way stays pending and is finalized instead
+    # of started again. A parent allows one pending detach at a time, so one
+    # left by another ticket is finalized first.
+    async with engine.connect() as conn:
+        res = await conn.execute(
+            text(
+                "SELECT inhrelid::regclass::text FROM pg_inherits "
+                "WHERE inhparent = to_regclass(:table) AND inhdetachpending"
+            ),
+            {"table": table},
+        )
+        pending = res.scalars().all()
+        attached = await get_detach_pending(conn, name) is False
+    for other in pending:
+        await execute_ddl(
+            engine,
+            f"ALTER TABLE {table} DETACH PARTITION {other} FINALIZE",
+            lock_timeout,
+            autocommit=True,
+        )
+    if attached:
+        await execute_ddl(
+            engine,
+            f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY",
+            lock_timeout,
+            autocommit=True,
+        )
+
+
+async def detach_ticket_partitions(
+    engine: AsyncEngine, ticket_id: int, lock_timeout: int, attempts: int
+) -> List[str]:
+    # Detaching concurrently never takes more than SHARE UPDATE EXCLUSIVE on
+    # the parent, and no row of the ticket can be written once it is done
+    names = []
+    for table in reversed(PARTITIONED_TABLES):
+        name = partition_name(table, ticket_id)
+        await retry_locked(
+            lambda table=table, name=name: detach_partition(
+                engine, table, name, lock_timeout
+            ),
+            lock_timeout,
+            attempts,
+        )
+        names.append(name)
+    return names
+
+
+async def drop_ticket_partitions(
+    engine: AsyncEngine, ticket_id: int, lock_timeout: int, attempts: int
+) -> List[str]:
+    # Safe to run again after a failure, every step skips what is already done.
+    # Dropping a detached table briefly locks the tables its foreign keys
+    # reference.
+    names = await detach_ticket_partitions(engine, ticket_id, lock_timeout, attempts)
+    for name in names:
+        drop = f"DROP TABLE IF EXISTS {name}"
+        await retry_locked(
+            lambda drop=drop: execute_ddl(engine, drop, lock_timeout),
+            lock_timeout,
+            attempts,
+        )
+    return names
+
+
+async def get_detached_order_ids(session: AsyncSession, ticket_id: int) -> List[int]:
+    # Orders of a ticket whose partitions are detached but not dropped yet
+    name = partition_name(PARTITIONED_TABLES[1], ticket_id)
+    res = await session.execute(text("SELECT to_regclass(:name)"), {"name": name})
+    if res.scalar() is None:
+        return []
+    res = await session.execute(text(f"SELECT DISTINCT order_id FROM {name}"))
+    return res.scalars().all()
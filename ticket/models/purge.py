@@ -0,0 +1,39 @@
+from typing import List
+from sqlalchemy import any_, delete, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .archive import OrderArchive, TicketNumberArchive
+from .models import Tombstone
+from .order import Order, OrderLine
+from .rollup import SaleRollup
+from .ticket import Ticket, int_array
+
+
+async def delete_ticket(
+    session: AsyncSession, ticket_id: int, order_ids: List[int]
+) -> int:
+    # The partitions of the ticket are dropped by the caller beforehand, the
+    # foreign keys of their tables would keep the ticket row. order_ids are the
+    # orders which had lines of the ticket, the ones left empty are deleted in
+    # the same transaction, returns how many.
+    ticket = await session.get(Ticket, ticket_id, with_for_update=True)
+    if ticket:
+        for model in (TicketNumberArchive, OrderArchive, SaleRollup):
+            await session.execute(delete(model).where(model.ticket_id == ticket_id))
+        await session.delete(ticket)
+        # Lines went with their partitions, feed readers drop them with the ticket
+        await Tombstone.record(session, Ticket.__tablename__, [ticket_id])
+        await session.flush()
+    return await delete_empty_orders(session, order_ids)
+
+
+async def delete_empty_orders(session: AsyncSession, order_ids: List[int]) -> int:
+    res = await session.execute(
+        delete(Order)
+        .where(Order.id == any_(int_array(order_ids)))
+        .where(~exists().where(OrderLine.order_id == Order.id))
+        .returning(Order.id)
+    )
+    deleted = res.scalars().all()
+    await Tombstone.record(session, Order.__tablename__, deleted)
+    return len(deleted)
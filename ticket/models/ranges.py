@@ -0,0 +1,28 @@
+from typing import Iterable, List, Tuple
+
+# Inclusive (start, end) pairs of ticket numbers
+Range = Tuple[int, int]
+
+
+def to_ranges(numbers: Iterable[int]) -> List[Range]:
+    ranges: List[Range] = []
+    for number in sorted(set(numbers)):
+        if ranges and ranges[-1][1] + 1 == number:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
+
+
+def complement(start: int, end: int, numbers: Iterable[int]) -> List[Range]:
+    ranges: List[Range] = []
+    cursor = start
+    for first, last in to_ranges(numbers):
+        if last < start or first > end:
+            continue
+        if first > cursor:
+            ranges.append((cursor, first - 1))
+        cursor = max(cursor, last + 1)
+    if cursor <= end:
+        ranges.append((cursor, end))
+    return ranges
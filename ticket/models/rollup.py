@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Date, Float, ForeignKey, Integer, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .models import Base
+from .ticket import TicketLine
+
+# pylint: disable=unsubscriptable-object
+
+COUNTERS = ("reserved", "sold", "cancelled", "refunded", "revenue")
+
+
+class SaleRollup(Base):
+    # Sales per ticket, day and unit price, kept up to date by the order
+    # transitions so dashboards never scan ticket_line
+    __tablename__ = "ticket_sale_rollup"
+
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("ticket.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    price: Mapped[float] = mapped_column(Float, primary_key=True)
+    reserved: Mapped[int] = mapped_column(Integer, default=0)
+    sold: Mapped[int] = mapped_column(Integer, default=0)
+    cancelled: Mapped[int] = mapped_column(Integer, default=0)
+    refunded: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
+
+    @classmethod
+    async def track(
+        cls,
+        session: AsyncSession,
+        lines: List[TicketLine],
+        prices: Dict[int, float],
+        **deltas: int,
+    ):
+        # deltas are added once per line, revenue is multiplied by the line price
+        rows: Dict[Tuple[int, float], Dict[str, float]] = {}
+        for line in lines:
+            price = (
+                line.special_price if line.is_special_price else prices[line.ticket_id]
+            )
+            row = rows.setdefault(
+                (line.ticket_id, price), {counter: 0 for counter in COUNTERS}
+            )
+            for counter, delta in deltas.items():
+                row[counter] += delta * price if counter == "revenue" else delta
+        if not rows:
+            return
+        day = datetime.utcnow().date()
+        stmt = insert(cls).values(
+            [
+                {"ticket_id": ticket_id, "day": day, "price": price, **row}
+                # Same order for every transaction so concurrent upserts cannot deadlock
+                for (ticket_id, price), row in sorted(rows.items())
+            ]
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["ticket_id", "day", "price"],
+                set_={
+                    counter: getattr(cls, counter) + stmt.excluded[counter]
+                    for counter in COUNTERS
+                },
+            )
+        )
+
+    @classmethod
+    async def get_rollups(
+        cls,
+        session: AsyncSession,
+        ticket_ids: Optional[List[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> List["SaleRollup"]:
+        stmt = select(cls)
+        if ticket_ids:
+            stmt = stmt.where(cls.ticket_id.in_(ticket_ids))
+        if date_from:
+            stmt = stmt.where(cls.day >= date_from)
+        if date_to:
+            stmt = stmt.where(cls.day <= date_to)
+        res = await session.execute(stmt.order_by(cls.day, cls.ticket_id, cls.price))
+        return res.scalars().all()
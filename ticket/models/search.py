@@ -0,0 +1,28 @@
+import re
+from typing import Optional
+from sqlalchemy import ColumnElement, false, func
+
+# No stemming, ticket names are mostly proper nouns in several languages
+SEARCH_CONFIG = "simple"
+
+WORD = re.compile(r"\w+")
+
+
+def to_prefix_query(value: str) -> Optional[str]:
+    # Every word must match the start of a word, so results narrow while typing
+    words = WORD.findall(value.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def matches(vector: ColumnElement, value: str) -> ColumnElement:
+    query = to_prefix_query(value)
+    if query is None:
+        return false()
+    return vector.op("@@")(func.to_tsquery(SEARCH_CONFIG, query))
+
+
+def rank(vector: ColumnElement, value: str) -> ColumnElement:
+    query = to_prefix_query(value) or ""
+    return func.ts_rank(vector, func.to_tsquery(SEARCH_CONFIG, query))
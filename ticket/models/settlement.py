@@ -0,0 +1,168 @@
+from collections import Counter
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from sqlalchemy import Row, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import strawberry
+
+from .models import Filter
+from .order import Order, OrderLine, OrderState
+from .rollup import SaleRollup
+from .ticket import Ticket, TicketLine, TicketLineState
+
+# pylint: disable=unsubscriptable-object
+
+
+@strawberry.enum
+class SettleAction(Enum):
+    CONFIRM = "CONFIRM"
+    CANCEL = "CANCEL"
+
+
+# Orders each action applies to, the others are skipped
+SETTLE_FROM = {
+    SettleAction.CONFIRM: (OrderState.DRAFT,),
+    SettleAction.CANCEL: (OrderState.DRAFT, OrderState.SUCCESSFUL),
+}
+
+
+SETTLE_LINE_STATE = {
+    OrderState.DRAFT: TicketLineState.RESERVED,
+    OrderState.SUCCESSFUL: TicketLineState.SOLD,
+}
+
+
+class TooManyOrders(Exception):
+    pass
+
+
+class SettleResult(BaseModel):
+    settled: List[int] = []
+    skipped: List[int] = []
+    # Owners of the settled orders
+    user_codes: List[str] = []
+
+
+async def get_settle_order_ids(
+    session: AsyncSession,
+    action: SettleAction,
+    domain: Optional[List[Tuple[str, str, Any]]],
+    after: int,
+    limit: int,
+) -> List[int]:
+    stmt = Filter(domain=domain or []).prepare_where(select(Order.id), Order)
+    res = await session.execute(
+        stmt.where(Order.state.in_(SETTLE_FROM[action]))
+        .where(Order.id > after)
+        .order_by(Order.id)
+        .limit(limit)
+    )
+    return res.scalars().all()
+
+
+async def lock_settle_lines(
+    session: AsyncSession, order_ids: List[int], action: SettleAction
+) -> Tuple[List[Ticket], Dict[int, Row], List[Row]]:
+    # Locks in the canonical order of the single order transitions
+    res = await session.execute(
+        select(OrderLine.ticket_id).where(OrderLine.order_id.in_(order_ids)).distinct()
+    )
+    tickets = await Order.lock_tickets(res.scalars().all(), session)
+    res = await session.execute(
+        select(Order.id, Order.state, Order.user_code)
+        .where(Order.id.in_(order_ids))
+        .where(Order.state.in_(SETTLE_FROM[action]))
+        .order_by(Order.id)
+        .with_for_update()
+    )
+    orders: Dict[int, Row] = {order.id: order for order in res.all()}
+    res = await session.execute(
+        select(
+            OrderLine.order_id,
+            TicketLine.id,
+            TicketLine.ticket_id,
+            TicketLine.state,
+            TicketLine.is_special_price,
+            TicketLine.special_price,
+        )
+        .join(OrderLine.ticket_line)
+        .where(OrderLine.order_id.in_(list(orders)))
+        .order_by(TicketLine.ticket_id, TicketLine.id)
+        .with_for_update(of=TicketLine)
+    )
+    return tickets, orders, res.all()
+
+
+async def move_lines(
+    session: AsyncSession,
+    tickets: List[Ticket],
+    reserved: List[Row],
+    sold: List[Row],
+    action: SettleAction,
+) -> OrderState:
+    lines = reserved + sold
+    stmt = (
+        update(TicketLine)
+        .where(TicketLine.ticket_id.in_(list({line.ticket_id for line in lines})))
+        .where(TicketLine.id.in_([line.id for line in lines]))
+        .values(write_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    prices = {tkt.id: tkt.price for tkt in tickets}
+    reserved_counts = Counter(line.ticket_id for line in reserved)
+    sold_counts = Counter(line.ticket_id for line in sold)
+    if action == SettleAction.CONFIRM:
+        await session.execute(stmt.values(state=TicketLineState.SOLD))
+        for tkt in tickets:
+            tkt.sold_count += reserved_counts[tkt.id]
+            tkt.reserved_count -= reserved_counts[tkt.id]
+        await SaleRollup.track(session, reserved, prices, sold=1, revenue=1)
+        return OrderState.SUCCESSFUL
+    await session.execute(stmt.values(state=TicketLineState.AVAILABLE, user_code=None))
+    for tkt in tickets:
+        tkt.reserved_count -= reserved_counts[tkt.id]
+        tkt.sold_count -= sold_counts[tkt.id]
+        tkt.available_count += reserved_counts[tkt.id] + sold_counts[tkt.id]
+    await SaleRollup.track(session, reserved, prices, cancelled=1)
+    await SaleRollup.track(session, sold, prices, cancelled=1, refunded=1, revenue=-1)
+    return OrderState.CANCEL
+
+
+async def settle_orders(
+    session: AsyncSession, order_ids: List[int], action: SettleAction
+) -> SettleResult:
+    # Same transitions as confirm_order and cancel_order applied to many orders
+    # with one statement per table, each ticket counter is written once
+    tickets, orders, lines = await lock_settle_lines(session, order_ids, action)
+    states = {order.id: order.state for order in orders.values()}
+    # An order whose lines were changed behind its back is left to the single
+    # order mutations, which report the line at fault
+    broken = {
+        line.order_id
+        for line in lines
+        if line.state != SETTLE_LINE_STATE[states[line.order_id]]
+    }
+    settled = [order_id for order_id in states if order_id not in broken]
+    if settled:
+        lines = [line for line in lines if line.order_id not in broken]
+        state = await move_lines(
+            session,
+            tickets,
+            [line for line in lines if states[line.order_id] == OrderState.DRAFT],
+            [line for line in lines if states[line.order_id] == OrderState.SUCCESSFUL],
+            action,
+        )
+        await session.execute(
+            update(Order)
+            .where(Order.id.in_(settled))
+            .values(state=state, write_date=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await session.flush()
+    return SettleResult(
+        settled=settled,
+        skipped=[order_id for order_id in order_ids if order_id not in settled],
+        user_codes=sorted({orders[order_id].user_code for order_id in settled}),
+    )
@@ -1,25 +1,39 @@
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy import (
+    ColumnElement,
+    Insert,
     String,
     Integer,
     Float,
     Text,
     Boolean,
     ForeignKey,
+    Computed,
+    Index,
+    UniqueConstraint,
     select,
+    text,
+    update,
+    tuple_,
     DateTime,
+    func,
+    literal,
+    any_,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 import strawberry
 
-from .models import Base, CommonModel
+from .models import Base, CommonModel, int_array
+from .partition import create_ticket_partitions
+from .search import SEARCH_CONFIG, matches, rank
 
-# pylint: disable=unsubscriptable-object
+# pylint: disable=unsubscriptable-object, too-many-arguments, not-callable
 
 
 class TicketLineNotAvailable(Exception):
@@ -30,6 +44,14 @@ class TicketLineNotReserved(Exception):
     pass
 
 
+class TicketNumberNotFound(Exception):
+    pass
+
+
+class TicketNotOnSale(Exception):
+    pass
+
+
 @strawberry.enum
 class TicketState(Enum):
     DRAFT = "DRAFT"
@@ -37,8 +59,22 @@ class TicketState(Enum):
     DONE = "DONE"
 
 
+@strawberry.enum
+class TicketStorage(Enum):
+    # One row per number, created with the ticket
+    LINES = "LINES"
+    # Rows only for numbers which left the AVAILABLE state or have a special
+    # price, every other number in start_num..end_num is available
+    RANGES = "RANGES"
+
+
 class Ticket(Base, CommonModel):
     __tablename__ = "ticket"
+    __table_args__ = (
+        Index("ix_ticket_search_vector", "search_vector", postgresql_using="gin"),
+        # Lifecycle transitions and date filtered listings
+        Index("ix_ticket_state_dates", "state", "start_date", "end_date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(30))
@@ -60,22 +96,80 @@ class Ticket(Base, CommonModel):
         back_populates="ticket",
     )
     sync_user: Mapped[str] = mapped_column(String, index=True)
+    # Lines and order lines moved to the archive tables
+    archived: Mapped[bool] = mapped_column(Boolean, default=False)
+    storage: Mapped[TicketStorage] = mapped_column(default=TicketStorage.LINES)
+    # Full-text document of name and description, both columns also have
+    # trigram indexes so ILIKE filters on them are indexed
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', "
+            "coalesce(name, '') || ' ' || coalesce(description, ''))",
+            persisted=True,
+        ),
+        deferred=True,
+    )
 
     def __repr__(self) -> str:
         return f"Ticket(id={self.id!r}, name={self.name!r})"
 
-    async def create_lines(self, engine: AsyncSession) -> List["TicketLine"]:
-        res = await engine.execute(
-            select(TicketLine).where(TicketLine.ticket_id == self.id)
+    @classmethod
+    async def search(
+        cls,
+        session: AsyncSession,
+        value: str,
+        limit: int,
+        after: Optional[Tuple[float, int]] = None,
+        states: Optional[List[TicketState]] = None,
+    ) -> List[Tuple["Ticket", float]]:
+        score = rank(cls.search_vector, value)
+        stmt = select(cls, score).where(matches(cls.search_vector, value))
+        if states:
+            stmt = stmt.where(cls.state.in_(states))
+        if after:
+            stmt = stmt.where(tuple_(score, cls.id) < tuple_(*after))
+        res = await session.execute(
+            stmt.order_by(score.desc(), cls.id.desc()).limit(limit)
+        )
+        return res.all()
+
+    @classmethod
+    async def get_write_date(
+        cls, ticket_id: int, session: AsyncSession
+    ) -> Optional[datetime]:
+        # Every change to the lines of a ticket also writes the ticket row
+        res = await session.execute(select(cls.write_date).where(cls.id == ticket_id))
+        return res.scalar()
+
+    @property
+    def line_count(self) -> int:
+        return self.end_num - self.start_num + 1
+
+    async def add_partitioned(
+        self, session: AsyncSession, lock_timeout: int, attempts: int
+    ):
+        # Attaching the partitions waits on every transaction which wrote to
+        # the ticket table, this one included, so they are attached before the
+        # ticket row is written. A ticket rolled back afterwards leaves its
+        # empty partitions behind, its id is never handed out again.
+        res = await session.execute(
+            select(func.nextval(func.pg_get_serial_sequence(self.__tablename__, "id")))
+        )
+        self.id = res.scalar_one()
+        await create_ticket_partitions(session.bind, self.id, lock_timeout, attempts)
+        session.add(self)
+        await session.flush()
+
+    async def create_lines_inline(self, session: AsyncSession) -> int:
+        # One INSERT ... SELECT, large tickets get their lines from a
+        # create_lines job instead. Lines of RANGES tickets are created when
+        # ordered.
+        if self.storage == TicketStorage.RANGES:
+            return 0
+        return await TicketLine.create_number_range(
+            self.id, self.start_num, self.end_num, session
         )
-        records = res.scalars().all()
-        if records:
-            return records
-        records = []
-        for idx in range(self.start_num, self.end_num + 1):
-            records.append(TicketLine(number=idx, ticket_id=self.id))
-        engine.add_all(records)
-        return records
 
 
 @strawberry.enum
@@ -87,10 +181,31 @@ class TicketLineState(Enum):
 
 class TicketLine(Base, CommonModel):
     __tablename__ = "ticket_line"
+    __table_args__ = (
+        UniqueConstraint("ticket_id", "number", name="uq_ticket_line_ticket_id_number"),
+        Index("ix_ticket_line_ticket_id_state", "ticket_id", "state"),
+        Index(
+            "ix_ticket_line_available",
+            "ticket_id",
+            "number",
+            postgresql_where=text("state = 'AVAILABLE'"),
+        ),
+        Index(
+            "ix_ticket_line_user_code",
+            "user_code",
+            "ticket_id",
+            "number",
+            postgresql_where=text("user_code IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "LIST (ticket_id)"},
+    )
+    # ticket_id is the partition key, it is part of the primary key so the
+    # updates flushed by the ORM only touch one partition
+    _partition_key = "ticket_id"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     number: Mapped[int] = mapped_column(nullable=False)
-    ticket_id: Mapped[int] = mapped_column(ForeignKey("ticket.id"), index=True)
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("ticket.id"), primary_key=True)
     ticket: Mapped[Ticket] = relationship(back_populates="line_ids")
     user_code: Mapped[str] = mapped_column(String(length=30), nullable=True)
     is_special_price: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -109,3 +224,148 @@ class TicketLine(Base, CommonModel):
         stmt = select(cls).where(cls.ticket_id == ticket_id)
         res = await engine.execute(stmt)
         return res.scalars().all()
+
+    @classmethod
+    async def get_records_by_keys(
+        cls, keys: List[Tuple[int, int]], engine: AsyncSession
+    ) -> List["TicketLine"]:
+        # keys are (id, ticket_id) so each lookup stays in its partition
+        stmt = select(cls).where(tuple_(cls.id, cls.ticket_id).in_(keys))
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
+    @classmethod
+    async def get_ticket_ids(cls, ids: List[int], engine: AsyncSession) -> List[int]:
+        if not ids:
+            return []
+        stmt = select(cls.ticket_id).where(cls.id == any_(int_array(ids))).distinct()
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
+    @classmethod
+    async def touch_tickets(cls, engine: AsyncSession, ticket_ids: List[int]):
+        # Lines changed outside the order transitions write their tickets too,
+        # so the counter reconciler revisits them and the numbers cached for
+        # their users are read again. Tickets are locked first, in the lock
+        # order of the order transitions.
+        if not ticket_ids:
+            return
+        res = await engine.execute(
+            select(Ticket.id)
+            .where(Ticket.id.in_(ticket_ids))
+            .order_by(Ticket.id)
+            .with_for_update()
+        )
+        await engine.execute(
+            update(Ticket)
+            .where(Ticket.id.in_(res.scalars().all()))
+            .values(write_date=datetime.utcnow())
+        )
+
+    @classmethod
+    async def update_records(
+        cls, engine: AsyncSession, data_list: List[Dict[str, str]]
+    ) -> List["TicketLine"]:
+        data_list = await cls.fill_partition_key(engine, data_list)
+        await cls.touch_tickets(
+            engine, sorted({data[cls._partition_key] for data in data_list})
+        )
+        return await super().update_records(engine, data_list)
+
+    @classmethod
+    async def delete_records(cls, engine: AsyncSession, ids: List[int]) -> bool:
+        # A deleted line leaves no row behind, its ticket is written instead
+        await cls.touch_tickets(engine, await cls.get_ticket_ids(ids, engine))
+        return await super().delete_records(engine, ids)
+
+    @classmethod
+    async def get_user_numbers(
+        cls, ticket_id: int, user_code: str, engine: AsyncSession
+    ) -> List[Tuple[int, TicketLineState]]:
+        # Served by ix_ticket_line_user_code
+        stmt = (
+            select(cls.number, cls.state)
+            .where(cls.user_code == user_code)
+            .where(cls.ticket_id == ticket_id)
+            .where(cls.state != TicketLineState.AVAILABLE)
+            .order_by(cls.number)
+        )
+        res = await engine.execute(stmt)
+        return res.tuples().all()
+
+    @classmethod
+    async def get_taken_numbers(cls, ticket_id: int, engine: AsyncSession) -> List[int]:
+        stmt = (
+            select(cls.number)
+            .where(cls.ticket_id == ticket_id)
+            .where(cls.state != TicketLineState.AVAILABLE)
+            .order_by(cls.number)
+        )
+        res = await engine.execute(stmt)
+        return res.scalars().all()
+
+    @classmethod
+    def insert_available(cls, ticket_id: int, numbers: ColumnElement[int]) -> Insert:
+        # Lines of the numbers generated by the database, numbers which already
+        # have a line are left alone
+        now = datetime.utcnow()
+        rows = select(
+            literal(ticket_id),
+            numbers,
+            literal(TicketLineState.AVAILABLE, cls.state.type),
+            literal(False),
+            literal(0.0),
+            literal(now),
+            literal(now),
+        )
+        return (
+            insert(cls)
+            .from_select(
+                [
+                    "ticket_id",
+                    "number",
+                    "state",
+                    "is_special_price",
+                    "special_price",
+                    "create_date",
+                    "write_date",
+                ],
+                rows,
+            )
+            .on_conflict_do_nothing(index_elements=["ticket_id", "number"])
+        )
+
+    @classmethod
+    async def materialize(
+        cls, ticket_id: int, numbers: List[int], session: AsyncSession
+    ) -> List["TicketLine"]:
+        ticket = await session.get(Ticket, ticket_id)
+        if not ticket:
+            raise TicketNumberNotFound(f"Ticket ID - {ticket_id}")
+        for number in numbers:
+            if not ticket.start_num <= number <= ticket.end_num:
+                raise TicketNumberNotFound(
+                    f"Ticket ID - {ticket_id}, Number - {number}"
+                )
+        # The numbers travel as one array parameter, a coalesced batch can hold
+        # more of them than a statement has bind parameters
+        wanted = int_array(numbers)
+        await session.execute(cls.insert_available(ticket_id, func.unnest(wanted)))
+        res = await session.execute(
+            select(cls)
+            .where(cls.ticket_id == ticket_id)
+            .where(cls.number == any_(wanted))
+            .order_by(cls.id)
+            .with_for_update()
+        )
+        return res.scalars().all()
+
+    @classmethod
+    async def create_number_range(
+        cls, ticket_id: int, start: int, end: int, session: AsyncSession
+    ) -> int:
+        # Lines of start..end, a chunk can be run twice
+        res = await session.execute(
+            cls.insert_available(ticket_id, func.generate_series(start, end))
+        )
+        return res.rowcount
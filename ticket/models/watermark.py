@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .models import Base
+
+
+class Watermark(Base):
+    # Last point in time processed by an incremental job
+    __tablename__ = "job_watermark"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(DateTime)
+    write_date: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    @classmethod
+    async def get_watermark(
+        cls, name: str, session: AsyncSession
+    ) -> Optional[datetime]:
+        record = await session.get(cls, name)
+        return record.watermark if record else None
+
+    @classmethod
+    async def set_watermark(cls, name: str, watermark: datetime, session: AsyncSession):
+        stmt = insert(cls).values(
+            name=name, watermark=watermark, write_date=datetime.utcnow()
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={
+                    "watermark": stmt.excluded.watermark,
+                    "write_date": stmt.excluded.write_date,
+                },
+            )
+        )
@@ -0,0 +1,92 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import List, Optional
+import strawberry
+from strawberry.types import Info
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ticket.env.settings import get_settings
+from ticket.models.changes import Cursor, get_changes, get_cursor, get_horizon
+from ticket.models.models import Tombstone
+from ticket.models.order import Order
+from ticket.models.ticket import Ticket, TicketLine
+
+from .schemas import CommonSchema, InvalidCursor
+from .order import OrderGql
+from .ticket import TicketGql, TicketLineGql
+
+MAX_CHANGES = 1000
+
+
+def encode_change_cursor(cursor: Cursor) -> str:
+    write_date, entity, record_id = cursor
+    value = f"{write_date.isoformat()}|{entity}|{record_id}"
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_change_cursor(cursor: str) -> Cursor:
+    try:
+        write_date, entity, record_id = (
+            urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(write_date), entity, int(record_id)
+    except ValueError as err:
+        raise InvalidCursor(cursor) from err
+
+
+@strawberry.type
+class TombstoneGql:
+    entity: str
+    record_id: int
+    write_date: datetime
+
+
+@strawberry.type
+class ChangeFeedGql:
+    tickets: List[TicketGql]
+    ticket_lines: List[TicketLineGql]
+    orders: List[OrderGql]
+    deletes: List[TombstoneGql]
+    # Passed back as after, also when nothing changed
+    end_cursor: Optional[str]
+    has_more: bool
+
+    @classmethod
+    async def get_changes(
+        cls, info: Info, after: Optional[str] = None, limit: int = 500
+    ) -> "ChangeFeedGql":
+        await CommonSchema.get_odoo_user(info=info)
+        # Read on the primary, a replica cannot tell which transactions are
+        # still open there
+        session: AsyncSession = info.context.get("db_session")
+        limit = max(1, min(limit, MAX_CHANGES))
+        cursor = decode_change_cursor(after) if after else None
+        setting = get_settings().changes
+        horizon = await get_horizon(session, setting.lag, setting.horizon_warning)
+        rows = await get_changes(session, cursor, horizon, limit + 1)
+        feed = cls(
+            tickets=[],
+            ticket_lines=[],
+            orders=[],
+            deletes=[],
+            end_cursor=after,
+            has_more=len(rows) > limit,
+        )
+        for row in rows[:limit]:
+            match row:
+                case Ticket():
+                    feed.tickets.append(TicketGql.parse_obj(row))
+                case TicketLine():
+                    feed.ticket_lines.append(TicketLineGql.parse_obj(row))
+                case Order():
+                    feed.orders.append(OrderGql.parse_obj(row))
+                case Tombstone():
+                    feed.deletes.append(
+                        TombstoneGql(
+                            entity=row.entity,
+                            record_id=row.record_id,
+                            write_date=row.write_date,
+                        )
+                    )
+            feed.end_cursor = encode_change_cursor(get_cursor(row))
+        return feed
@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import strawberry
+from strawberry.scalars import JSON
+from strawberry.types import Info
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ticket.env.settings import get_settings
+from ticket.models.job import Job, JobState
+from ticket.models.settlement import SettleAction
+from ticket.models.ticket import Ticket
+
+from .schemas import MAX_PAGE_SIZE, CommonSchema
+from .ticket import TicketData
+
+
+@strawberry.type
+class JobGql:
+    id: strawberry.ID
+    kind: str
+    state: JobState
+    arguments: JSON
+    progress: JSON
+    result: Optional[JSON]
+    error: Optional[str]
+    attempts: int
+    create_date: datetime
+    write_date: datetime
+
+    @classmethod
+    def parse_obj(cls, job: Job) -> "JobGql":
+        return cls(
+            id=job.id,
+            kind=job.kind,
+            state=job.state,
+            arguments=job.arguments,
+            progress=job.progress,
+            result=job.result,
+            error=job.error,
+            attempts=job.attempts,
+            create_date=job.create_date,
+            write_date=job.write_date,
+        )
+
+    @classmethod
+    async def enqueue(
+        cls, info: Info, kind: str, arguments: Dict[str, Any]
+    ) -> "JobGql":
+        # Committed with the request, a worker picks it up within its interval
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        return cls.parse_obj(await Job.enqueue(session, kind, arguments))
+
+    @classmethod
+    async def get_job(cls, info: Info, id: strawberry.ID) -> Optional["JobGql"]:
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("ro_db_session")
+        job = await session.get(Job, int(id))
+        return cls.parse_obj(job) if job else None
+
+    @classmethod
+    async def get_jobs(
+        cls, info: Info, states: Optional[List[JobState]] = None, limit: int = 10
+    ) -> List["JobGql"]:
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("ro_db_session")
+        return [
+            cls.parse_obj(job)
+            for job in await Job.get_jobs(
+                session, states=states, limit=min(limit, MAX_PAGE_SIZE)
+            )
+        ]
+
+    @classmethod
+    async def add_ticket(cls, info: Info, data: JSON) -> "JobGql":
+        # The ticket is created right away, its lines by the job
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        ticket = Ticket(
+            **TicketData.model_validate(data).model_dump(exclude_unset=True)
+        )
+        setting = get_settings().partitions
+        await ticket.add_partitioned(session, setting.lock_timeout, setting.attempts)
+        return await cls.enqueue(info, "create_lines", {"ticket_id": ticket.id})
+
+    @classmethod
+    async def delete_tickets(cls, info: Info, ids: List[int]) -> "JobGql":
+        return await cls.enqueue(info, "delete_tickets", {"ticket_ids": ids})
+
+    @classmethod
+    async def reconcile_counters(
+        cls, info: Info, ticket_ids: Optional[List[int]] = None
+    ) -> "JobGql":
+        return await cls.enqueue(info, "reconcile_counters", {"ticket_ids": ticket_ids})
+
+    @classmethod
+    async def settle_orders(
+        cls,
+        info: Info,
+        action: SettleAction,
+        order_ids: Optional[List[int]] = None,
+        domain: Optional[JSON] = None,
+    ) -> "JobGql":
+        return await cls.enqueue(
+            info,
+            "settle_orders",
+            {"action": action.value, "order_ids": order_ids, "domain": domain},
+        )
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader
+
+from ticket.models.ticket import Ticket, TicketLine
+from ticket.models.order import Order, OrderLine
+from ticket.models.archive import OrderArchive
+
+# (ticket_line_id, ticket_id, order_id), the order is needed to read an
+# archived line back from its order
+TicketLineKey = Tuple[int, int, int]
+
+
+class Loaders:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        # Loaders of the same level dispatch together but a session runs one
+        # statement at a time
+        self.lock = asyncio.Lock()
+        self.orders = DataLoader(load_fn=self.load_orders)
+        self.order_lines = DataLoader(load_fn=self.load_order_lines)
+        self.ticket_lines = DataLoader(load_fn=self.load_ticket_lines)
+        self.tickets = DataLoader(load_fn=self.load_tickets)
+
+    async def load_orders(self, ids: List[int]) -> List[Optional[Order]]:
+        async with self.lock:
+            orders = {
+                order.id: order
+                for order in await Order.get_records_by_ids(ids, self.session)
+            }
+            missing = [order_id for order_id in ids if order_id not in orders]
+            if missing:
+                for order in await OrderArchive.get_orders(missing, self.session):
+                    orders[order.id] = order
+        return [orders.get(order_id) for order_id in ids]
+
+    async def load_order_lines(self, order_ids: List[int]) -> List[List[OrderLine]]:
+        async with self.lock:
+            order_lines = [
+                *await OrderLine.get_order_lines_by_order_ids(order_ids, self.session),
+                *await OrderArchive.get_order_lines(order_ids, self.session),
+            ]
+        lines: Dict[int, List[OrderLine]] = {order_id: [] for order_id in order_ids}
+        for order_line in order_lines:
+            lines[order_line.order_id].append(order_line)
+        return [lines[order_id] for order_id in order_ids]
+
+    async def load_ticket_lines(
+        self, keys: List[TicketLineKey]
+    ) -> List[Optional[TicketLine]]:
+        async with self.lock:
+            lines: Dict[TicketLineKey, TicketLine] = {}
+            ticket_lines = await TicketLine.get_records_by_keys(
+                [(line_id, ticket_id) for line_id, ticket_id, _ in keys], self.session
+            )
+            by_id = {(line.id, line.ticket_id): line for line in ticket_lines}
+            for key in keys:
+                if key[:2] in by_id:
+                    lines[key] = by_id[key[:2]]
+            missing = [key for key in keys if key not in lines]
+            if missing:
+                lines.update(await OrderArchive.get_ticket_lines(missing, self.session))
+        return [lines.get(key) for key in keys]
+
+    async def load_tickets(self, ids: List[int]) -> List[Optional[Ticket]]:
+        async with self.lock:
+            tickets = {
+                ticket.id: ticket
+                for ticket in await Ticket.get_records_by_ids(ids, self.session)
+            }
+        return [tickets.get(ticket_id) for ticket_id in ids]
+
+    async def prime_orders(self, orders: List[Order]):
+        # Loads a page of orders with their lines, ticket lines and tickets in
+        # a fixed number of queries whatever the page size
+        order_ids = [order.id for order in orders]
+        if not order_ids:
+            return
+        self.orders.prime_many({order.id: order for order in orders})
+        async with self.lock:
+            rows = await OrderLine.get_order_lines_with_ticket_lines(
+                order_ids, self.session
+            )
+            archived = await OrderArchive.get_order_lines(order_ids, self.session)
+        lines: Dict[int, List[OrderLine]] = {order_id: [] for order_id in order_ids}
+        for order_line, ticket_line in rows:
+            lines[order_line.order_id].append(order_line)
+            self.ticket_lines.prime(
+                (ticket_line.id, ticket_line.ticket_id, order_line.order_id),
+                ticket_line,
+            )
+        for order_line in archived:
+            lines[order_line.order_id].append(order_line)
+        self.order_lines.prime_many(lines)
+        ticket_ids = {order_line.ticket_id for order_line, _ in rows}
+        ticket_ids.update(order_line.ticket_id for order_line in archived)
+        if ticket_ids:
+            async with self.lock:
+                tickets = await Ticket.get_records_by_ids(
+                    list(ticket_ids), self.session
+                )
+            self.tickets.prime_many({ticket.id: ticket for ticket in tickets})
@@ -2,9 +2,10 @@ from typing import List
 import strawberry
 
 from ticket.extensions.auth_extension import OrderAllExt
-from .ticket import TicketGql, TicketLineGql
+from .ticket import TicketGql, TicketLineGql, CounterDriftGql
 from .order import OrderGql, OrderLineGql
-from .order_func import OrderFuncGql
+from .job import JobGql
+from .order_func import OrderFuncGql, OrderNumbersGql, SettleProgressGql
 
 
 @strawberry.type
@@ -15,6 +16,9 @@ class Mutation:
         resolver=TicketGql.update_record
     )
     delete_ticket: bool = strawberry.mutation(resolver=TicketGql.delete_record)
+    reconcile_counters: List[CounterDriftGql] = strawberry.mutation(
+        resolver=TicketGql.reconcile_counters
+    )
 
     # TicketLine
     add_ticket_line: TicketLineGql = strawberry.mutation(
@@ -29,6 +33,9 @@ class Mutation:
     add_order: OrderGql = strawberry.mutation(resolver=OrderGql.add_record)
     update_order: List[OrderGql] = strawberry.mutation(resolver=OrderGql.update_record)
     delete_order: bool = strawberry.mutation(resolver=OrderGql.delete_record)
+    settle_orders: SettleProgressGql = strawberry.mutation(
+        resolver=OrderFuncGql.settle_orders
+    )
 
     # OrderLine
     add_order_line: OrderLineGql = strawberry.mutation(resolver=OrderGql.add_record)
@@ -37,11 +44,23 @@ class Mutation:
     )
     delete_order_line: bool = strawberry.mutation(resolver=OrderLineGql.delete_record)
 
+    # Job, these return at once and run in the job workers
+    add_ticket_job: JobGql = strawberry.mutation(resolver=JobGql.add_ticket)
+    delete_tickets_job: JobGql = strawberry.mutation(resolver=JobGql.delete_tickets)
+    reconcile_counters_job: JobGql = strawberry.mutation(
+        resolver=JobGql.reconcile_counters
+    )
+    settle_orders_job: JobGql = strawberry.mutation(resolver=JobGql.settle_orders)
+
     # ORDER AUTH Functions
     order_now: OrderGql = strawberry.field(
         resolver=OrderFuncGql.order_now,
         extensions=[OrderAllExt],
     )
+    order_numbers: OrderNumbersGql = strawberry.field(
+        resolver=OrderFuncGql.order_numbers,
+        extensions=[OrderAllExt],
+    )
     confirm_order: bool = strawberry.field(
         resolver=OrderFuncGql.confirm_order,
         extensions=[OrderAllExt],
@@ -1,5 +1,6 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel
 import strawberry
 from strawberry.types import Info
@@ -7,20 +8,44 @@ from strawberry.types import Info
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ticket.models.models import Filter
-from ticket.models.ticket import TicketLine
 from ticket.models.order import OrderState, Order, OrderLine
+from ticket.models.archive import OrderArchive
+from ticket.models.history import OrderCursor, get_user_orders_page
 
-from .schemas import CommonSchema
+from .schemas import MAX_PAGE_SIZE, CommonSchema, InvalidCursor
 from .ticket import TicketLineGql
+from .loaders import Loaders
+
+# pylint: disable = too-many-arguments
+
+
+def encode_cursor(order: Order) -> str:
+    value = f"{order.create_date.isoformat()}|{order.id}"
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> OrderCursor:
+    try:
+        create_date, order_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(create_date), int(order_id)
+    except ValueError as err:
+        raise InvalidCursor(cursor) from err
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # create_date is stored as naive UTC
+    if value and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 async def get_order_lines_for_order(
     info: Info, root: "OrderGql"
 ) -> List["OrderLineGql"]:
-    session: AsyncSession = info.context.get("ro_db_session")
+    loaders: Loaders = info.context.get("loaders")
     return [
         OrderLineGql.parse_obj(ol)
-        for ol in await OrderLine.get_order_lines_by_order_id(root.id, engine=session)
+        for ol in await loaders.order_lines.load(int(root.id))
     ]
 
 
@@ -58,30 +83,70 @@ class OrderGql(CommonSchema):
 
     @classmethod
     async def my_orders(cls, info: Info) -> List["OrderGql"]:
-        user_code = cls.get_user(info=info)
+        user_code = await cls.get_user(info=info)
         session: AsyncSession = info.context.get("ro_db_session")
-        return [
-            OrderGql.parse_obj(odr)
-            for odr in await Order.get_records_query(
-                session,
-                Filter(domain=[("user_code", "=", user_code)], limit=0, offset=0),
-            )
-        ]
+        orders = await Order.get_records_query(
+            session,
+            Filter(domain=[("user_code", "=", user_code)], limit=0, offset=0),
+        )
+        orders += await OrderArchive.get_orders_by_user(
+            user_code, session, exclude_ids=[odr.id for odr in orders]
+        )
+        return [OrderGql.parse_obj(odr) for odr in orders]
+
+    @classmethod
+    async def my_orders_connection(
+        cls,
+        info: Info,
+        first: int = 20,
+        after: Optional[str] = None,
+        states: Optional[List[OrderState]] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> "OrderConnectionGql":
+        user_code = await cls.get_user(info=info)
+        session: AsyncSession = info.context.get("ro_db_session")
+        loaders: Loaders = info.context.get("loaders")
+        limit = max(min(first, MAX_PAGE_SIZE), 1)
+        orders = await get_user_orders_page(
+            session,
+            user_code,
+            limit=limit + 1,
+            after=decode_cursor(after) if after else None,
+            states=states,
+            date_from=to_utc(date_from),
+            date_to=to_utc(date_to),
+        )
+        has_next_page = len(orders) > limit
+        orders = orders[:limit]
+        await loaders.prime_orders(orders)
+        return OrderConnectionGql(
+            items=[OrderGql.parse_obj(odr) for odr in orders],
+            end_cursor=encode_cursor(orders[-1]) if orders else None,
+            has_next_page=has_next_page,
+        )
+
+
+@strawberry.type
+class OrderConnectionGql:
+    items: List[OrderGql]
+    end_cursor: Optional[str]
+    has_next_page: bool
 
 
 async def get_order_for_order_line(info: Info, root: "OrderLineGql") -> OrderGql:
-    session: AsyncSession = info.context.get("ro_db_session")
-    return OrderGql.parse_obj(
-        await Order.get_record_by_id(id=root.order_id, engine=session)
-    )
+    loaders: Loaders = info.context.get("loaders")
+    return OrderGql.parse_obj(await loaders.orders.load(root.order_id))
 
 
 async def get_ticket_line_for_order_line(
     info: Info, root: "OrderLineGql"
 ) -> TicketLineGql:
-    session: AsyncSession = info.context.get("ro_db_session")
+    loaders: Loaders = info.context.get("loaders")
     return TicketLineGql.parse_obj(
-        await TicketLine.get_record_by_id(id=root.ticket_line_id, engine=session)
+        await loaders.ticket_lines.load(
+            (root.ticket_line_id, root.ticket_id, root.order_id)
+        )
     )
 
 
@@ -89,6 +154,7 @@ class OrderLineData(BaseModel):
     id: Optional[int] = 0
     order_id: Optional[int] = 0
     ticket_line_id: Optional[int] = 0
+    ticket_id: Optional[int] = 0
 
 
 @strawberry.type
@@ -104,6 +170,7 @@ class OrderLineGql(CommonSchema):
     ticket_line: TicketLineGql = strawberry.field(
         resolver=get_ticket_line_for_order_line
     )
+    ticket_id: int
     create_date: datetime
     write_date: datetime
 
@@ -113,6 +180,7 @@ class OrderLineGql(CommonSchema):
             id=model.id,  # type: ignore
             order_id=model.order_id,
             ticket_line_id=model.ticket_line_id,
+            ticket_id=model.ticket_id,
             create_date=model.create_date,
             write_date=model.write_date,
         )
@@ -1,36 +1,339 @@
-from typing import List
+import hashlib
+import json
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from graphql import FieldNode
 import strawberry
+from strawberry.scalars import JSON
 from strawberry.types import Info
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ticket.models.order import Order
+from ticket.env.settings import get_settings
+from ticket.models.archive import OrderArchive
+from ticket.models.order import (
+    MAX_ORDER_NUMBERS,
+    InvalidNumberRange,
+    Order,
+    OrderNotFound,
+    Reservation,
+    TooManyNumbers,
+)
+from ticket.models.idempotency import OrderIdempotency
+from ticket.models.settlement import (
+    SettleAction,
+    TooManyOrders,
+    get_settle_order_ids,
+    settle_orders,
+)
+from ticket.services.cache import UserTtlCache
+from ticket.services.admission import AdmissionController
+from ticket.services.coalescer import ReservationCoalescer
+from ticket.services.idempotency import InFlight
 from .order import OrderGql
 
+# pylint: disable=too-many-arguments
+
+
+@strawberry.input
+class NumberRangeInput:
+    start: int
+    end: int
+
+
+@strawberry.type
+class NumberConflictGql:
+    number: int
+    reason: str
+
+
+@strawberry.type
+class OrderNumbersGql:
+    order: Optional[OrderGql]
+    conflicts: List[NumberConflictGql]
+
+
+@strawberry.type
+class SettleProgressGql:
+    chunks: int
+    settled: int
+    skipped: int
+
+
+def expand_numbers(
+    numbers: Optional[List[int]], ranges: Optional[List[NumberRangeInput]]
+) -> List[int]:
+    too_many = TooManyNumbers(f"At most {MAX_ORDER_NUMBERS} numbers per order")
+    wanted = set(numbers or [])
+    if len(wanted) > MAX_ORDER_NUMBERS:
+        raise too_many
+    for number_range in ranges or []:
+        if number_range.end < number_range.start:
+            raise InvalidNumberRange(
+                f"Range {number_range.start}-{number_range.end} ends before it starts"
+            )
+        # Checked before expanding so a huge range costs nothing, and after so
+        # many ranges never hold more than twice the cap
+        if number_range.end - number_range.start + 1 > MAX_ORDER_NUMBERS:
+            raise too_many
+        wanted.update(range(number_range.start, number_range.end + 1))
+        if len(wanted) > MAX_ORDER_NUMBERS:
+            raise too_many
+    return sorted(wanted)
+
+
+def check_order_size(
+    ticket_line_ids: Optional[List[int]], numbers: Optional[List[int]]
+):
+    # Checked before coalescing too, a batch holds at most max_batch of these
+    if len(set(ticket_line_ids or [])) + len(set(numbers or [])) > MAX_ORDER_NUMBERS:
+        raise TooManyNumbers(f"At most {MAX_ORDER_NUMBERS} numbers per order")
+
 
 @strawberry.type
 class OrderFuncGql(OrderGql):
     @classmethod
-    async def order_now(cls, info: Info, ticket_line_ids: List[int]) -> "OrderGql":
-        user_code = cls.get_user(info=info)
+    def invalidate_my_numbers(cls, info: Info, user_code: str):
+        cache: Optional[UserTtlCache] = info.context.get("my_numbers_cache")
+        on_commit = info.context.get("on_commit")
+        if cache and on_commit is not None:
+            on_commit.append(partial(cache.invalidate, user_code))
+
+    @classmethod
+    def single_root_field(cls, info: Info) -> bool:
+        selections = info.operation.selection_set.selections
+        return len(selections) == 1 and isinstance(selections[0], FieldNode)
+
+    @classmethod
+    async def admit(cls, info: Info, user_code: str, ticket_id: Optional[int] = None):
+        # Rejects right away when the checkout would wait too long, otherwise
+        # holds the permits until the transaction ends
+        admission: Optional[AdmissionController] = info.context.get("admission")
+        on_finish = info.context.get("on_finish")
+        if not admission or on_finish is None:
+            return
+        on_finish.append(await admission.admit(user_code, ticket_id))
+
+    @classmethod
+    async def idempotent(
+        cls,
+        info: Info,
+        operation: str,
+        arguments: Dict[str, Any],
+        func: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        # With an Idempotency-Key the response is stored in the same
+        # transaction and replayed to duplicates without taking any lock
+        key: Optional[str] = info.context.get("idempotency_key")
+        on_finish = info.context.get("on_finish")
+        if not key or on_finish is None:
+            return await func()
+        user_code = await cls.get_user(info=info)
+        in_flight: Optional[InFlight] = info.context.get("idempotency_in_flight")
+        if in_flight:
+            await in_flight.start((user_code, key))
+            on_finish.append(partial(in_flight.finish, (user_code, key)))
+        fingerprint = hashlib.sha256(
+            json.dumps([operation, arguments], sort_keys=True).encode()
+        ).hexdigest()
         session: AsyncSession = info.context.get("db_session")
-        return cls.parse_obj(
-            await Order.order_now(
-                tkt_line_ids=ticket_line_ids, user_code=user_code, session=session
+        record = await OrderIdempotency.claim(
+            session, user_code, key, operation, fingerprint
+        )
+        if record:
+            return record.response
+        response = await func()
+        await OrderIdempotency.store(session, user_code, key, response)
+        return response
+
+    @classmethod
+    async def get_replayed_order(
+        cls, order_id: int, session: AsyncSession
+    ) -> Optional[Order]:
+        # The order of a stored response may have been archived or deleted
+        # since, the archive still knows an archived one
+        order = await session.get(Order, order_id)
+        if order:
+            return order
+        archived = await OrderArchive.get_orders([order_id], session)
+        return archived[0] if archived else None
+
+    @classmethod
+    async def order_now(
+        cls,
+        info: Info,
+        ticket_line_ids: Optional[List[int]] = None,
+        ticket_id: Optional[int] = None,
+        numbers: Optional[List[int]] = None,
+    ) -> "OrderGql":
+        user_code = await cls.get_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        check_order_size(ticket_line_ids, numbers)
+        orders: List[Order] = []
+
+        async def reserve() -> Dict[str, Any]:
+            await cls.admit(info, user_code, ticket_id)
+            cls.invalidate_my_numbers(info, user_code)
+            coalescer: Optional[ReservationCoalescer] = info.context.get("coalescer")
+            # A coalesced order commits with its batch, not with the operation,
+            # so only an operation with nothing else to roll back or replay
+            # uses it. A keyed request keeps its order with its stored key.
+            if (
+                coalescer
+                and ticket_id
+                and not info.context.get("idempotency_key")
+                and cls.single_root_field(info)
+            ):
+                # Committed with the other reservations of its batch
+                order = await coalescer.reserve(
+                    ticket_id,
+                    Reservation(
+                        user_code=user_code,
+                        ticket_line_ids=ticket_line_ids or [],
+                        numbers=numbers or [],
+                    ),
+                )
+            else:
+                order = await Order.order_now(
+                    tkt_line_ids=ticket_line_ids or [],
+                    user_code=user_code,
+                    session=session,
+                    ticket_id=ticket_id,
+                    numbers=numbers,
+                )
+            orders.append(order)
+            return {"order_id": order.id}
+
+        response = await cls.idempotent(
+            info,
+            "order_now",
+            {
+                "ticket_line_ids": ticket_line_ids,
+                "ticket_id": ticket_id,
+                "numbers": numbers,
+            },
+            reserve,
+        )
+        if not orders:
+            order = await cls.get_replayed_order(response["order_id"], session)
+            if not order:
+                raise OrderNotFound(f"Order ID - {response['order_id']} was deleted")
+            orders.append(order)
+        return cls.parse_obj(orders[0])
+
+    @classmethod
+    async def order_numbers(
+        cls,
+        info: Info,
+        ticket_id: int,
+        numbers: Optional[List[int]] = None,
+        ranges: Optional[List[NumberRangeInput]] = None,
+        allow_partial: bool = False,
+    ) -> OrderNumbersGql:
+        user_code = await cls.get_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        wanted = expand_numbers(numbers, ranges)
+        orders: List[Order] = []
+
+        async def reserve() -> Dict[str, Any]:
+            await cls.admit(info, user_code, ticket_id)
+            cls.invalidate_my_numbers(info, user_code)
+            order, conflicts = await Order.order_numbers(
+                ticket_id=ticket_id,
+                numbers=wanted,
+                user_code=user_code,
+                session=session,
+                partial=allow_partial,
             )
+            if order:
+                orders.append(order)
+            return {
+                "order_id": order.id if order else None,
+                "conflicts": list(conflicts.items()),
+            }
+
+        response = await cls.idempotent(
+            info,
+            "order_numbers",
+            {"ticket_id": ticket_id, "numbers": wanted, "partial": allow_partial},
+            reserve,
+        )
+        if not orders and response["order_id"]:
+            order = await cls.get_replayed_order(response["order_id"], session)
+            if order:
+                orders.append(order)
+        return OrderNumbersGql(
+            order=cls.parse_obj(orders[0]) if orders else None,
+            conflicts=[
+                NumberConflictGql(number=number, reason=reason)
+                for number, reason in response["conflicts"]
+            ],
         )
 
     @classmethod
     async def confirm_order(cls, info: Info, record_id: int) -> bool:
-        user_code = cls.get_user(info=info)
+        user_code = await cls.get_user(info=info)
         session: AsyncSession = info.context.get("db_session")
-        return await Order.confirm_order(
-            record_id=record_id, user_code=user_code, session=session
+
+        async def confirm() -> Dict[str, Any]:
+            await cls.admit(info, user_code)
+            cls.invalidate_my_numbers(info, user_code)
+            return {
+                "result": await Order.confirm_order(
+                    record_id=record_id, user_code=user_code, session=session
+                )
+            }
+
+        response = await cls.idempotent(
+            info, "confirm_order", {"record_id": record_id}, confirm
         )
+        return response["result"]
 
     @classmethod
     async def cancel_order(cls, info: Info, record_id: int) -> bool:
-        user_code = cls.get_user(info=info)
+        user_code = await cls.get_user(info=info)
         session: AsyncSession = info.context.get("db_session")
-        return await Order.cancel_order(
-            record_id=record_id, user_code=user_code, session=session
+
+        async def cancel() -> Dict[str, Any]:
+            await cls.admit(info, user_code)
+            cls.invalidate_my_numbers(info, user_code)
+            return {
+                "result": await Order.cancel_order(
+                    record_id=record_id, user_code=user_code, session=session
+                )
+            }
+
+        response = await cls.idempotent(
+            info, "cancel_order", {"record_id": record_id}, cancel
+        )
+        return response["result"]
+
+    @classmethod
+    async def settle_orders(
+        cls,
+        info: Info,
+        action: SettleAction,
+        order_ids: Optional[List[int]] = None,
+        domain: Optional[JSON] = None,
+    ) -> SettleProgressGql:
+        # Orders of any user, picked by id or by a domain on ticket_order. At
+        # most one chunk in the operation's transaction, larger settlements
+        # run as a job through settle_orders_job.
+        await cls.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        size = get_settings().settlement.chunk_size
+        if order_ids is not None:
+            chunk = sorted(set(order_ids))
+        else:
+            chunk = await get_settle_order_ids(session, action, domain, 0, size + 1)
+        if len(chunk) > size:
+            raise TooManyOrders(
+                f"At most {size} orders per settlement, use settleOrdersJob"
+            )
+        result = await settle_orders(session, chunk, action)
+        for user_code in result.user_codes:
+            cls.invalidate_my_numbers(info, user_code)
+        return SettleProgressGql(
+            chunks=int(bool(chunk)),
+            settled=len(result.settled),
+            skipped=len(result.skipped),
         )
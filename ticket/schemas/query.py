@@ -1,9 +1,12 @@
-from typing import List
+from typing import List, Optional
 import strawberry
 
 from ticket.extensions.auth_extension import OrderReadExt
-from .order import OrderGql, OrderLineGql
-from .ticket import TicketGql, TicketLineGql
+from .order import OrderGql, OrderLineGql, OrderConnectionGql
+from .ticket import TicketGql, TicketLineGql, MyNumbersGql, TicketConnectionGql
+from .statistics import SaleStatisticsGql
+from .job import JobGql
+from .changes import ChangeFeedGql
 
 
 @strawberry.type
@@ -13,6 +16,8 @@ class Query:
     ticket_query: List[TicketGql] = strawberry.field(
         resolver=TicketGql.get_records_query
     )
+    on_sale_tickets: List[TicketGql] = strawberry.field(resolver=TicketGql.on_sale)
+    search_tickets: TicketConnectionGql = strawberry.field(resolver=TicketGql.search)
     ticket_lines: List[TicketLineGql] = strawberry.field(
         resolver=TicketLineGql.get_records
     )
@@ -20,6 +25,16 @@ class Query:
         resolver=TicketLineGql.get_records_query
     )
 
+    sale_statistics: SaleStatisticsGql = strawberry.field(
+        resolver=SaleStatisticsGql.get_statistics
+    )
+
+    changes: ChangeFeedGql = strawberry.field(resolver=ChangeFeedGql.get_changes)
+
+    # JOB
+    job: Optional[JobGql] = strawberry.field(resolver=JobGql.get_job)
+    jobs: List[JobGql] = strawberry.field(resolver=JobGql.get_jobs)
+
     # ORDER
     orders: List[OrderGql] = strawberry.field(resolver=OrderGql.get_records)
     order: OrderGql = strawberry.field(resolver=OrderGql.get_record)
@@ -38,3 +53,11 @@ class Query:
         resolver=OrderGql.my_orders,
         extensions=[OrderReadExt],
     )
+    my_orders_connection: OrderConnectionGql = strawberry.field(
+        resolver=OrderGql.my_orders_connection,
+        extensions=[OrderReadExt],
+    )
+    my_numbers: MyNumbersGql = strawberry.field(
+        resolver=TicketLineGql.my_numbers,
+        extensions=[OrderReadExt],
+    )
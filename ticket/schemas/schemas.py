@@ -8,6 +8,7 @@ import strawberry
 from strawberry.scalars import JSON
 from strawberry.types import Info
 
+from ticket.extensions.auth_extension import resolve_auth
 from ticket.models.models import Filter, CommonModel
 
 # pylint: disable = too-many-arguments
@@ -16,6 +17,12 @@ M = TypeVar("M")
 E = TypeVar("E")
 T = TypeVar("T")
 
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(Exception):
+    pass
+
 
 class NoIdForUpdate(Exception):
     def __init__(self, *args: object) -> None:
@@ -40,7 +47,8 @@ class CommonSchema(Generic[M, E]):
     wriet_date: datetime
 
     @classmethod
-    def get_user(cls, info: Info) -> str:
+    async def get_user(cls, info: Info) -> str:
+        await resolve_auth(info)
         user_code: str = info.context.get("user_code")
         if not user_code:
             raise HTTPException(
@@ -49,7 +57,8 @@ class CommonSchema(Generic[M, E]):
         return user_code
 
     @classmethod
-    def get_odoo_user(cls, info: Info) -> str:
+    async def get_odoo_user(cls, info: Info) -> str:
+        await resolve_auth(info)
         odoo_user: str = info.context.get("odoo_user")
         if not odoo_user:
             raise HTTPException(
@@ -63,7 +72,7 @@ class CommonSchema(Generic[M, E]):
 
     @classmethod
     async def get_records(cls, info: Info) -> List[Self]:
-        cls.get_odoo_user(info=info)
+        await cls.get_odoo_user(info=info)
         session: AsyncSession = info.context.get("ro_db_session")
         return [
             cls.parse_obj(tkt)
@@ -95,7 +104,7 @@ class CommonSchema(Generic[M, E]):
 
     @classmethod
     async def add_record(cls, info: Info, data: JSON) -> Self:
-        cls.get_odoo_user(info=info)
+        await cls.get_odoo_user(info=info)
         session: AsyncSession = info.context.get("db_session")
         new_record = cls._model_type(
             **cls._data_type.model_validate(data).model_dump(exclude_unset=True)
@@ -105,7 +114,7 @@ class CommonSchema(Generic[M, E]):
 
     @classmethod
     async def update_record(cls, info: Info, data_list: List[JSON]) -> List[Self]:
-        cls.get_odoo_user(info=info)
+        await cls.get_odoo_user(info=info)
         session: AsyncSession = info.context.get("db_session")
         return [
             cls.parse_obj(tkt)
@@ -121,6 +130,6 @@ class CommonSchema(Generic[M, E]):
 
     @classmethod
     async def delete_record(cls, info: Info, ids: List[int]) -> bool:
-        cls.get_odoo_user(info=info)
+        await cls.get_odoo_user(info=info)
         session: AsyncSession = info.context.get("db_session")
         return await cls._model_type.delete_records(engine=session, ids=ids)
@@ -0,0 +1,78 @@
+from datetime import date
+from typing import Dict, List, Optional
+import strawberry
+from strawberry.types import Info
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ticket.models.rollup import SaleRollup, COUNTERS
+
+from .schemas import CommonSchema
+
+
+@strawberry.type
+class SaleCountersGql:
+    reserved: int = 0
+    sold: int = 0
+    cancelled: int = 0
+    refunded: int = 0
+    revenue: float = 0.0
+
+    def add(self, rollup: SaleRollup):
+        for counter in COUNTERS:
+            setattr(self, counter, getattr(self, counter) + getattr(rollup, counter))
+
+
+@strawberry.type
+class SaleDayGql(SaleCountersGql):
+    day: date
+
+
+@strawberry.type
+class SalePriceGql(SaleCountersGql):
+    price: float
+
+
+@strawberry.type
+class SaleTicketGql(SaleCountersGql):
+    ticket_id: int
+
+
+@strawberry.type
+class SaleStatisticsGql:
+    totals: SaleCountersGql
+    by_day: List[SaleDayGql]
+    by_price: List[SalePriceGql]
+    by_ticket: List[SaleTicketGql]
+
+    @classmethod
+    async def get_statistics(
+        cls,
+        info: Info,
+        ticket_ids: Optional[List[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> "SaleStatisticsGql":
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("ro_db_session")
+        totals = SaleCountersGql()
+        by_day: Dict[date, SaleDayGql] = {}
+        by_price: Dict[float, SalePriceGql] = {}
+        by_ticket: Dict[int, SaleTicketGql] = {}
+        # Rollup rows are few, a single query feeds every aggregate
+        for rollup in await SaleRollup.get_rollups(
+            session, ticket_ids=ticket_ids, date_from=date_from, date_to=date_to
+        ):
+            totals.add(rollup)
+            by_day.setdefault(rollup.day, SaleDayGql(day=rollup.day)).add(rollup)
+            by_price.setdefault(rollup.price, SalePriceGql(price=rollup.price)).add(
+                rollup
+            )
+            by_ticket.setdefault(
+                rollup.ticket_id, SaleTicketGql(ticket_id=rollup.ticket_id)
+            ).add(rollup)
+        return cls(
+            totals=totals,
+            by_day=list(by_day.values()),
+            by_price=sorted(by_price.values(), key=lambda item: item.price),
+            by_ticket=sorted(by_ticket.values(), key=lambda item: item.ticket_id),
+        )
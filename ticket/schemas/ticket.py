@@ -1,17 +1,57 @@
-from typing import List, Optional
-from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import List, Optional, Tuple
+from datetime import datetime, timezone
 from pydantic import BaseModel
 import strawberry
+from strawberry.scalars import JSON
 from strawberry.types import Info
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ticket.models.ticket import Ticket, TicketState, TicketLine, TicketLineState
+from ticket.env.settings import get_settings
+from ticket.models.job import Job
+from ticket.models.ticket import (
+    Ticket,
+    TicketState,
+    TicketStorage,
+    TicketLine,
+    TicketLineState,
+)
+from ticket.models.ranges import complement, to_ranges
+from ticket.services.cache import UserTtlCache
+from ticket.services.lifecycle import OnSaleTickets
+from ticket.models.lifecycle import get_on_sale
+from ticket.models.archive import TicketNumberArchive
+from ticket.models.counters import get_live_ticket_ids, reconcile_ticket_counters
 
-from .schemas import CommonSchema
+from .schemas import MAX_PAGE_SIZE, CommonSchema, InvalidCursor
+from .loaders import Loaders
+
+# pylint: disable = too-many-arguments
+
+
+def encode_search_cursor(score: float, ticket_id: int) -> str:
+    # repr keeps every digit of the rank so the next page starts exactly after it
+    return urlsafe_b64encode(f"{score!r}|{ticket_id}".encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, ticket_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(score), int(ticket_id)
+    except ValueError as err:
+        raise InvalidCursor(cursor) from err
 
 
 async def get_lines_for_ticket(info: Info, root: "TicketGql") -> List["TicketLineGql"]:
     session: AsyncSession = info.context.get("ro_db_session")
+    # RANGES tickets only list their materialized rows, see available_ranges
+    if root.archived:
+        return [
+            TicketLineGql.parse_obj(tl)
+            for tl in await TicketNumberArchive.get_ticket_lines(
+                ticket_id=int(root.id), session=session
+            )
+        ]
     return [
         TicketLineGql.parse_obj(tl)
         for tl in await TicketLine.get_ticket_line_by_tid(
@@ -20,6 +60,46 @@ async def get_lines_for_ticket(info: Info, root: "TicketGql") -> List["TicketLin
     ]
 
 
+@strawberry.type
+class NumberRangeGql:
+    start: int
+    end: int
+
+
+@strawberry.type
+class MyNumbersGql:
+    ticket_id: int
+    reserved: List[NumberRangeGql]
+    sold: List[NumberRangeGql]
+
+
+async def get_available_ranges_for_ticket(
+    info: Info, root: "TicketGql"
+) -> List[NumberRangeGql]:
+    if root.archived:
+        return []
+    session: AsyncSession = info.context.get("ro_db_session")
+    taken = await TicketLine.get_taken_numbers(ticket_id=int(root.id), engine=session)
+    return [
+        NumberRangeGql(start=start, end=end)
+        for start, end in complement(root.start_num, root.end_num, taken)
+    ]
+
+
+@strawberry.type
+class TicketCountersGql:
+    available: int
+    reserved: int
+    sold: int
+
+
+@strawberry.type
+class CounterDriftGql:
+    ticket_id: int
+    before: TicketCountersGql
+    after: TicketCountersGql
+
+
 class TicketData(BaseModel):
     id: Optional[int] = 0
     name: Optional[str] = ""
@@ -35,13 +115,15 @@ class TicketData(BaseModel):
     reserved_count: Optional[int] = 0
     sold_count: Optional[int] = 0
     sync_user: Optional[str] = ""
+    archived: Optional[bool] = False
+    storage: Optional[TicketStorage] = None
 
 
 @strawberry.type
 class TicketGql(CommonSchema):
     _model_type = Ticket
     _data_type = TicketData
-    _model_enums = {"state": TicketState}
+    _model_enums = {"state": TicketState, "storage": TicketStorage}
 
     id: strawberry.ID
     name: str
@@ -57,7 +139,12 @@ class TicketGql(CommonSchema):
     reserved_count: int
     sold_count: int
     lines: List["TicketLineGql"] = strawberry.field(resolver=get_lines_for_ticket)
+    available_ranges: List[NumberRangeGql] = strawberry.field(
+        resolver=get_available_ranges_for_ticket
+    )
     sync_user: str
+    archived: bool
+    storage: TicketStorage
     create_date: datetime
     write_date: datetime
 
@@ -78,15 +165,104 @@ class TicketGql(CommonSchema):
             reserved_count=model.reserved_count,
             sold_count=model.sold_count,
             sync_user=model.sync_user,
+            archived=bool(model.archived),
+            storage=model.storage,
             create_date=model.create_date,
             write_date=model.write_date,
         )
 
+    @classmethod
+    async def add_record(cls, info: Info, data: JSON) -> "TicketGql":
+        await cls.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        setting = get_settings().partitions
+        ticket = Ticket(
+            **TicketData.model_validate(data).model_dump(exclude_unset=True)
+        )
+        await ticket.add_partitioned(session, setting.lock_timeout, setting.attempts)
+        if ticket.line_count > setting.inline_lines:
+            await Job.enqueue(session, "create_lines", {"ticket_id": ticket.id})
+        else:
+            await ticket.create_lines_inline(session)
+        return cls.parse_obj(ticket)
+
+    @classmethod
+    async def on_sale(cls, info: Info) -> List["TicketGql"]:
+        now = datetime.now(timezone.utc)
+        on_sale: OnSaleTickets = info.context.get("on_sale")
+        tickets = on_sale.get(now) if on_sale else None
+        if tickets is None:
+            # Scheduler not run yet
+            session: AsyncSession = info.context.get("ro_db_session")
+            tickets = await get_on_sale(session, now)
+        return [TicketGql.parse_obj(ticket) for ticket in tickets]
+
+    @classmethod
+    async def search(
+        cls,
+        info: Info,
+        text: str,
+        first: int = 20,
+        after: Optional[str] = None,
+        states: Optional[List[TicketState]] = None,
+    ) -> "TicketConnectionGql":
+        session: AsyncSession = info.context.get("ro_db_session")
+        limit = max(min(first, MAX_PAGE_SIZE), 1)
+        rows = await Ticket.search(
+            session,
+            text,
+            limit=limit + 1,
+            after=decode_search_cursor(after) if after else None,
+            states=states,
+        )
+        has_next_page = len(rows) > limit
+        rows = rows[:limit]
+        return TicketConnectionGql(
+            items=[TicketGql.parse_obj(ticket) for ticket, _ in rows],
+            end_cursor=(
+                encode_search_cursor(rows[-1][1], rows[-1][0].id) if rows else None
+            ),
+            has_next_page=has_next_page,
+        )
+
+    @classmethod
+    async def reconcile_counters(
+        cls, info: Info, ticket_ids: Optional[List[int]] = None
+    ) -> List[CounterDriftGql]:
+        await CommonSchema.get_odoo_user(info=info)
+        session: AsyncSession = info.context.get("db_session")
+        if ticket_ids is None:
+            ticket_ids = await get_live_ticket_ids(session)
+        drifts = await reconcile_ticket_counters(session, ticket_ids)
+        return [
+            CounterDriftGql(
+                ticket_id=drift.id,
+                before=TicketCountersGql(
+                    available=drift.old_available,
+                    reserved=drift.old_reserved,
+                    sold=drift.old_sold,
+                ),
+                after=TicketCountersGql(
+                    available=drift.available,
+                    reserved=drift.reserved,
+                    sold=drift.sold,
+                ),
+            )
+            for drift in drifts
+        ]
+
+
+@strawberry.type
+class TicketConnectionGql:
+    # Best matches first
+    items: List[TicketGql]
+    end_cursor: Optional[str]
+    has_next_page: bool
+
 
 async def get_ticket_for_line(info: Info, root: "TicketLineGql") -> TicketGql:
-    session: AsyncSession = info.context.get("ro_db_session")
-    tkt = await Ticket.get_record_by_id(id=root.ticket_id, engine=session)
-    return TicketGql.parse_obj(tkt)
+    loaders: Loaders = info.context.get("loaders")
+    return TicketGql.parse_obj(await loaders.tickets.load(root.ticket_id))
 
 
 class TicketLineData(BaseModel):
@@ -129,3 +305,42 @@ class TicketLineGql(CommonSchema):
             create_date=model.create_date,
             write_date=model.write_date,
         )
+
+    @classmethod
+    async def my_numbers(cls, info: Info, ticket_id: int) -> MyNumbersGql:
+        user_code = await cls.get_user(info=info)
+        cache: Optional[UserTtlCache] = info.context.get("my_numbers_cache")
+        session: AsyncSession = info.context.get("ro_db_session")
+        version: Optional[datetime] = None
+        if cache:
+            # Entries are kept with the write_date of their ticket, read on the
+            # primary so a write through any worker makes them stale
+            version = await Ticket.get_write_date(
+                ticket_id, info.context.get("db_session")
+            )
+            cached = cache.get(user_code, ticket_id)
+            if cached and cached[0] == version:
+                return cached[1]
+            # Read before the numbers, a replica which has not replayed the
+            # last write yet gives numbers which are not cached
+            if version and version != await Ticket.get_write_date(ticket_id, session):
+                version = None
+        reserved, sold = [], []
+        for number, state in await TicketLine.get_user_numbers(
+            ticket_id=ticket_id, user_code=user_code, engine=session
+        ):
+            if state == TicketLineState.RESERVED:
+                reserved.append(number)
+            elif state == TicketLineState.SOLD:
+                sold.append(number)
+        if not reserved and not sold:
+            archive = await session.get(TicketNumberArchive, (ticket_id, user_code))
+            sold = archive.numbers if archive else []
+        numbers = MyNumbersGql(
+            ticket_id=ticket_id,
+            reserved=[NumberRangeGql(start=s, end=e) for s, e in to_ranges(reserved)],
+            sold=[NumberRangeGql(start=s, end=e) for s, e in to_ranges(sold)],
+        )
+        if cache and version:
+            cache.set(user_code, ticket_id, (version, numbers))
+        return numbers
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from ticket.env.settings import Admission
+
+REASONS = ("user", "queue", "wait", "timeout")
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str) -> None:
+        self.reason = reason
+        super().__init__(f"Too many orders in progress, retry later ({reason})")
+
+
+class ConcurrencyLimit:  # pylint: disable=too-many-instance-attributes
+    # At most limit holders, the others wait in a bounded queue served round
+    # robin between users so one user's burst cannot starve the others
+    def __init__(
+        self, limit: int, max_queue: int, max_wait: float, per_user: int
+    ) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_user = per_user
+        self.active = 0
+        self.queued = 0
+        self.users: Dict[str, int] = {}
+        self.waiters: OrderedDict[str, Deque[asyncio.Future]] = OrderedDict()
+        # Moving average of the seconds a permit is held
+        self.hold_time = 0.0
+
+    @property
+    def idle(self) -> bool:
+        return not self.active and not self.queued
+
+    def estimated_wait(self) -> float:
+        return self.hold_time * (self.queued + 1) / self.limit
+
+    async def acquire(self, user_code: str):
+        if self.users.get(user_code, 0) >= self.per_user:
+            raise Overloaded("user")
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            self.users[user_code] = self.users.get(user_code, 0) + 1
+            return
+        if self.queued >= self.max_queue:
+            raise Overloaded("queue")
+        if self.estimated_wait() > self.max_wait:
+            raise Overloaded("wait")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(user_code, deque()).append(waiter)
+        self.queued += 1
+        self.users[user_code] = self.users.get(user_code, 0) + 1
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except BaseException as err:
+            if waiter.done() and not waiter.cancelled():
+                # Granted while timing out, hand the permit on
+                self.release(user_code, 0.0)
+            else:
+                self.remove_waiter(user_code, waiter)
+            if isinstance(err, asyncio.TimeoutError):
+                raise Overloaded("timeout") from err
+            raise
+
+    def remove_waiter(self, user_code: str, waiter: asyncio.Future):
+        waiters = self.waiters.get(user_code)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.waiters[user_code]
+            self.queued -= 1
+        self.leave(user_code)
+
+    def leave(self, user_code: str):
+        self.users[user_code] -= 1
+        if not self.users[user_code]:
+            del self.users[user_code]
+
+    def release(self, user_code: str, held: float):
+        self.active -= 1
+        self.leave(user_code)
+        if held:
+            self.hold_time = (
+                0.8 * self.hold_time + 0.2 * held if self.hold_time else held
+            )
+        while self.waiters and self.active < self.limit:
+            next_user, waiters = next(iter(self.waiters.items()))
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self.waiters.move_to_end(next_user)
+            else:
+                del self.waiters[next_user]
+            if waiter.done():
+                continue
+            self.active += 1
+            waiter.set_result(None)
+
+
+class AdmissionController:
+    # Checkout mutations take a permit of their ticket, then a global one,
+    # and hold them until their transaction ends
+    def __init__(self, setting: Admission, global_limit: int) -> None:
+        self.setting = setting
+        self.global_limit = ConcurrencyLimit(
+            global_limit, setting.max_queue, setting.max_wait, setting.per_user
+        )
+        self.ticket_limits: Dict[int, ConcurrencyLimit] = {}
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {reason: 0 for reason in REASONS}
+
+    def get_ticket_limit(self, ticket_id: int) -> ConcurrencyLimit:
+        if ticket_id not in self.ticket_limits:
+            self.ticket_limits[ticket_id] = ConcurrencyLimit(
+                self.setting.ticket_limit,
+                self.setting.ticket_max_queue,
+                self.setting.max_wait,
+                self.setting.per_user,
+            )
+        return self.ticket_limits[ticket_id]
+
+    async def admit(
+        self, user_code: str, ticket_id: Optional[int] = None
+    ) -> Callable[[], None]:
+        limits: List[ConcurrencyLimit] = []
+        if ticket_id is not None:
+            limits.append(self.get_ticket_limit(ticket_id))
+        limits.append(self.global_limit)
+        acquired: List[ConcurrencyLimit] = []
+        try:
+            for limit in limits:
+                await limit.acquire(user_code)
+                acquired.append(limit)
+        except Overloaded as err:
+            self.rejected[err.reason] += 1
+            self.release(user_code, ticket_id, acquired, 0.0)
+            raise
+        except BaseException:
+            self.release(user_code, ticket_id, acquired, 0.0)
+            raise
+        self.admitted += 1
+        started = time.monotonic()
+        return lambda: self.release(
+            user_code, ticket_id, acquired, time.monotonic() - started
+        )
+
+    def release(
+        self,
+        user_code: str,
+        ticket_id: Optional[int],
+        acquired: List[ConcurrencyLimit],
+        held: float,
+    ):
+        for limit in reversed(acquired):
+            limit.release(user_code, held)
+        if ticket_id in self.ticket_limits and self.ticket_limits[ticket_id].idle:
+            del self.ticket_limits[ticket_id]
+
+    def metrics(self) -> str:
+        ticket_limits = list(self.ticket_limits.values())
+        lines = [
+            "# TYPE ticket_admission_admitted_total counter",
+            f"ticket_admission_admitted_total {self.admitted}",
+            "# TYPE ticket_admission_rejected_total counter",
+            *(
+                f'ticket_admission_rejected_total{{reason="{reason}"}} {count}'
+                for reason, count in self.rejected.items()
+            ),
+            "# TYPE ticket_admission_active gauge",
+            f'ticket_admission_active{{limit="global"}} {self.global_limit.active}',
+            'ticket_admission_active{limit="ticket"} '
+            f"{sum(limit.active for limit in ticket_limits)}",
+            "# TYPE ticket_admission_queued gauge",
+            f'ticket_admission_queued{{limit="global"}} {self.global_limit.queued}',
+            'ticket_admission_queued{limit="ticket"} '
+            f"{sum(limit.queued for limit in ticket_limits)}",
+            "# TYPE ticket_admission_hold_seconds gauge",
+            f"ticket_admission_hold_seconds {self.global_limit.hold_time:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
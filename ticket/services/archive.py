@@ -0,0 +1,99 @@
+import logging
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Archive, Partitions
+from ticket.models.models import Tombstone
+from ticket.models.ticket import Ticket, TicketLine, TicketState
+from ticket.models.archive import TicketNumberArchive, OrderArchive
+from ticket.models.partition import drop_ticket_partitions, has_partitions
+
+_logger = logging.getLogger(__name__)
+
+
+class TicketArchiver:
+    def __init__(
+        self, engine: AsyncEngine, setting: Archive, partitions: Partitions
+    ) -> None:
+        self.engine = engine
+        self.setting = setting
+        self.partitions = partitions
+        self.sessionmaker = async_sessionmaker(engine)
+
+    async def archive_next(self) -> Optional[int]:
+        async with self.sessionmaker() as session:
+            # SKIP LOCKED lets every worker run the job without racing
+            res = await session.execute(
+                select(Ticket)
+                .where(Ticket.state == TicketState.DONE)
+                .where(Ticket.archived.is_(False))
+                .order_by(Ticket.end_date)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            ticket = res.scalar()
+            if not ticket:
+                return None
+            ticket_id = ticket.id
+            await TicketNumberArchive.archive_ticket(ticket_id, session)
+            await OrderArchive.archive_ticket(ticket_id, session)
+            # Feed readers drop the lines, the ticket itself is kept
+            await Tombstone.record_from(
+                session,
+                TicketLine.__tablename__,
+                select(TicketLine.id).where(TicketLine.ticket_id == ticket_id),
+            )
+            # Readers switch to the archive tables once this commits
+            ticket.archived = True
+            await session.commit()
+        await self.drop_partitions(ticket_id)
+        return ticket_id
+
+    async def drop_partitions(self, ticket_id: int):
+        # Out of the archiving transaction, see drop_ticket_partitions
+        await drop_ticket_partitions(
+            self.engine,
+            ticket_id,
+            self.partitions.lock_timeout,
+            self.partitions.attempts,
+        )
+
+    async def drop_leftover_partitions(self) -> int:
+        # Archived by a run which stopped before its partitions were dropped
+        async with self.sessionmaker() as session:
+            res = await session.execute(
+                select(Ticket.id)
+                .where(Ticket.archived.is_(True))
+                .where(has_partitions(Ticket.id))
+            )
+            ticket_ids = res.scalars().all()
+        for ticket_id in ticket_ids:
+            await self.drop_partitions(ticket_id)
+        return len(ticket_ids)
+
+    async def purge_orders(self, ticket_id: int) -> int:
+        purged = 0
+        while True:
+            async with self.sessionmaker() as session:
+                deleted = await OrderArchive.purge_orders(
+                    ticket_id, self.setting.batch_size, session
+                )
+                await session.commit()
+            purged += deleted
+            if deleted < self.setting.batch_size:
+                return purged
+
+    async def run(self) -> int:
+        leftovers = await self.drop_leftover_partitions()
+        if leftovers:
+            _logger.info("Dropped the partitions of %d archived tickets", leftovers)
+        archived = 0
+        for _ in range(self.setting.tickets_per_run):
+            ticket_id = await self.archive_next()
+            if ticket_id is None:
+                break
+            purged = await self.purge_orders(ticket_id)
+            _logger.info("Archived ticket %d and purged %d orders", ticket_id, purged)
+            archived += 1
+        return archived
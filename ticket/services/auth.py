@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from ticket.services.odoo import Odoo
+from ticket.services.user import UserGrpc
+
+
+class LazyAuth:
+    # Caller of a request, only checked with the user service or Odoo when a
+    # resolver first asks for it. Fields resolved concurrently share one check,
+    # its result or error is kept for the rest of the operation.
+    def __init__(
+        self,
+        token_type: str,
+        access_token: str,
+        user_grpc: Optional[UserGrpc],
+        odoo: Optional[Odoo],
+    ) -> None:
+        self.token_type = token_type.lower()
+        self.access_token = access_token
+        self.user_grpc = user_grpc
+        self.odoo = odoo
+        self.task: Optional[asyncio.Task] = None
+
+    async def check(self) -> Dict[str, Any]:
+        match self.token_type:
+            case "bearer":
+                tkn = await self.user_grpc.check_token(self.access_token)
+                return {"user_code": tkn.uid, "cid": tkn.cid, "scopes": tkn.scp}
+            case "odoo":
+                return {"odoo_user": await self.odoo.get_odoo_user(self.access_token)}
+        return {}
+
+    async def resolve(self, context: Dict[str, Any]):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.check())
+        context.update(await asyncio.shield(self.task))
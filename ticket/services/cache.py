@@ -0,0 +1,32 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+# Entries are grouped by user so one user's writes drop all of their entries,
+# the least recently used users are evicted first
+class UserTtlCache:
+    def __init__(self, ttl: float, max_users: int) -> None:
+        self.ttl = ttl
+        self.max_users = max_users
+        self.data: OrderedDict[str, Dict[Hashable, Tuple[float, Any]]] = OrderedDict()
+
+    def get(self, user_code: str, key: Hashable) -> Optional[Any]:
+        entries = self.data.get(user_code)
+        if not entries or key not in entries:
+            return None
+        expires, value = entries[key]
+        if expires < time.monotonic():
+            del entries[key]
+            return None
+        self.data.move_to_end(user_code)
+        return value
+
+    def set(self, user_code: str, key: Hashable, value: Any):
+        self.data.setdefault(user_code, {})[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(user_code)
+        while len(self.data) > self.max_users:
+            self.data.popitem(last=False)
+
+    def invalidate(self, user_code: str):
+        self.data.pop(user_code, None)
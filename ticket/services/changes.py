@@ -0,0 +1,22 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Changes
+from ticket.models.models import Tombstone
+
+_logger = logging.getLogger(__name__)
+
+
+class TombstonePurger:
+    def __init__(self, engine: AsyncEngine, setting: Changes) -> None:
+        self.setting = setting
+        self.sessionmaker = async_sessionmaker(engine)
+
+    async def run(self) -> int:
+        before = datetime.utcnow() - timedelta(seconds=self.setting.tombstone_ttl)
+        async with self.sessionmaker() as session:
+            purged = await Tombstone.purge(session, before)
+            await session.commit()
+        _logger.info("Purged %d tombstones", purged)
+        return purged
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import Dict, List, Set, Tuple, Union
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Coalesce
+from ticket.models.order import Order, Reservation
+
+_logger = logging.getLogger(__name__)
+
+Batch = List[Tuple[Reservation, asyncio.Future]]
+
+
+class ReservationCoalescer:
+    # Reservations of one ticket arriving within window seconds share one
+    # transaction, so the ticket row lock is taken once per batch
+    def __init__(self, engine: AsyncEngine, setting: Coalesce) -> None:
+        self.setting = setting
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        self.batches: Dict[int, Batch] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def reserve(self, ticket_id: int, reservation: Reservation) -> Order:
+        waiter = asyncio.get_running_loop().create_future()
+        batch = self.batches.get(ticket_id)
+        if batch is None:
+            batch = self.batches[ticket_id] = []
+            self.spawn(self.flush_later(ticket_id, batch))
+        batch.append((reservation, waiter))
+        if len(batch) >= self.setting.max_batch:
+            del self.batches[ticket_id]
+            self.spawn(self.flush(ticket_id, batch))
+        return await waiter
+
+    async def flush_later(self, ticket_id: int, batch: Batch):
+        await asyncio.sleep(self.setting.window)
+        # Already flushed when it filled up
+        if self.batches.get(ticket_id) is batch:
+            del self.batches[ticket_id]
+            await self.flush(ticket_id, batch)
+
+    async def flush(self, ticket_id: int, batch: Batch):
+        results: List[Union[Order, Exception]] = []
+        try:
+            async with self.sessionmaker() as session:
+                while True:
+                    # Callers which gave up are left out, nobody would confirm
+                    # or cancel their orders
+                    batch = [item for item in batch if not item[1].done()]
+                    if not batch:
+                        results = []
+                        break
+                    results = await Order.order_many(
+                        ticket_id, [reservation for reservation, _ in batch], session
+                    )
+                    if not any(waiter.done() for _, waiter in batch):
+                        await session.commit()
+                        break
+                    await session.rollback()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            _logger.warning("Reservation batch of ticket %d failed: %s", ticket_id, err)
+            results = [err] * len(batch)
+        abandoned: List[Tuple[Reservation, Order]] = []
+        for (reservation, waiter), result in zip(batch, results):
+            if waiter.done():
+                # Gave up while the batch was committing
+                if isinstance(result, Order):
+                    abandoned.append((reservation, result))
+            elif isinstance(result, Exception):
+                waiter.set_exception(result)
+            else:
+                waiter.set_result(result)
+        if abandoned:
+            await self.release(abandoned)
+
+    async def release(self, abandoned: List[Tuple[Reservation, Order]]):
+        for reservation, order in abandoned:
+            try:
+                async with self.sessionmaker() as session:
+                    await Order.cancel_order(order.id, reservation.user_code, session)
+                    await session.commit()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _logger.warning("Abandoned order %d not cancelled: %s", order.id, err)
+
+    async def stop(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -1,21 +1,53 @@
+import asyncio
 import logging
+from typing import Sequence
 from starlette.applications import Starlette
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy import Executable
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
 
 _logger = logging.getLogger(__name__)
 
 
-class DbLoader:
-    def __init__(self, app: Starlette, key: str, engine: AsyncEngine) -> None:
+class DbLoader:  # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        app: Starlette,
+        key: str,
+        engine: AsyncEngine,
+        connections: int = 1,
+        statements: Sequence[Executable] = (),
+    ) -> None:
         self.app = app
         self.key = key
         self.engine = engine
+        self.connections = max(connections, 1)
+        self.statements = statements
+
+    async def prime(self, connection: AsyncConnection):
+        await connection.exec_driver_sql("SELECT 1")
+        for statement in self.statements:
+            try:
+                await connection.execute(statement)
+            except SQLAlchemyError as err:
+                _logger.warning("Unable to prime the engine[%s] : %s", self.key, err)
+            await connection.rollback()
 
     async def startup(self):
-        async with self.engine.connect() as connection:
-            await connection.exec_driver_sql("SELECT 1")
+        # Hold all connections at once so the pool really opens that many
+        connections = await asyncio.gather(
+            *(self.engine.connect().start() for _ in range(self.connections))
+        )
+        try:
+            await asyncio.gather(*(self.prime(conn) for conn in connections))
+        finally:
+            await asyncio.gather(*(conn.close() for conn in connections))
         setattr(self.app.state, self.key, self.engine)
-        _logger.info("Successfully attached the engine[%s]", self.key)
+        _logger.info(
+            "Successfully attached the engine[%s] with %d connections",
+            self.key,
+            self.connections,
+        )
 
     async def shutdown(self):
         await self.engine.dispose()
@@ -0,0 +1,18 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(data: Any) -> bytes:
+    # orjson encodes large results several times faster, the standard library
+    # serves when it is not installed or meets a value it does not handle
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)  # pylint: disable=no-member
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(",", ":")).encode()
@@ -2,17 +2,48 @@ from urllib.parse import quote
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine
 
+from ticket.env.settings import Postgres
+
 # pylint: disable=too-many-arguments
 
 
 def get_pg_engine(
-    host: str, port: int, user: str, password: str, database: str, pool_size: int = 2
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+    pool_size: int = 2,
+    *,
+    max_overflow: int = 10,
+    pool_timeout: float = 30.0,
+    pool_pre_ping: bool = False,
+    echo: bool = False,
 ) -> AsyncEngine:
     password = quote(password)
     return create_async_engine(
         f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{database}",
         pool_size=pool_size,
-        echo=True,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+        echo=echo,
+    )
+
+
+def get_pg_engine_from_setting(setting: Postgres, processes: int = 1) -> AsyncEngine:
+    pool_size, max_overflow = setting.pool.per_worker(processes)
+    return get_pg_engine(
+        host=setting.host,
+        port=setting.port,
+        user=setting.user,
+        password=setting.password,
+        database=setting.database,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=setting.pool.pool_timeout,
+        pool_pre_ping=setting.pool.pool_pre_ping,
+        echo=setting.echo,
     )
 
 
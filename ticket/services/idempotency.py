@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Hashable
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Idempotency
+from ticket.models.idempotency import OrderIdempotency
+
+_logger = logging.getLogger(__name__)
+
+
+class InFlight:
+    # Requests of this worker holding a key, duplicates wait here instead of
+    # holding a connection while blocked on the key's row
+    def __init__(self) -> None:
+        self.requests: Dict[Hashable, asyncio.Event] = {}
+
+    async def start(self, key: Hashable):
+        while key in self.requests:
+            await self.requests[key].wait()
+        self.requests[key] = asyncio.Event()
+
+    def finish(self, key: Hashable):
+        event = self.requests.pop(key, None)
+        if event:
+            event.set()
+
+
+class IdempotencyPurger:
+    def __init__(self, engine: AsyncEngine, setting: Idempotency) -> None:
+        self.setting = setting
+        self.sessionmaker = async_sessionmaker(engine)
+
+    async def run(self) -> int:
+        before = datetime.utcnow() - timedelta(seconds=self.setting.ttl)
+        async with self.sessionmaker() as session:
+            purged = await OrderIdempotency.purge(session, before)
+            await session.commit()
+        _logger.info("Purged %d idempotency keys", purged)
+        return purged
@@ -0,0 +1,206 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Settings
+from ticket.models.counters import get_live_ticket_ids, reconcile_ticket_counters
+from ticket.models.job import Job
+from ticket.models.partition import (
+    detach_ticket_partitions,
+    drop_ticket_partitions,
+    get_detached_order_ids,
+)
+from ticket.models.purge import delete_ticket
+from ticket.models.settlement import SettleAction
+from ticket.models.ticket import Ticket, TicketLine, TicketStorage
+from ticket.services.settlement import OrderSettler, SettleProgress
+
+_logger = logging.getLogger(__name__)
+
+
+class JobLost(Exception):
+    pass
+
+
+class JobContext:
+    def __init__(self, runner: "JobRunner", job: Job) -> None:
+        self.runner = runner
+        self.job_id = job.id
+        # Attempt of this claim, fences the updates of a worker whose lease ran
+        # out and whose job was claimed again
+        self.attempts = job.attempts
+        self.arguments: Dict[str, Any] = job.arguments
+        # Progress of an earlier attempt, handlers use it to resume
+        self.progress: Dict[str, Any] = job.progress
+
+    async def report(self, **progress: Any):
+        # Also renews the claim on the job
+        async with self.runner.sessionmaker() as session:
+            reported = await Job.report(
+                session,
+                self.job_id,
+                self.attempts,
+                progress,
+                self.runner.setting.lease,
+            )
+            await session.commit()
+        if not reported:
+            # Stops the handler before it does more work for another worker
+            raise JobLost(f"Job {self.job_id} was claimed by another worker")
+        self.progress = progress
+
+
+JobHandler = Callable[["JobRunner", JobContext], Awaitable[Dict[str, Any]]]
+
+
+class JobRunner:
+    # Claims jobs with SKIP LOCKED and runs them in chunks, each chunk is its
+    # own transaction and reports progress, so a job never holds locks long
+    handlers: Dict[str, JobHandler] = {}
+
+    def __init__(self, engine: AsyncEngine, settings: Settings) -> None:
+        self.engine = engine
+        self.settings = settings
+        self.setting = settings.jobs
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+
+    @classmethod
+    def handler(cls, kind: str) -> Callable[[JobHandler], JobHandler]:
+        def register(func: JobHandler) -> JobHandler:
+            cls.handlers[kind] = func
+            return func
+
+        return register
+
+    async def run_next(self) -> Optional[int]:
+        async with self.sessionmaker() as session:
+            job = await Job.claim(session, self.setting.lease)
+            await session.commit()
+        if not job:
+            return None
+        result: Optional[Dict[str, Any]] = None
+        error: Optional[str] = None
+        if job.attempts > self.setting.max_attempts:
+            error = "Claimed too many times, its workers did not finish it"
+        elif job.kind not in self.handlers:
+            error = f"Unknown job kind {job.kind}"
+        else:
+            try:
+                result = await self.handlers[job.kind](self, JobContext(self, job))
+            except JobLost as err:
+                _logger.warning("%s, stopped", err)
+                return job.id
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _logger.exception("Job %d %s failed", job.id, job.kind)
+                error = str(err) or type(err).__name__
+        async with self.sessionmaker() as session:
+            finished = await Job.finish(
+                session, job.id, job.attempts, result=result, error=error
+            )
+            await session.commit()
+        if not finished:
+            _logger.warning("Job %d was claimed by another worker", job.id)
+        else:
+            _logger.info(
+                "Job %d %s %s", job.id, job.kind, "failed" if error else "done"
+            )
+        return job.id
+
+    async def run(self) -> int:
+        done = 0
+        while await self.run_next():
+            done += 1
+        return done
+
+
+@JobRunner.handler("create_lines")
+async def create_lines(runner: JobRunner, ctx: JobContext) -> Dict[str, Any]:
+    ticket_id = ctx.arguments["ticket_id"]
+    async with runner.sessionmaker() as session:
+        ticket = await session.get(Ticket, ticket_id)
+    if not ticket or ticket.storage == TicketStorage.RANGES:
+        # Lines of RANGES tickets are created when ordered
+        return {"created": 0}
+    total = ticket.end_num - ticket.start_num + 1
+    done = ctx.progress.get("done", 0)
+    created = ctx.progress.get("created", 0)
+    while done < total:
+        start = ticket.start_num + done
+        end = min(start + runner.setting.chunk_size, ticket.end_num + 1) - 1
+        async with runner.sessionmaker() as session:
+            created += await TicketLine.create_number_range(
+                ticket_id, start, end, session
+            )
+            await session.commit()
+        done += end - start + 1
+        await ctx.report(done=done, total=total, created=created)
+    return {"created": created}
+
+
+@JobRunner.handler("delete_tickets")
+async def delete_tickets(runner: JobRunner, ctx: JobContext) -> Dict[str, Any]:
+    ticket_ids = ctx.arguments["ticket_ids"]
+    done = ctx.progress.get("done", 0)
+    orders = ctx.progress.get("orders", 0)
+    lock_timeout = runner.settings.partitions.lock_timeout
+    attempts = runner.settings.partitions.attempts
+    for ticket_id in ticket_ids[done:]:
+        # Orders of the ticket reported by an earlier attempt, its partitions
+        # and so its order lines may be gone since
+        order_ids = ctx.progress.get("order_ids")
+        if order_ids is None:
+            # Once detached no line can be added, the orders of the ticket are
+            # read from its detached table. Archived tickets have none left.
+            await detach_ticket_partitions(
+                runner.engine, ticket_id, lock_timeout, attempts
+            )
+            async with runner.sessionmaker() as session:
+                order_ids = await get_detached_order_ids(session, ticket_id)
+            await ctx.report(
+                done=done, total=len(ticket_ids), orders=orders, order_ids=order_ids
+            )
+        await drop_ticket_partitions(runner.engine, ticket_id, lock_timeout, attempts)
+        async with runner.sessionmaker() as session:
+            orders += await delete_ticket(session, ticket_id, order_ids)
+            await session.commit()
+        done += 1
+        await ctx.report(done=done, total=len(ticket_ids), orders=orders)
+    return {"tickets": len(ticket_ids), "orders": orders}
+
+
+@JobRunner.handler("reconcile_counters")
+async def reconcile_counters(runner: JobRunner, ctx: JobContext) -> Dict[str, Any]:
+    ticket_ids = ctx.arguments.get("ticket_ids")
+    done = ctx.progress.get("done", 0)
+    drifted = ctx.progress.get("drifted", 0)
+    if ticket_ids is None:
+        # The live tickets may have changed since an earlier attempt
+        done = drifted = 0
+        async with runner.sessionmaker() as session:
+            ticket_ids = await get_live_ticket_ids(session)
+    size = runner.settings.reconcile.batch_size
+    while done < len(ticket_ids):
+        end = min(done + size, len(ticket_ids))
+        async with runner.sessionmaker() as session:
+            drifts = await reconcile_ticket_counters(session, ticket_ids[done:end])
+            await session.commit()
+        done = end
+        drifted += len(drifts)
+        await ctx.report(done=done, total=len(ticket_ids), drifted=drifted)
+    return {"tickets": len(ticket_ids), "drifted": drifted}
+
+
+@JobRunner.handler("settle_orders")
+async def settle_orders(runner: JobRunner, ctx: JobContext) -> Dict[str, Any]:
+    # Settled orders are skipped by a later attempt, no need to resume
+    async def report(progress: SettleProgress):
+        await ctx.report(**progress.model_dump())
+
+    settler = OrderSettler(runner.engine, runner.settings.settlement)
+    progress = await settler.run(
+        SettleAction(ctx.arguments["action"]),
+        order_ids=ctx.arguments.get("order_ids"),
+        domain=ctx.arguments.get("domain"),
+        progress=report,
+    )
+    return progress.model_dump()
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+from typing import Optional, Set
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from ticket.env.settings import Leader
+
+_logger = logging.getLogger(__name__)
+
+# pylint: disable=not-callable
+
+
+def lock_key(name: str) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    digest = hashlib.sha256(f"ticket:{name}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+class LeaderElection:
+    # Names led by this process, each held with a session advisory lock on one
+    # dedicated connection. Postgres drops the connection once it stays idle
+    # for a lease, and its locks with it, so a stuck or partitioned leader
+    # loses its names and another process takes them at its next try.
+    def __init__(self, engine: AsyncEngine, setting: Leader) -> None:
+        self.setting = setting
+        # Outside the pool so the locks are never handed to a request
+        self.engine = create_async_engine(engine.url, poolclass=NullPool)
+        self.connection: Optional[AsyncConnection] = None
+        self.held: Set[str] = set()
+        self.lock = asyncio.Lock()
+        self.keeper: Optional[asyncio.Task] = None
+
+    async def connect(self) -> AsyncConnection:
+        if self.connection is None:
+            connection = await self.engine.connect()
+            self.connection = connection
+            await connection.execute(
+                text(f"SET idle_session_timeout = {int(self.setting.lease * 1000)}")
+            )
+            await connection.commit()
+        return self.connection
+
+    async def reset(self):
+        if self.held:
+            _logger.warning("Lost leadership of %s", ", ".join(sorted(self.held)))
+        self.held.clear()
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            with contextlib.suppress(Exception):
+                await connection.close()
+
+    async def lead(self, name: str) -> bool:
+        async with self.lock:
+            try:
+                async with asyncio.timeout(self.setting.lease):
+                    connection = await self.connect()
+                    # A held name is checked too, the server may have dropped
+                    # the session while this process was stalled
+                    res = await connection.execute(
+                        select(1)
+                        if name in self.held
+                        else select(func.pg_try_advisory_lock(lock_key(name)))
+                    )
+                    await connection.commit()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                _logger.warning("Leader election of %s failed: %s", name, err)
+                await self.reset()
+                return False
+            if name in self.held:
+                return True
+            if not res.scalar():
+                return False
+            self.held.add(name)
+            _logger.info("Leading %s", name)
+            return True
+
+    async def keep(self):
+        # Pings well within the lease so the server keeps the session
+        while True:
+            await asyncio.sleep(self.setting.lease / 3)
+            async with self.lock:
+                if self.connection is None:
+                    continue
+                try:
+                    async with asyncio.timeout(self.setting.lease / 3):
+                        await self.connection.execute(select(1))
+                        await self.connection.commit()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    await self.reset()
+
+    def start(self):
+        self.keeper = asyncio.create_task(self.keep(), name="leader")
+
+    async def stop(self):
+        if self.keeper:
+            self.keeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.keeper
+            self.keeper = None
+        # Closing the session releases every lock at once
+        async with self.lock:
+            self.held.clear()
+            await self.reset()
+        await self.engine.dispose()
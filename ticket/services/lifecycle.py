@@ -0,0 +1,94 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Lifecycle
+from ticket.models.ticket import Ticket
+from ticket.models.lifecycle import TRANSITIONS, apply_transition, get_on_sale
+from ticket.services.leader import LeaderElection
+
+_logger = logging.getLogger(__name__)
+
+
+class OnSaleTickets:
+    # Tickets selling now, kept in memory between two scheduler runs. The
+    # filtered list is only rebuilt when a ticket starts or ends.
+    def __init__(self) -> None:
+        self.tickets: Optional[List[Ticket]] = None
+        self.current: List[Ticket] = []
+        self.valid_until = datetime.min.replace(tzinfo=timezone.utc)
+
+    def set(self, tickets: List[Ticket]):
+        self.tickets = tickets
+        self.valid_until = datetime.min.replace(tzinfo=timezone.utc)
+
+    def get(self, now: datetime) -> Optional[List[Ticket]]:
+        if self.tickets is None:
+            return None
+        if now >= self.valid_until:
+            self.current = [
+                ticket
+                for ticket in self.tickets
+                if ticket.start_date <= now < ticket.end_date
+            ]
+            self.valid_until = min(
+                [ticket.end_date for ticket in self.current]
+                + [
+                    ticket.start_date
+                    for ticket in self.tickets
+                    if ticket.start_date > now
+                ],
+                default=datetime.max.replace(tzinfo=timezone.utc),
+            )
+        return self.current
+
+
+class TicketScheduler:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        setting: Lifecycle,
+        on_sale: OnSaleTickets,
+        leader: Optional[LeaderElection] = None,
+    ) -> None:
+        self.setting = setting
+        self.on_sale = on_sale
+        self.leader = leader
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def apply_transitions(self) -> int:
+        applied = 0
+        for source, target, due in TRANSITIONS:
+            while True:
+                async with self.sessionmaker() as session:
+                    ticket_ids = await apply_transition(
+                        session, source, target, due, self.setting.batch_size
+                    )
+                    await session.commit()
+                if ticket_ids:
+                    _logger.info(
+                        "Moved tickets %s from %s to %s",
+                        ticket_ids,
+                        source.value,
+                        target.value,
+                    )
+                applied += len(ticket_ids)
+                if len(ticket_ids) < self.setting.batch_size:
+                    break
+        return applied
+
+    async def refresh_on_sale(self):
+        # Looks one interval ahead so posted tickets starting before the next
+        # run show up on time
+        until = datetime.now(timezone.utc) + timedelta(seconds=self.setting.interval)
+        async with self.sessionmaker() as session:
+            self.on_sale.set(await get_on_sale(session, until))
+
+    async def run(self) -> int:
+        # Every process keeps its own on sale list, one applies the transitions
+        applied = 0
+        if not self.leader or await self.leader.lead("lifecycle"):
+            applied = await self.apply_transitions()
+        await self.refresh_on_sale()
+        return applied
@@ -0,0 +1,50 @@
+import asyncio
+import contextlib
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from ticket.services.leader import LeaderElection
+
+_logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], Awaitable[Any]],
+        leader: Optional[LeaderElection] = None,
+    ) -> None:
+        self.name = name
+        self.interval = interval
+        self.func = func
+        # With a leader election only the process leading name runs it
+        self.leader = leader
+        self.task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        if self.leader and not await self.leader.lead(self.name):
+            return
+        try:
+            await self.func()
+        except Exception:  # pylint: disable=broad-exception-caught
+            _logger.exception("Periodic task[%s] failed", self.name)
+
+    async def run(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name=self.name)
+        _logger.info("Started periodic task[%s]", self.name)
+
+    async def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+        _logger.info("Stopped periodic task[%s]", self.name)
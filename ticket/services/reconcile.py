@@ -0,0 +1,59 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Reconcile
+from ticket.models.watermark import Watermark
+from ticket.models.counters import (
+    CounterDrift,
+    get_touched_ticket_ids,
+    reconcile_ticket_counters,
+)
+
+_logger = logging.getLogger(__name__)
+
+WATERMARK = "ticket_counters"
+
+
+class CounterReconciler:
+    def __init__(self, engine: AsyncEngine, setting: Reconcile) -> None:
+        self.setting = setting
+        self.sessionmaker = async_sessionmaker(engine)
+
+    async def run(self) -> List[CounterDrift]:
+        started = datetime.utcnow()
+        async with self.sessionmaker() as session:
+            watermark = await Watermark.get_watermark(WATERMARK, session)
+            # Without a watermark every ticket is checked once
+            since = datetime.min
+            if watermark:
+                since = watermark - timedelta(seconds=self.setting.overlap)
+            ticket_ids = await get_touched_ticket_ids(session, since)
+        drifts: List[CounterDrift] = []
+        size = self.setting.batch_size
+        for start in range(0, len(ticket_ids), size):
+            end = start + size
+            async with self.sessionmaker() as session:
+                batch = await reconcile_ticket_counters(session, ticket_ids[start:end])
+                await session.commit()
+            for drift in batch:
+                _logger.warning(
+                    "Ticket %d counters drifted, available %d -> %d, "
+                    "reserved %d -> %d, sold %d -> %d",
+                    drift.id,
+                    drift.old_available,
+                    drift.available,
+                    drift.old_reserved,
+                    drift.reserved,
+                    drift.old_sold,
+                    drift.sold,
+                )
+            drifts.extend(batch)
+        async with self.sessionmaker() as session:
+            await Watermark.set_watermark(WATERMARK, started, session)
+            await session.commit()
+        _logger.info(
+            "Reconciled %d tickets, %d had drifted", len(ticket_ids), len(drifts)
+        )
+        return drifts
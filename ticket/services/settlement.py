@@ -0,0 +1,70 @@
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from ticket.env.settings import Settlement
+from ticket.models.settlement import (
+    SettleAction,
+    get_settle_order_ids,
+    settle_orders,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+class SettleProgress(BaseModel):
+    chunks: int = 0
+    settled: int = 0
+    skipped: int = 0
+
+
+class OrderSettler:
+    # Settles orders chunk by chunk, each chunk commits on its own so a long
+    # run never holds ticket locks for more than one chunk
+    def __init__(self, engine: AsyncEngine, setting: Settlement) -> None:
+        self.setting = setting
+        self.sessionmaker = async_sessionmaker(engine)
+
+    async def next_chunk(
+        self,
+        action: SettleAction,
+        order_ids: Optional[List[int]],
+        domain: Optional[List[Tuple[str, str, Any]]],
+        after: int,
+    ) -> List[int]:
+        size = self.setting.chunk_size
+        if order_ids is not None:
+            return [order_id for order_id in order_ids if order_id > after][:size]
+        async with self.sessionmaker() as session:
+            return await get_settle_order_ids(session, action, domain, after, size)
+
+    async def run(
+        self,
+        action: SettleAction,
+        order_ids: Optional[List[int]] = None,
+        domain: Optional[List[Tuple[str, str, Any]]] = None,
+        progress: Optional[Callable[[SettleProgress], Awaitable[None]]] = None,
+    ) -> SettleProgress:
+        if order_ids is not None:
+            order_ids = sorted(set(order_ids))
+        done = SettleProgress()
+        after = 0
+        while chunk := await self.next_chunk(action, order_ids, domain, after):
+            async with self.sessionmaker() as session:
+                result = await settle_orders(session, chunk, action)
+                await session.commit()
+            after = chunk[-1]
+            done.chunks += 1
+            done.settled += len(result.settled)
+            done.skipped += len(result.skipped)
+            _logger.info(
+                "Settlement %s chunk %d, %d settled and %d skipped so far",
+                action.value,
+                done.chunks,
+                done.settled,
+                done.skipped,
+            )
+            if progress:
+                await progress(done)
+        return done
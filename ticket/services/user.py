@@ -0,0 +1,17 @@
+class UserGrpc:
+    def __init__(self, host: str, port: int) -> None:
+        # grpc and the generated stubs are heavy, import them on first client only
+        # pylint: disable = import-outside-toplevel
+        import grpc
+        from user_go import user_go_pb2, user_go_pb2_grpc
+
+        self.messages = user_go_pb2
+        self.channel = grpc.aio.insecure_channel(f"{host}:{port}")
+        self.stub = user_go_pb2_grpc.UserServiceStub(channel=self.channel)
+
+    async def check_token(self, token: str):
+        # pylint: disable = no-member
+        return await self.stub.CheckThirdpartyToken(self.messages.Token(token=token))
+
+    async def close(self):
+        await self.channel.close()
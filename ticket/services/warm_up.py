@@ -0,0 +1,63 @@
+import logging
+from typing import Any, Dict, List
+from sqlalchemy import Executable, select
+from strawberry import Schema
+
+from ticket.models.ticket import Ticket, TicketLine
+from ticket.models.order import Order, OrderLine
+
+_logger = logging.getLogger(__name__)
+
+OPERATIONS = [
+    """
+    query WarmUpTickets {
+        ticketQuery(query: {domain: [], order: {}, limit: 1}) {
+            id name state availableCount lines { id number state }
+        }
+    }
+    """,
+    """
+    query WarmUpTicketLines {
+        ticketLineQuery(query: {domain: [], order: {}, limit: 1}) {
+            id number state ticket { id name }
+        }
+    }
+    """,
+    """
+    query WarmUpOrders {
+        orderQuery(query: {domain: [], order: {}, limit: 1}) {
+            id state lines { id ticketLine { id number } }
+        }
+    }
+    """,
+]
+
+
+def read_statements() -> List[Executable]:
+    # Same shapes as the resolvers, so the prepared statements get reused
+    return [
+        select(Ticket).where(Ticket.id == 0),
+        select(TicketLine).where(TicketLine.id == 0),
+        select(TicketLine).where(TicketLine.ticket_id == 0),
+        select(Order).where(Order.id == 0),
+        select(OrderLine).where(OrderLine.order_id == 0),
+    ]
+
+
+def write_statements() -> List[Executable]:
+    return [
+        *read_statements(),
+        select(TicketLine).where(TicketLine.id.in_([0])).with_for_update(),
+        select(Ticket).where(Ticket.id.in_([0])).with_for_update(),
+        select(Order)
+        .where(Order.user_code == "")
+        .where(Order.id == 0)
+        .with_for_update(),
+    ]
+
+
+async def warm_up_schema(schema: Schema, context: Dict[str, Any]):
+    for operation in OPERATIONS:
+        result = await schema.execute(operation, context_value=dict(context))
+        if result.errors:
+            _logger.warning("Warm up operation failed : %s", result.errors)